@@ -1,12 +1,18 @@
 import csv
+import datetime
 import os
 import time
+from functools import lru_cache
 
 
+import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation as animation
 
 from mpl_toolkits.basemap import Basemap
+from PIL import Image
+
+import day_night
+from database_snapshot import load_database
 
 print(f'Searching for the Logs.csv file')
 
@@ -19,10 +25,148 @@ print(f'Start plotting ...')
 
 
 
-def split_at_value(list, value):
-    indices = [i for i, x in enumerate(list) if x['Key'] == value]
-    for start, end in zip([0, *indices], [*indices, len(list)]):
-        yield list[start+1:end]
+class Log_tail:
+    """Reads only the rows appended to Logs.csv since the previous call, starting at the last run"""
+
+    def __init__(self, path : str):
+        self.path = path
+        self.header = None
+        self.offset = 0
+        self.partial = b""
+        self.file_id = None
+
+    def find_last_run(self, f, file_size : int, block_size : int = 65536):
+        """Returns the offset of the first row after the last New_Run line, reading the file backwards"""
+        end = file_size
+        tail = b""
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            tail = f.read(end - start) + tail[:len(b"\nNew_Run")]
+            position = tail.rfind(b"\nNew_Run")
+            if position >= 0:
+                line_end = tail.find(b"\n", position + 1)
+                # The New_Run line is still being written, its row will be read by the next call
+                return start + position + 1 if line_end < 0 else start + line_end + 1
+            end = start
+        return None
+
+    def restart(self, f, rotated : bool = False):
+        """Reads the header and jumps to the last run (file created or truncated), or reads a rotated file from its start"""
+        f.seek(0)
+        header_line = f.readline()
+        if not header_line.endswith(b"\n"):
+            self.header = None
+            self.offset = 0
+            return
+        self.header = {field: i for i, field in enumerate(next(csv.reader([header_line.decode("utf-8")])))}
+        file_size = os.fstat(f.fileno()).st_size
+        # After a rotation the new file continues the current run
+        self.offset = len(header_line) if rotated else self.find_last_run(f, file_size) or len(header_line)
+        self.partial = b""
+
+    def read_appended(self, f, file_size : int):
+        """Returns the complete lines between the offset and the end of the file"""
+        f.seek(self.offset)
+        content = self.partial + f.read(file_size - self.offset)
+        self.offset = file_size
+
+        # A row cut in the middle by the writer is kept for the next call
+        last_line_end = content.rfind(b"\n") + 1
+        self.partial = content[last_line_end:]
+        return content[:last_line_end].decode("utf-8").splitlines()
+
+    def read_rotated_end(self):
+        """Returns the lines written to the previous file after the last call, before the log writer renamed it to Logs.1.csv"""
+        base, extension = os.path.splitext(self.path)
+        try :
+            with open(f"{base}.1{extension}", 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if (stat.st_dev, stat.st_ino) != self.file_id:
+                    return []
+                return self.read_appended(f, stat.st_size)
+        except OSError:
+            return []
+
+    def read_new_rows(self):
+        """Returns the complete rows appended since the last call, as lists of fields"""
+        lines = []
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            file_size = stat.st_size
+            file_id = (stat.st_dev, stat.st_ino)
+
+            restarted = False
+            if self.header is not None and file_id != self.file_id:
+                # Logs.csv was renamed by the log writer and a new one was started : the new file continues the current run
+                lines = self.read_rotated_end()
+                self.restart(f, rotated=True)
+            elif self.header is None or file_size < self.offset:
+                self.restart(f)
+                restarted = True
+            self.file_id = file_id
+            if self.header is None:
+                return [], restarted
+
+            lines += self.read_appended(f, file_size)
+
+        return [row for row in csv.reader(lines) if row], restarted
+
+
+
+class Track:
+    """Latitudes and longitudes of the current run in arrays that grow in place"""
+
+    def __init__(self, capacity : int = 1024):
+        self.lats = np.empty(capacity)
+        self.longs = np.empty(capacity)
+        self.count = 0
+
+    def reset(self):
+        # New run : the previous run is dropped, only its arrays are kept
+        self.count = 0
+
+    def append(self, lat : float, long : float):
+        if self.count == len(self.lats):
+            self.lats = np.concatenate([self.lats, np.empty(len(self.lats))])
+            self.longs = np.concatenate([self.longs, np.empty(len(self.longs))])
+        self.lats[self.count] = lat
+        self.longs[self.count] = long
+        self.count += 1
+
+
+
+@lru_cache(maxsize=8)
+def get_container_sheet(container : str, width : int, height : int):
+    """Decodes a container sheet once and resamples it to the size of the map in pixels"""
+    with Image.open(f"Images/{container}_sheet.png") as sheet:
+        return np.asarray(sheet.convert("RGBA").resize((width, height), Image.LANCZOS))
+
+
+def map_size_in_pixels():
+    return max(1, round(ax.bbox.width)), max(1, round(ax.bbox.height))
+
+
+
+Database = load_database('Database.json')
+
+Reference_time = (datetime.datetime(2020, 1, 1) - datetime.datetime(1970, 1, 1)).total_seconds()
+
+# One degree grid of the night shading, first row at the north pole like the sheets
+Shading_latitudes = np.linspace(90, -90, 181)
+Shading_longitudes = np.linspace(-180, 180, 361)
+# Opacity of the shading for every state of the day (night, twilight, day ..., unknown)
+Shading_alpha = np.array([0.6, 0.35, 0.0, 0.0, 0.35, 0.6, 0.0])
+
+
+def get_night_shading(container : str, Time_passed : float):
+    """RGBA image of the night side of a container on the shading grid"""
+    Constants = day_night.get_star_constants(Database["Containers"][container], Database["Containers"]["Stanton"])
+    HourAngle, States = day_night.day_state_grid(Constants, Time_passed, Shading_latitudes, Shading_longitudes)
+    Shading = np.zeros(States.shape + (4,))
+    Shading[..., 2] = 0.1
+    Shading[..., 3] = Shading_alpha[States]
+    return Shading
 
 
 
@@ -31,52 +175,112 @@ fig.subplots_adjust(left=0, bottom=0, right=1, top=1)
 plt.get_current_fig_manager().window.wm_iconbitmap(r"Images/icon.ico")
 plt.gcf().canvas.manager.set_window_title('Navigation Map')
 
+ax = plt.gca()
 
 m = Basemap(projection='cyl', resolution=None,
             llcrnrlat=-90, urcrnrlat=90,
-            llcrnrlon=-180, urcrnrlon=180)
-
-old_data = []
-
-def animate (i):
-    global old_data
-    new_data = []
-    with open(r'Logs/Logs.csv', 'rt') as csv_file:
-        reader = csv.DictReader(csv_file)
-        row_index = 0
-        for row in reader:
-            if row:
-                row_index += 1
-                new_data.append(row)
-    
-    Runs = []
-    for run in split_at_value(new_data, 'New_Run'):
-        Runs.append(run)
-    Current_run = Runs[-1]
-    
-    container = Current_run[-1]['Container']
-    
-    lats = []
-    longs = []
-    
-    for row in Current_run:
-        lat = float(row['Latitude'])
-        long = float(row['Longitude'])
-        
-        lats.append(lat)
-        longs.append(long)
-    
-    
-    if new_data != old_data:
+            llcrnrlon=-180, urcrnrlon=180, ax=ax)
+m.set_axes_limits(ax=ax)
+
+# The night shading and the track are animated artists : they are left out of the full redraws and blitted on top of the saved background
+night_image = ax.imshow(np.zeros((len(Shading_latitudes), len(Shading_longitudes), 4)), extent=(m.llcrnrx, m.urcrnrx, m.llcrnry, m.urcrnry), origin='upper', interpolation='bilinear', animated=True, visible=False)
+track_line, = ax.plot([], [], color='c', marker='.', markersize=9, markeredgecolor='k', markeredgewidth=0.5, linestyle='-', linewidth=0.8, alpha=0.75, animated=True)
+
+Logs = Log_tail(r'Logs/Logs.csv')
+Current_track = Track()
+Current_container = 'None'
+Container_image = None
+Background = None
+
+
+def on_draw(event):
+    """Saves the figure without the track after every full redraw (background change, resize)"""
+    global Background
+    Background = fig.canvas.copy_from_bbox(fig.bbox)
+    ax.draw_artist(night_image)
+    ax.draw_artist(track_line)
+
+
+def blit_track():
+    if Background is None:
+        fig.canvas.draw()
+        return
+    fig.canvas.restore_region(Background)
+    ax.draw_artist(night_image)
+    ax.draw_artist(track_line)
+    fig.canvas.blit(fig.bbox)
+    fig.canvas.flush_events()
+
+
+def set_background(container : str):
+    global Container_image
+    if Container_image is not None:
+        Container_image.remove()
+        Container_image = None
+    if container != 'None':
+        # Same placement as m.warpimage on the cylindrical projection, without reloading the PNG
+        Container_image = ax.imshow(get_container_sheet(container, *map_size_in_pixels()), extent=(m.llcrnrx, m.urcrnrx, m.llcrnry, m.urcrnry), origin='upper', interpolation='nearest')
+    m.set_axes_limits(ax=ax)
+    # Full redraw, on_draw saves the new background
+    fig.canvas.draw()
+
+
+def on_resize(event):
+    """Resamples the background for the new size of the window, the redraw that follows a resize picks it up"""
+    if Container_image is not None:
+        Container_image.set_data(get_container_sheet(Current_container, *map_size_in_pixels()))
+
+
+def update_night_shading():
+    """The terminator moves with the rotation of the container, the shading is recomputed on every tick"""
+    if Current_container in Database["Containers"] and Current_container != "Stanton":
+        night_image.set_data(get_night_shading(Current_container, time.time() - Reference_time))
+        night_image.set_visible(True)
+    else :
+        night_image.set_visible(False)
+
+
+def animate():
+    global Current_container
+    rows, restarted = Logs.read_new_rows()
+
+    if restarted:
+        Current_track.reset()
+
+    columns = Logs.header
+    container = Current_container
+    for row in rows:
+        if row[0] == 'New_Run':
+            Current_track.reset()
+            continue
+        try :
+            lat = float(row[columns['Latitude']])
+            long = float(row[columns['Longitude']])
+        except (IndexError, ValueError):
+            continue
+        Current_track.append(lat, long)
+        container = row[columns['Container']]
+
+    if rows or restarted:
         print('Updating ...')
-        plt.cla()
-        
-        if container != 'None':
-            m.warpimage(f"Images/{container}_sheet.png")
-        m.plot(longs, lats, latlon=True, color='c', marker='.', markersize=9, markeredgecolor='k', markeredgewidth=0.5, linestyle='-', linewidth=0.8, alpha=0.75)
-        
-        old_data = new_data
-
-ani = animation(fig, animate, interval=1000)
+        x, y = m(Current_track.longs[:Current_track.count], Current_track.lats[:Current_track.count])
+        track_line.set_data(x, y)
+
+    container_changed = container != Current_container
+    Current_container = container
+    update_night_shading()
+
+    if container_changed:
+        set_background(container)
+    else :
+        blit_track()
+
+
+fig.canvas.mpl_connect('draw_event', on_draw)
+fig.canvas.mpl_connect('resize_event', on_resize)
+
+timer = fig.canvas.new_timer(interval=1000)
+timer.add_callback(animate)
+timer.start()
 
 plt.show()
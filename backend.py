@@ -1,16 +1,26 @@
-from math import sqrt, degrees, radians, cos, acos, sin, asin, tan ,atan2, copysign, pi
-import pyperclip
+from math import sqrt, degrees, radians, cos, acos, sin, asin, tan ,atan2, copysign, pi, nan, floor
 import time
 import datetime
-import tkinter as tk
-import tkinter.ttk as ttk
+import functools
 import json
 import os
-import csv
 import sys
-import requests
-import webbrowser
 import argparse
+import atexit
+import queue
+import socket
+import threading
+
+from coordinate_sources import ClipboardSource, make_source, parse_coordinates
+from database_snapshot import RecordView, changed_containers, load_database, overlay_path_of
+from file_watcher import FileWatcher
+from log_writer import LogWriter
+from protocol import Compatibility_protocol, Protocol_versions, DeltaEncoder, Outbox, update_line
+from spatial_index import ContainerIndex
+from time_sync import TimeSync
+from trajectory_state import Trajectory
+# Scalar forms of the navigation_math functions, for the single position of an update
+from navigation_scalar import xyz, xyz_dict, vector_norm, vector_product, angle_between_vectors, rotate_point_2D, get_bearing, get_local_rotated_coordinates, get_lat_long_height
 
 
 os.system("")
@@ -20,29 +30,41 @@ with open("settings.json", "r") as f:
 
 
 
+def check_for_updates():
+    """Asks GitHub for the latest release and offers to open it if it is newer than this one (runs in a background thread)"""
+    # Only needed here, importing them at startup costs more than the rest of the backend
+    import requests
+    import tkinter as tk
+    import webbrowser
 
-if settings["update_checker"] == True:
     Local_version =  "2.1.1"
 
     release_request_url = "https://api.github.com/repos/Valalol/Star-Citizen-Navigation/releases"
 
 
-    r = requests.get(release_request_url)
-    content = r.json()
+    try :
+        r = requests.get(release_request_url, timeout=5)
+        content = r.json()
+    except (requests.RequestException, ValueError):
+        print("Error: Could not check for updates")
+        sys.stdout.flush()
+        return
 
     Status_code = r.status_code
-    Github_version = content[0]['tag_name']
-    Download_URL = content[0]['html_url']
-    Release_content = content[0]['name']
 
     if Status_code == 200 :
+        Github_version = content[0]['tag_name']
+        Download_URL = content[0]['html_url']
+        Release_content = content[0]['name']
+
         if Github_version.replace(".", "") > Local_version.replace(".", ""):
             print("New version available")
             sys.stdout.flush()
             def Go_to_release_func():
                 webbrowser.open(Download_URL)
                 root.destroy()
-                raise SystemExit("Opened the new release page in your browser")
+                print("Opened the new release page in your browser")
+                sys.stdout.flush()
 
             def Next_time_func():
                 root.destroy()
@@ -73,30 +95,28 @@ if settings["update_checker"] == True:
 
 
 
-with open('Database.json') as f:
-    Database = json.load(f)
+# Dict-like view over the compiled snapshot of Database.json, rebuilt only when the JSON changes
+Database = load_database('Database.json')
 
 
-Container_list = []
-for i in Database["Containers"]:
-    Container_list.append(Database["Containers"][i]["Name"])
+# The name lists come straight from the snapshot index, without walking the database
+Container_list = list(Database.snapshot.container_names)
 
-Space_POI_list = []
-for poi in Database["Space_POI"]:
-    Space_POI_list.append(poi)
+Space_POI_list = list(Database.snapshot.space_poi_names)
 
 Planetary_POI_list = {}
-for container_name in Database["Containers"]:
-    Planetary_POI_list[container_name] = []
-    for poi in Database["Containers"][container_name]["POI"]:
-        Planetary_POI_list[container_name].append(poi)
+for container_name in Database.snapshot.container_names:
+    Planetary_POI_list[container_name] = list(Database.snapshot.poi_index[container_name])
+
+# Bounding-sphere index used to find the container of a position
+Containers_index = ContainerIndex(Database)
 
 
 
 
 parser = argparse.ArgumentParser()
 
-parser.add_argument("mode", choices=["planetary_nav", "space_nav", "companion"])
+parser.add_argument("mode", choices=["planetary_nav", "space_nav", "companion", "radar", "daemon"])
 parser.add_argument("--container", type=str)
 parser.add_argument("--known", type=str)
 parser.add_argument("--target", type=str)
@@ -113,257 +133,259 @@ parser.add_argument("--OM3_value", type=float)
 parser.add_argument("--height", type=float)
 parser.add_argument("--lat", type=float)
 parser.add_argument("--long", type=float)
-
-args = parser.parse_args()
-
-# print(args)
-
-Mode = args.mode
-
-if Mode == "planetary_nav":
-    arg_container = args.container
-    arg_known = args.known
-    if arg_known == "true":
-        arg_target = args.target
-        Target = Database["Containers"][arg_container]["POI"][arg_target]
+parser.add_argument("--qt_marker", type=str, choices=["all", "true", "false"], default="all", help="POIs shown by the radar")
+parser.add_argument("--sort", type=str, choices=["distance", "surface_distance", "bearing", "name"], default="distance", help="Order of the POIs of the radar")
+parser.add_argument("--max_pois", type=int, help="Number of POIs sent by the radar (all of them by default)")
+parser.add_argument("--route", type=str, nargs="+", help="POIs of --container visited one after the other by planetary_nav")
+parser.add_argument("--keep_order", action="store_true", help="Visits the POIs of --route in the given order")
+parser.add_argument("--source", type=str, choices=["clipboard", "file", "stdin", "socket"], default="clipboard")
+parser.add_argument("--source_path", type=str)
+parser.add_argument("--source_port", type=int)
+parser.add_argument("--port", type=int, default=settings.get("backend_port", 48600))
+parser.add_argument("--protocol", type=int, choices=Protocol_versions, default=Compatibility_protocol)
+parser.add_argument("--metrics", action="store_true", default=settings.get("metrics_enabled", False), help="Times the stages of the updates (see metrics.py)")
+parser.add_argument("--metrics_port", type=int, default=settings.get("metrics_port", 48602))
+
+
+
+def get_target(Mode : str, args : argparse.Namespace):
+    """Returns the Target dict described by the arguments of a mode (None in companion mode)"""
+    Target = None
+
+    if Mode == "planetary_nav":
+        arg_container = args.container
+        arg_known = args.known
+        if arg_known == "true":
+            arg_target = args.target
+            Target = Database["Containers"][arg_container]["POI"][arg_target]
     
-    else : 
-        arg_entry_type = args.entry_type
-        if arg_entry_type == "xyz":
+        else : 
+            arg_entry_type = args.entry_type
+            if arg_entry_type == "xyz":
+                arg_x = args.x
+                arg_y = args.y
+                arg_z = args.z
+                Target = {
+                    'Name': 'Custom POI', 
+                    'Container': arg_container,
+                    'X': arg_x, 
+                    'Y': arg_y, 
+                    'Z': arg_z, 
+                    "QTMarker": "FALSE"
+                }
+
+            elif arg_entry_type == "oms":
+                arg_OM1_name = args.OM1_name
+                arg_OM1_value = args.OM1_value
+                arg_OM2_name = args.OM2_name
+                arg_OM2_value = args.OM2_value
+                arg_OM3_name = args.OM3_name
+                arg_OM3_value = args.OM3_value
+                arg_height = args.height
+                #Position at these distances of the 3 OMs, at this height
+                from custom_targets import target_from_oms
+                Target = target_from_oms(Database["Containers"][arg_container], [arg_OM1_name, arg_OM2_name, arg_OM3_name], [arg_OM1_value, arg_OM2_value, arg_OM3_value], arg_height)
+        
+            else:
+                arg_lat = args.lat
+                arg_long = args.long
+                arg_height = args.height
+                from custom_targets import target_from_lat_long_height
+                Target = target_from_lat_long_height(Database["Containers"][arg_container], arg_lat, arg_long, arg_height)
+
+    elif Mode == "space_nav":
+        arg_known = args.known
+        if arg_known == "true":
+            arg_target = args.target
+            Target = Database["Space_POI"][arg_target]
+        else:
             arg_x = args.x
             arg_y = args.y
             arg_z = args.z
             Target = {
-                'Name': 'Custom POI', 
-                'Container': arg_container,
-                'X': arg_x, 
-                'Y': arg_y, 
-                'Z': arg_z, 
+                'Name': 'Custom POI',
+                'X': arg_x,
+                'Y': arg_y,
+                'Z': arg_z,
                 "QTMarker": "FALSE"
             }
 
-        elif arg_entry_type == "oms":
-            arg_OM1_name = args.OM1_name
-            arg_OM1_value = args.OM1_value
-            arg_OM2_name = args.OM2_name
-            arg_OM2_value = args.OM2_value
-            arg_OM3_name = args.OM3_name
-            arg_OM3_value = args.OM3_value
-            #
-            # add some things here
-            #
-        
-        else:
-            arg_lat = args.lat
-            arg_long = args.long
-            arg_height = args.height
-            #
-            # add some things here
-            #
-
-elif Mode == "space_nav":
-    arg_known = args.known
-    if arg_known == "true":
-        arg_target = args.target
-        Target = Database["Space_POI"][arg_target]
-    else:
-        arg_x = args.x
-        arg_y = args.y
-        arg_z = args.z
+    elif Mode == "companion":
+        pass
+
+    elif Mode == "radar":
+        # Not a POI : the filter and the order of the POIs of the current container
         Target = {
-            'Name': 'Custom POI',
-            'X': arg_x,
-            'Y': arg_y,
-            'Z': arg_z,
-            "QTMarker": "FALSE"
+            "Name": "Radar",
+            "QTMarker": args.qt_marker,
+            "Sort": args.sort,
+            "Max": args.max_pois
         }
 
-elif Mode == "companion":
-    pass
+    else:
+        raise SystemExit("Program mode not selected")
 
-else:
-    raise SystemExit("Program mode not selected")
+    return Target
 
 
 logs_enabled = settings["logs_enabled"]
+# Modes whose positions are written in Logs.csv
+logs_modes = settings.get("logs_modes", ["planetary_nav"])
 
-print("Python script ready to start !")
-print("Mode: " + Mode)
-
-
-
-try :
-    import ntplib
-    c = ntplib.NTPClient()
-    response = c.request('europe.pool.ntp.org', version=3)
-    server_time = response.tx_time
-    
-    time_offset = response.offset
-except:
-    print("Error: Could not get time from NTP server")
-    sys.stdout.flush()
-    time_offset = 0
 
-print('Time_offset:', time_offset)
-sys.stdout.flush()
 
+# Plain dict copies of the container records : an update reads their fields a few dozen times and a dict lookup
+# costs much less than a lookup in the snapshot. Forgotten when the database is reloaded.
+Container_records = {}
 
+def container_record(Container_name : str):
+    Record = Container_records.get(Container_name)
+    if Record is None:
+        Record = Container_records[Container_name] = dict(Database["Containers"][Container_name])
+    return Record
 
-def vector_norm(a):
-    """Returns the norm of a vector"""
-    return sqrt(a["X"]**2 + a["Y"]**2 + a["Z"]**2)
-
-def vector_product(a, b):
-    """Returns the dot product of two vectors"""
-    return a["X"]*b["X"] + a["Y"]*b["Y"] + a["Z"]*b["Z"]
-
-def angle_between_vectors(a, b):
-    """Function that returns an angle in degrees between 2 vectors"""
-    try :
-        angle = degrees(acos(vector_product(a, b) / (vector_norm(a) * vector_norm(b))))
-    except ZeroDivisionError:
-        angle = 0.0
-    return angle
-
-def rotate_point_2D(Unrotated_coordinates, angle):
-    Rotated_coordinates = {}
-    Rotated_coordinates["X"] = Unrotated_coordinates["X"] * cos(angle) - Unrotated_coordinates["Y"]*sin(angle)
-    Rotated_coordinates["Y"] = Unrotated_coordinates["X"] * sin(angle) + Unrotated_coordinates["Y"]*cos(angle)
-    Rotated_coordinates["Z"] = Unrotated_coordinates["Z"]
-    return (Rotated_coordinates)
 
+# Container of the positions outside of every container
+No_container = {
+    "Name": "None",
+    "X": 0,
+    "Y": 0,
+    "Z": 0,
+    "Rotation Speed": 0,
+    "Rotation Adjust": 0,
+    "OM Radius": 0,
+    "Body Radius": 0,
+    "POI": {}
+}
 
 def get_current_container(X : float, Y : float, Z : float):
-    Actual_Container = {
-        "Name": "None",
-        "X": 0,
-        "Y": 0,
-        "Z": 0,
-        "Rotation Speed": 0,
-        "Rotation Adjust": 0,
-        "OM Radius": 0,
-        "Body Radius": 0,
-        "POI": {}
-    }
-    for i in Database["Containers"] :
-        Container_vector = {"X" : Database["Containers"][i]["X"] - X, "Y" : Database["Containers"][i]["Y"] - Y, "Z" : Database["Containers"][i]["Z"] - Z}
-        if vector_norm(Container_vector) <= 3 * Database["Containers"][i]["OM Radius"]:
-            Actual_Container = Database["Containers"][i]
-    return Actual_Container
-
-
-def get_local_rotated_coordinates(Time_passed : float, X : float, Y : float, Z : float, Actual_Container : dict):
-    
-    try:
-        Rotation_speed_in_degrees_per_second = 0.1 * (1/Actual_Container["Rotation Speed"])
-    except ZeroDivisionError:
-        Rotation_speed_in_degrees_per_second = 0
-    
-    Rotation_state_in_degrees = ((Rotation_speed_in_degrees_per_second * Time_passed) + Actual_Container["Rotation Adjust"]) % 360
-    
-    local_unrotated_coordinates = {
-        "X": X - Actual_Container["X"],
-        "Y": Y - Actual_Container["Y"],
-        "Z": Z - Actual_Container["Z"]
-    }
-    
-    local_rotated_coordinates = rotate_point_2D(local_unrotated_coordinates, radians(-1*Rotation_state_in_degrees))
-    
-    return local_rotated_coordinates
-
-
-def get_lat_long_height(X : float, Y : float, Z : float, Container : dict):
-    Radius = Container["Body Radius"]
-    
-    Radial_Distance = sqrt(X**2 + Y**2 + Z**2)
+    #Innermost container within 3 OM Radius of the position
+    Container_name = Containers_index.find(X, Y, Z)
+    if Container_name is None:
+        return No_container
+    return container_record(Container_name)
+
+
+POI_search = None
+
+def get_poi_search():
+    """Returns the NumPy nearest POI engine, built on first use so numpy is not imported before the backend is ready"""
+    global POI_search
+    if POI_search is None:
+        from poi_search import POISearch
+        POI_search = POISearch.from_database(Database)
+    return POI_search
+
+
+POI_distances = None
+# The warm up and the first route can ask for the distances at the same time : they are built and saved once
+POI_distances_lock = threading.Lock()
+
+def get_poi_distances():
+    """Returns the distances between the POIs of every container, read from the cache or built on first use"""
+    global POI_distances
+    if POI_distances is None:
+        with POI_distances_lock:
+            if POI_distances is None:
+                from poi_distances import load_distance_cache
+                POI_distances = load_distance_cache(Database)
+    return POI_distances
+
+
+def warm_up_poi_engines(Target : dict = None):
+    get_poi_search()
+    get_poi_distances()
+    if Target is not None:
+        select_target(Target)
+
+
+# Stands for the POIs and OMs a container does not have (the Lagrange points have no OM, some containers have
+# fewer POIs than asked or none, and there are none outside of the containers), NaN is sent as null
+No_POI = {"Name" : "None", "Distance" : nan}
+
+def get_closest_POI(X : float, Y : float, Z : float, Container : dict, Quantum_marker : bool = False, k : int = None):
+    """Returns the k POIs of the container closest to a local position (all of them if k is None), closest first,
+    completed with No_POI if the container has fewer than k"""
+    Names, Distances = get_poi_search().closest(X, Y, Z, Container["Name"], k, Quantum_marker)
     
-    Height = Radial_Distance - Radius
+    Target_to_POIs_Distances_Sorted = [{"Name" : Name, "Distance" : float(Distance)} for Name, Distance in zip(Names, Distances)]
+    if k is not None:
+        Target_to_POIs_Distances_Sorted += [No_POI] * (k - len(Target_to_POIs_Distances_Sorted))
+    return Target_to_POIs_Distances_Sorted
 
-    #Latitude
-    try :
-        Latitude = degrees(asin(Z/Radial_Distance))
-    except :
-        Latitude = 0
-    
-    try :
-        Longitude = -1*degrees(atan2(X, Y))
-    except :
-        Longitude = 0
-    
-    return [Latitude, Longitude, Height]
 
+def get_player_closest_POI(X : float, Y : float, Z : float, Container : dict, State : dict, k : int):
+    """get_closest_POI for the player of a navigation state : the POIs of the previous update are kept while no other
+    POI can have come closer (poi_search.ClosestTracker)"""
+    Tracker = State.get("Closest_POI_tracker")
+    if Tracker is None:
+        from poi_search import ClosestTracker
+        Tracker = State["Closest_POI_tracker"] = ClosestTracker(k)
+    Names, Distances = Tracker.closest(get_poi_search(), X, Y, Z, Container["Name"])
 
-def get_closest_POI(X : float, Y : float, Z : float, Container : dict, Quantum_marker : bool = False):
-    
-    Distances_to_POIs = []
-    
-    for POI in Container["POI"]:
-        Vector_POI = {
-            "X": abs(X - Container["POI"][POI]["X"]),
-            "Y": abs(Y - Container["POI"][POI]["Y"]),
-            "Z": abs(Z - Container["POI"][POI]["Z"])
-        }
+    Player_to_POIs_Distances_Sorted = [{"Name" : Name, "Distance" : Distance} for Name, Distance in zip(Names, Distances)]
+    Player_to_POIs_Distances_Sorted += [No_POI] * (k - len(Player_to_POIs_Distances_Sorted))
+    return Player_to_POIs_Distances_Sorted
 
-        Distance_POI = vector_norm(Vector_POI)
 
-        if Quantum_marker and Container["POI"][POI]["QTMarker"] == "TRUE" or not Quantum_marker:
-            Distances_to_POIs.append({"Name" : POI, "Distance" : Distance_POI})
 
-    Target_to_POIs_Distances_Sorted = sorted(Distances_to_POIs, key=lambda k: k['Distance'])
-    return Target_to_POIs_Distances_Sorted
+# Plain dict copies of the OMs of the containers, forgotten with Container_records
+Container_OMs = {}
 
+def container_oms(Container : dict):
+    OMs = Container_OMs.get(Container["Name"])
+    if OMs is None:
+        POIs = Container["POI"]
+        OMs = Container_OMs[Container["Name"]] = {name : dict(POIs[name]) for name in ["OM-1", "OM-2", "OM-3", "OM-4", "OM-5", "OM-6"] if name in POIs}
+    return OMs
 
 
 def get_closest_oms(X : float, Y : float, Z : float, Container : dict):
+    """{axis : {"OM", "Distance"}} of the closest OM on each axis of a local position, No_POI for the containers without OMs"""
     Closest_OM = {}
-    
-    if X >= 0:
-        Closest_OM["X"] = {"OM" : Container["POI"]["OM-5"], "Distance" : vector_norm({"X" : X - Container["POI"]["OM-5"]["X"], "Y" : Y - Container["POI"]["OM-5"]["Y"], "Z" : Z - Container["POI"]["OM-5"]["Z"]})}
-    else:
-        Closest_OM["X"] = {"OM" : Container["POI"]["OM-6"], "Distance" : vector_norm({"X" : X - Container["POI"]["OM-6"]["X"], "Y" : Y - Container["POI"]["OM-6"]["Y"], "Z" : Z - Container["POI"]["OM-6"]["Z"]})}
-    if Y >= 0:
-        Closest_OM["Y"] = {"OM" : Container["POI"]["OM-3"], "Distance" : vector_norm({"X" : X - Container["POI"]["OM-3"]["X"], "Y" : Y - Container["POI"]["OM-3"]["Y"], "Z" : Z - Container["POI"]["OM-3"]["Z"]})}
-    else:
-        Closest_OM["Y"] = {"OM" : Container["POI"]["OM-4"], "Distance" : vector_norm({"X" : X - Container["POI"]["OM-4"]["X"], "Y" : Y - Container["POI"]["OM-4"]["Y"], "Z" : Z - Container["POI"]["OM-4"]["Z"]})}
-    if Z >= 0:
-        Closest_OM["Z"] = {"OM" : Container["POI"]["OM-1"], "Distance" : vector_norm({"X" : X - Container["POI"]["OM-1"]["X"], "Y" : Y - Container["POI"]["OM-1"]["Y"], "Z" : Z - Container["POI"]["OM-1"]["Z"]})}
-    else:
-        Closest_OM["Z"] = {"OM" : Container["POI"]["OM-2"], "Distance" : vector_norm({"X" : X - Container["POI"]["OM-2"]["X"], "Y" : Y - Container["POI"]["OM-2"]["Y"], "Z" : Z - Container["POI"]["OM-2"]["Z"]})}
+    OMs = container_oms(Container)
+
+    # On each axis the closest OM is the one on the side of the player
+    for axis, Coordinate, Positive_OM, Negative_OM in (("X", X, "OM-5", "OM-6"), ("Y", Y, "OM-3", "OM-4"), ("Z", Z, "OM-1", "OM-2")):
+        OM = OMs.get(Positive_OM if Coordinate >= 0 else Negative_OM)
+        if OM is None:
+            Closest_OM[axis] = {"OM" : No_POI, "Distance" : nan}
+        else :
+            dx, dy, dz = X - OM["X"], Y - OM["Y"], Z - OM["Z"]
+            Closest_OM[axis] = {"OM" : OM, "Distance" : sqrt(dx*dx + dy*dy + dz*dz)}
 
     return Closest_OM
 
 
 
-def get_sunset_sunrise_predictions(X : float, Y : float, Z : float, Latitude : float, Longitude : float, Height : float, Container : dict, Star : dict):
+def get_rise_set_hour_angle(Latitude : float, Height : float, Container : dict, Star : dict):
+    """Hour angle of the sunrise/sunset at a location, it does not change with time"""
+    import day_night
+    Constants = day_night.get_star_constants(Container, Star)
+
+    # Determine correction for location height
+    ElevationCorrection = degrees(acos(Container["Body Radius"]/(Container["Body Radius"]))) if Height<0 else degrees(acos(Container["Body Radius"]/(Container["Body Radius"]+Height)))
+
+    # Determine Rise/Set Hour Angle
+    # The star rises at + (positive value) rise/set hour angle and sets at - (negative value) rise/set hour angle
+    # Solar Declination and Apparent Radius come from the first set of equations when we determined where the star is.
+    return degrees(acos(-tan(radians(Latitude))*tan(radians(Constants["Solar_declination"]))))+Constants["Apparent_Radius"]+ElevationCorrection
+
+
+def get_sunset_sunrise_predictions(X : float, Y : float, Z : float, Latitude : float, Longitude : float, Height : float, Container : dict, Star : dict, Time_passed_since_reference_in_seconds : float, RiseSetHourAngle : float = None):
+    """[state of the day, next event, minutes to the next event] at a location (RiseSetHourAngle : precomputed for fixed locations)"""
     try :
-        # Stanton X Y Z coordinates in refrence of the center of the system
-        sx, sy, sz = Star["X"], Star["Y"], Star["Z"]
-        
-        # Container X Y Z coordinates in refrence of the center of the system
-        bx, by, bz = Container["X"], Container["Y"], Container["Z"]
-        
+        # The star position in the container frame, the solar declination, the apparent radius of the star
+        # and the meridian only depend on the container and the star : they are computed once per container
+        import day_night
+        Constants = day_night.get_star_constants(Container, Star)
+        Meridian = Constants["Meridian"]
+
         # Rotation speed of the container
         rotation_speed = Container["Rotation Speed"]
-        
-        # Container qw/qx/qy/qz quaternion rotation 
-        qw, qx, qy, qz = Container["qw"], Container["qx"], Container["qy"], Container["qz"]
-        
-        # Stanton X Y Z coordinates in refrence of the center of the container
-        bsx = ((1-(2*qy**2)-(2*qz**2))*(sx-bx))+(((2*qx*qy)-(2*qz*qw))*(sy-by))+(((2*qx*qz)+(2*qy*qw))*(sz-bz))
-        bsy = (((2*qx*qy)+(2*qz*qw))*(sx-bx))+((1-(2*qx**2)-(2*qz**2))*(sy-by))+(((2*qy*qz)-(2*qx*qw))*(sz-bz))
-        bsz = (((2*qx*qz)-(2*qy*qw))*(sx-bx))+(((2*qy*qz)+(2*qx*qw))*(sy-by))+((1-(2*qx**2)-(2*qy**2))*(sz-bz))
-        
-        # Solar Declination of Stanton
-        Solar_declination = degrees(acos((((sqrt(bsx**2+bsy**2+bsz**2))**2)+((sqrt(bsx**2+bsy**2))**2)-(bsz**2))/(2*(sqrt(bsx**2+bsy**2+bsz**2))*(sqrt(bsx**2+bsy**2)))))*copysign(1,bsz)
-        
-        # Radius of Stanton
-        StarRadius = Star["Body Radius"] # OK
-        
-        # Apparent Radius of Stanton
-        Apparent_Radius = degrees(asin(StarRadius/(sqrt((bsx)**2+(bsy)**2+(bsz)**2))))
-        
+
         # Length of day is the planet rotation rate expressed as a fraction of a 24 hr day.
-        LengthOfDay = 3600*rotation_speed/86400
+        LengthOfDay = Constants["LengthOfDay"]
         
         
         
@@ -390,22 +412,6 @@ def get_sunset_sunrise_predictions(X : float, Y : float, Z : float, Latitude : f
         CurrentRotation = (360-(CurrentCycle%1)*360-RotationCorrection)%360
         
         
-        # Meridian determine where the star would be if the planet did not rotate.
-        # Between the planet and Stanton there is a plane that contains the north pole and south pole
-        # of the planet and the center of Stanton. Locations on the surface of the planet on this plane
-        # experience the phenomenon we call noon.
-        Meridian = degrees( (atan2(bsy,bsx)-(pi/2)) % (2*pi) )
-        
-        # Because the planet rotates, the location of noon is constantly moving. This equation
-        # computes the current longitude where noon is occurring on the planet.
-        SolarLongitude = CurrentRotation-(0-Meridian)%360
-        if SolarLongitude>180:
-            SolarLongitude = SolarLongitude-360
-        elif SolarLongitude<-180:
-            SolarLongitude = SolarLongitude+360
-        
-        
-        
         # The difference between Longitude and Longitude360 is that for Longitude, Positive values
         # indicate locations in the Eastern Hemisphere, Negative values indicate locations in the Western
         # Hemisphere.
@@ -413,13 +419,8 @@ def get_sunset_sunrise_predictions(X : float, Y : float, Z : float, Latitude : f
         # longitude 180-359 are in the Western Hemisphere.
         Longitude360 = Longitude%360 # OK
         
-        # Determine correction for location height
-        ElevationCorrection = degrees(acos(Container["Body Radius"]/(Container["Body Radius"]))) if Height<0 else degrees(acos(Container["Body Radius"]/(Container["Body Radius"]+Height)))
-        
-        # Determine Rise/Set Hour Angle
-        # The star rises at + (positive value) rise/set hour angle and sets at - (negative value) rise/set hour angle
-        # Solar Declination and Apparent Radius come from the first set of equations when we determined where the star is.
-        RiseSetHourAngle = degrees(acos(-tan(radians(Latitude))*tan(radians(Solar_declination))))+Apparent_Radius+ElevationCorrection
+        if RiseSetHourAngle is None:
+            RiseSetHourAngle = get_rise_set_hour_angle(Latitude, Height, Container, Star)
         
         # Determine the current Hour Angle of the star
         
@@ -444,35 +445,18 @@ def get_sunset_sunrise_predictions(X : float, Y : float, Z : float, Latitude : f
             AngularRotationRate = 0
         
         
+        # Only the times of the next sunrise and sunset are used (not the ones of midnight, the twilights or noon)
         if AngularRotationRate != 0 :
-            midnight = (HourAngle + 180) / AngularRotationRate
-            
-            morning = (HourAngle - (RiseSetHourAngle+12)) / AngularRotationRate
-            if HourAngle <= RiseSetHourAngle+12:
-                morning = morning + LengthOfDay*24*60
-            
             sunrise = (HourAngle - RiseSetHourAngle) / AngularRotationRate
             if HourAngle <= RiseSetHourAngle:
                 sunrise = sunrise + LengthOfDay*24*60
             
-            noon = (HourAngle - 0) / AngularRotationRate
-            if HourAngle <= 0:
-                noon = noon + LengthOfDay*24*60
-            
             sunset = (HourAngle - -1*RiseSetHourAngle) / AngularRotationRate
             if HourAngle <= -1*RiseSetHourAngle:
                 sunset = sunset + LengthOfDay*24*60
-            
-            evening = (HourAngle - (-1*RiseSetHourAngle-12)) / AngularRotationRate
-            if HourAngle <= -1*(RiseSetHourAngle-12):
-                evening = evening + LengthOfDay*24*60
         else :
-            midnight = 0
-            morning = 0
             sunrise = 0
-            noon = 0
             sunset = 0
-            evening = 0
         
         
         
@@ -519,774 +503,1565 @@ Reference_time_UTC = datetime.datetime(2020, 1, 1)
 Epoch = datetime.datetime(1970, 1, 1)
 Reference_time = (Reference_time_UTC - Epoch).total_seconds()
 
+# Clock of the "updated" fields and of the first update, replaced by a fixed one in the benchmarks
+Wall_clock = time.time
+
+
+
+Log_writer = None
+
+def start_new_log_run():
+    """Starts the background writer of Logs.csv if needed and marks the start of a new run in it"""
+    global Log_writer
+    if Log_writer is None:
+        Log_writer = LogWriter('Logs/Logs.csv', max_bytes=int(settings.get("logs_max_size_mb", 50)*1024*1024))
+        Log_writer.start()
+        atexit.register(Log_writer.close)
+    Log_writer.new_run()
+
+
+def log_player_position(New_Player_Global_coordinates : dict, New_time : float):
+    """Queues a Logs.csv row for a player position, positions outside of the containers are not logged"""
+    Actual_Container = get_current_container(New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"])
+    if Actual_Container['Name'] == "None":
+        return
+
+    New_player_local_rotated_coordinates = get_local_rotated_coordinates(New_time - Reference_time, New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"], Actual_Container)
+    player_Latitude, player_Longitude, player_Height = get_lat_long_height(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container)
+
+    fields = [
+        'None',
+        'Stanton',
+        str(New_player_local_rotated_coordinates["X"]*1000),
+        str(New_player_local_rotated_coordinates["Y"]*1000),
+        str(New_player_local_rotated_coordinates["Z"]*1000),
+        str(Actual_Container['Name']),
+        str(New_player_local_rotated_coordinates['X']),
+        str(New_player_local_rotated_coordinates['Y']),
+        str(New_player_local_rotated_coordinates['Z']),
+        str(player_Longitude),
+        str(player_Latitude),
+        str(player_Height*1000),
+        str(time.time()),
+        time.strftime('%d %b %Y %H:%M:%S', time.gmtime(time.time())),
+        "",
+        ""
+    ]
+    Log_writer.write(fields)
+
+
+
+#-----------------------------------------------------Target context--------------------------------------------------------------
+# What planetary_nav needs about its target and that does not change while navigating to it : its container, its
+# latitude/longitude/height, its closest OMs and QT beacon, its sunrise/sunset hour angle. Built once per target,
+# the context of the chosen target is kept in Cache/Target_context.json when "remember_choices" is set, so a relaunch
+# navigates without building it again. It is not written in settings.json : the reload watcher would take every
+# choice of a target for a change of the settings.
+
+Target_contexts = {}
 
-if logs_enabled == True:
-    if not os.path.isdir('Logs'):
-        os.mkdir('Logs')
+Target_context_path = "Cache/Target_context.json"
+# Context in Target_context_path, None if there is none
+Saved_target_context = None
 
-    if not os.path.isfile('Logs/Logs.csv'):
-        field = ['Key', 'System' ,'Global_X', 'Global_Y', 'Global_Z', 'Container', 'Local_X', 'Local_Y', 'Local_Z', 'Longitude', 'Latitude', 'Height', 'Time', 'Readable_Time', 'Player', 'Comment']
-        with open("Logs/Logs.csv","w+", newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(field)
+def target_key(Target : dict):
+    # The custom targets of space_nav have no container
+    return [Target.get("Container"), Target["Name"], Target["X"], Target["Y"], Target["Z"]]
+
+
+def build_target_context(Target : dict):
+    Container = container_record(Target["Container"])
+
+    #Grab the rotation speed of the container in the Database and convert it in degrees/s
+    try:
+        Rotation_speed_in_degrees_per_second = 0.1 * (1/Container["Rotation Speed"])
+    except ZeroDivisionError:
+        Rotation_speed_in_degrees_per_second = 0
+
+    Latitude, Longitude, Height = get_lat_long_height(Target["X"], Target["Y"], Target["Z"], Container)
+
+    if Target["QTMarker"] != "FALSE":
+        Closest_QT_beacon = {"Name" : "POI itself", "Distance" : 0}
+    elif Target["Name"] in Database.snapshot.poi_index.get(Target["Container"], ()):
+        # POI of the database : its closest beacon is in the distance cache
+        Closest_QT_beacon = (get_poi_distances().closest_quantum(Target["Container"], Target["Name"]) or [No_POI])[0]
+    else :
+        Closest_QT_beacon = get_closest_POI(Target["X"], Target["Y"], Target["Z"], Container, True, k=1)[0]
+
+    Closest_OMs = get_closest_oms(Target["X"], Target["Y"], Target["Z"], Container)
+
+    try :
+        RiseSetHourAngle = get_rise_set_hour_angle(Latitude, Height, Container, container_record("Stanton"))
+    except ValueError:
+        # Poles : get_sunset_sunrise_predictions reports the error on every update
+        RiseSetHourAngle = None
+
+    return {
+        "Source_hash" : Database.snapshot.source_hash,
+        "Key" : target_key(Target),
+        # Plain copy of the fields of the target, read on every update
+        "Target" : dict(Target),
+        "Container" : Container,
+        "Rotation_speed_in_degrees_per_second" : Rotation_speed_in_degrees_per_second,
+        "Rotation_adjust" : Container["Rotation Adjust"],
+        "Latitude" : Latitude,
+        "Longitude" : Longitude,
+        "Height" : Height,
+        "Closest_OMs" : {axis : {"Name" : Closest_OMs[axis]["OM"]["Name"], "Distance" : Closest_OMs[axis]["Distance"]} for axis in ["X", "Y", "Z"]},
+        "Closest_QT_beacon" : Closest_QT_beacon,
+        "RiseSetHourAngle" : RiseSetHourAngle
+    }
+
+
+def get_target_context(Target : dict):
+    """Returns the context of a planetary_nav target, built on its first use"""
+    key = tuple(target_key(Target))
+    Context = Target_contexts.get(key)
+    if Context is None:
+        Context = Target_contexts[key] = build_target_context(Target)
+    return Context
+
+
+def load_saved_target_context():
+    """Adds the context saved in Target_context_path if it was built from this database"""
+    global Saved_target_context
+    try :
+        with open(Target_context_path, "r") as f:
+            Saved = json.load(f)
+    except (OSError, ValueError):
+        return
+    if not isinstance(Saved, dict):
+        return
+    Saved_target_context = Saved
+    if Saved.get("Source_hash") != Database.snapshot.source_hash or "Target" not in Saved:
+        return
+    try :
+        Context = dict(Saved, Container = container_record(Saved["Container"]))
+        Target_contexts[tuple(Saved["Key"])] = Context
+    except (KeyError, TypeError):
+        pass
+
+
+def save_target_context(Context : dict):
+    """Writes the context of the chosen target in Target_context_path"""
+    global Saved_target_context
+    Saved = dict(Context, Container = Context["Container"]["Name"])
+    try :
+        os.makedirs(os.path.dirname(Target_context_path), exist_ok=True)
+        with open(Target_context_path + ".tmp", "w") as f:
+            json.dump(Saved, f, indent=4)
+        os.replace(Target_context_path + ".tmp", Target_context_path)
+        Saved_target_context = Saved
+    except (OSError, ValueError):
+        # Only the warm-up of the next launch is lost
+        pass
+
+
+def select_target(Target : dict):
+    """Builds the context of a chosen planetary_nav target and keeps it if the choices are remembered"""
+    Context = get_target_context(Target)
+    Saved = Saved_target_context or {}
+    if settings.get("remember_choices") == True and (Saved.get("Key") != Context["Key"] or Saved.get("Source_hash") != Context["Source_hash"]):
+        save_target_context(Context)
+    return Context
+
+
+load_saved_target_context()
+
+
+
+def new_navigation_state():
+    """Returns the memory of the previous updates : the trajectory used for the deltas, the ETA and the deviations and the previous position of the companion"""
+    State = {}
+
+    Old_player_Global_coordinates = {}
+    for i in ["X", "Y", "Z"]:
+        Old_player_Global_coordinates[i] = 0.0
+
+    Old_player_local_rotated_coordinates = {}
+    for i in ["X", "Y", "Z"]:
+        Old_player_local_rotated_coordinates[i] = 0.0
+
+    Old_container = {
+        "Name": "None",
+        "X": 0,
+        "Y": 0,
+        "Z": 0,
+        "Rotation Speed": 0,
+        "Rotation Adjust": 0,
+        "OM Radius": 0,
+        "Body Radius": 0,
+        "POI": {}
+    }
+
+    State["Old_player_Global_coordinates"] = Old_player_Global_coordinates
+    State["Old_player_local_rotated_coordinates"] = Old_player_local_rotated_coordinates
+    State["Old_container"] = Old_container
+    State["Trajectory"] = Trajectory()
+
+    return State
+
+
+
+def track(State : dict, New_time : float, Position : dict, Distance : float, Frame):
+    """Adds a sample to the trajectory of a navigation state, returns the course (km covered at the filtered velocity
+    since the previous sample), the filtered change of the distance to the target and the ETA"""
+    Trajectory = State["Trajectory"]
+    Trajectory.add(New_time, [Position["X"], Position["Y"], Position["Z"], Distance], Frame)
+    Velocity = Trajectory.velocity
+    Step = Trajectory.step
+
+    Course = {"X" : Velocity[0] * Step, "Y" : Velocity[1] * Step, "Z" : Velocity[2] * Step}
+
+    Delta_Distance_to_POI_Total = Velocity[3] * Step
+
+    #get the time it would take to reach destination using the same speed
+    try :
+        Estimated_time_of_arrival = Distance/abs(Velocity[3])
+    except ZeroDivisionError:
+        Estimated_time_of_arrival = 0.00
+
+    return Course, Delta_Distance_to_POI_Total, Estimated_time_of_arrival
+
+
+
+def planetary_nav_update(New_Player_Global_coordinates : dict, New_time : float, Target : dict, State : dict):
+    """Computes the data displayed by planetary_nav for a new player position"""
+    # Everything about the target that does not depend on the player
+    Target_context = State.get("Target_context")
+    if Target_context is None:
+        Target_context = State["Target_context"] = get_target_context(Target)
+    Target = Target_context["Target"]
+    Target_container = Target_context["Container"]
+
+
+
+
+    #---------------------------------------------------Actual Container----------------------------------------------------------------
+    #search in the Databse to see if the player is ina Container
+    Actual_Container = get_current_container(New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"])
+
+
+
+    #---------------------------------------------------New player local coordinates----------------------------------------------------
+    #Time passed since the start of game simulation
+    Time_passed_since_reference_in_seconds = New_time - Reference_time
     
-    New_run_field = ['New_Run']
-    with open(r'Logs/Logs.csv', 'a', newline='') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(New_run_field)
+    New_player_local_rotated_coordinates = get_local_rotated_coordinates(Time_passed_since_reference_in_seconds, New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"], Actual_Container)
 
 
+    #---------------------------------------------------New target local coordinates----------------------------------------------------
+    #Get the actual rotation state in degrees using the rotation speed of the container, the actual time and a rotational adjustment value
+    target_Rotation_state_in_degrees = ((Target_context["Rotation_speed_in_degrees_per_second"] * Time_passed_since_reference_in_seconds) + Target_context["Rotation_adjust"]) % 360
 
+    #get the new player rotated coordinates
+    target_rotated_coordinates = rotate_point_2D(Target, radians(target_Rotation_state_in_degrees))
 
-Old_clipboard = ""
 
-Old_player_Global_coordinates = {}
-for i in ["X", "Y", "Z"]:
-    Old_player_Global_coordinates[i] = 0.0
 
-Old_player_local_rotated_coordinates = {}
-for i in ["X", "Y", "Z"]:
-    Old_player_local_rotated_coordinates[i] = 0.0
 
-Old_Distance_to_POI = {}
-for i in ["X", "Y", "Z"]:
-    Old_Distance_to_POI[i] = 0.0
+    #-------------------------------------------------player local Long Lat Height--------------------------------------------------
+    
+    if Actual_Container['Name'] != "None":
+        player_Latitude, player_Longitude, player_Height = get_lat_long_height(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container)
+    else :
+        # Outside of the containers the position has no latitude, longitude or height (nor heading or day state)
+        player_Latitude, player_Longitude, player_Height = nan, nan, nan
+    
+    #-------------------------------------------------target local Long Lat Height--------------------------------------------------
+    target_Latitude, target_Longitude, target_Height = Target_context["Latitude"], Target_context["Longitude"], Target_context["Height"]
 
-Old_container = {
-    "Name": "None",
-    "X": 0,
-    "Y": 0,
-    "Z": 0,
-    "Rotation Speed": 0,
-    "Rotation Adjust": 0,
-    "OM Radius": 0,
-    "Body Radius": 0,
-    "POI": {}
-}
 
 
-Old_time = time.time()
+    #---------------------------------------------------Distance to POI-----------------------------------------------------------------
+    New_Distance_to_POI = {}
+    
+    if Actual_Container == Target["Container"]:
+        for i in ["X", "Y", "Z"]:
+            New_Distance_to_POI[i] = abs(Target[i] - New_player_local_rotated_coordinates[i])
+    
+    
+    else:
+        for i in ["X", "Y", "Z"]:
+            New_Distance_to_POI[i] = abs((target_rotated_coordinates[i] + Target_container[i]) - New_Player_Global_coordinates[i])
+
+    #get the real new distance between the player and the target
+    New_Distance_to_POI_Total = vector_norm(New_Distance_to_POI)
+
+
+
+    #------------------------------------------Delta Distance and Estimated time of arrival to POI--------------------------------------
+    #the local coordinates are only comparable in the same container, and the distances for the same target
+    Course, Delta_Distance_to_POI_Total, Estimated_time_of_arrival = track(State, New_time, New_player_local_rotated_coordinates, New_Distance_to_POI_Total, [Actual_Container["Name"]] + Target_context["Key"])
+
+
+
+    #----------------------------------------------------Player Closest POI--------------------------------------------------------
+    Player_to_POIs_Distances_Sorted = get_player_closest_POI(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container, State, 1)
+
+
+    #-------------------------------------------------------3 Closest OMs to player---------------------------------------------------------------
+    player_Closest_OM = get_closest_oms(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container)
 
 
-#Reset the clipboard content
-pyperclip.copy("")
 
+    #----------------------------------------------------Course Deviation to POI--------------------------------------------------------
+    X, Y, Z = New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"]
 
-while True:
+    #get the vector between current_pos and target_pos (Vector BD, Current -> Target, of the Flat_angle)
+    Current_target_pos_vector = {"X" : Target["X"] - X, "Y" : Target["Y"] - Y, "Z" : Target["Z"] - Z}
 
-    #Get the new clipboard content
-    new_clipboard = pyperclip.paste()
 
+    #get the angle between the current-target_pos vector and the course of the player
+    Total_deviation_from_target = angle_between_vectors(Course, Current_target_pos_vector)
+
+
+
+
+    #----------------------------------------------------------Flat_angle--------------------------------------------------------------
+    #previous position on the filtered course
+    previous_X, previous_Y, previous_Z = X - Course["X"], Y - Course["Y"], Z - Course["Z"]
+
+    #Vector AB (Previous -> Current)
+    previous_to_current_X, previous_to_current_Y, previous_to_current_Z = X - previous_X, Y - previous_Y, Z - previous_Z
+
+    #Vector AC (C = center of the planet, Previous -> Center)
+    previous_to_center_X, previous_to_center_Y, previous_to_center_Z = 0 - previous_X, 0 - previous_Y, 0 - previous_Z
+
+    #Vector BD (Current -> Target)
+    current_to_target_X, current_to_target_Y, current_to_target_Z = Current_target_pos_vector["X"], Current_target_pos_vector["Y"], Current_target_pos_vector["Z"]
+
+    #Vector BC (C = center of the planet, Current -> Center)
+    current_to_center_X, current_to_center_Y, current_to_center_Z = 0 - X, 0 - Y, 0 - Z
+
+
+
+    #Normal vector of a plane:
+    #abc : Previous/Current/Center
+    n1 = {
+        "X" : previous_to_current_Y * previous_to_center_Z - previous_to_current_Z * previous_to_center_Y,
+        "Y" : previous_to_current_Z * previous_to_center_X - previous_to_current_X * previous_to_center_Z,
+        "Z" : previous_to_current_X * previous_to_center_Y - previous_to_current_Y * previous_to_center_X
+    }
+
+    #acd : Previous/Center/Target
+    n2 = {
+        "X" : current_to_target_Y * current_to_center_Z - current_to_target_Z * current_to_center_Y,
+        "Y" : current_to_target_Z * current_to_center_X - current_to_target_X * current_to_center_Z,
+        "Z" : current_to_target_X * current_to_center_Y - current_to_target_Y * current_to_center_X
+    }
+
+    Flat_angle = angle_between_vectors(n1, n2)
+
+
+
+
+
+
+    #----------------------------------------------------------Heading--------------------------------------------------------------
+    
+    Bearing = get_bearing(player_Latitude, player_Longitude, target_Latitude, target_Longitude)
 
-    #If clipboard content hasn't changed
-    if new_clipboard == Old_clipboard or new_clipboard == "":
 
-        #Wait some time
-        time.sleep(1/5)
 
 
-    #If clipboard content has changed
+    #-------------------------------------------------Sunrise Sunset Calculation----------------------------------------------------
+    if Actual_Container['Name'] != "None":
+        player_state_of_the_day, player_next_event, player_next_event_time = get_sunset_sunrise_predictions(
+            New_player_local_rotated_coordinates["X"], 
+            New_player_local_rotated_coordinates["Y"], 
+            New_player_local_rotated_coordinates["Z"], 
+            player_Latitude, 
+            player_Longitude, 
+            player_Height, 
+            Actual_Container, 
+            container_record("Stanton"),
+            Time_passed_since_reference_in_seconds
+        )
     else :
+        player_state_of_the_day, player_next_event, player_next_event_time = "Unknown", "Unknown", 0
+    
+    target_state_of_the_day, target_next_event, target_next_event_time = get_sunset_sunrise_predictions(
+        Target["X"], 
+        Target["Y"], 
+        Target["Z"], 
+        target_Latitude, 
+        target_Longitude, 
+        target_Height, 
+        Target_container, 
+        container_record("Stanton"),
+        Time_passed_since_reference_in_seconds,
+        Target_context["RiseSetHourAngle"]
+    )
+
+
+    #------------------------------------------------------------Backend to Frontend------------------------------------------------------------
+    # Raw values, formatted by the frontends (or by planetary_nav_text for the text protocol)
+    new_data = {
+        "time" : New_time,
+        "target" : Target['Name'],
+        "player_actual_container" : Actual_Container['Name'],
+        "target_container" : Target['Container'],
+        "player_x" : New_player_local_rotated_coordinates['X'],
+        "player_y" : New_player_local_rotated_coordinates['Y'],
+        "player_z" : New_player_local_rotated_coordinates['Z'],
+        "player_long" : player_Longitude,
+        "player_lat" : player_Latitude,
+        "player_height" : player_Height,
+        "player_OM1_name" : player_Closest_OM['Z']['OM']['Name'],
+        "player_OM1_distance" : player_Closest_OM['Z']['Distance'],
+        "player_OM2_name" : player_Closest_OM['Y']['OM']['Name'],
+        "player_OM2_distance" : player_Closest_OM['Y']['Distance'],
+        "player_OM3_name" : player_Closest_OM['X']['OM']['Name'],
+        "player_OM3_distance" : player_Closest_OM['X']['Distance'],
+        "player_closest_poi_name" : Player_to_POIs_Distances_Sorted[0]['Name'],
+        "player_closest_poi_distance" : Player_to_POIs_Distances_Sorted[0]['Distance'],
+        "player_state_of_the_day" : player_state_of_the_day,
+        "player_next_event" : player_next_event,
+        "player_next_event_time" : New_time + player_next_event_time*60,
+        "target_x" : Target["X"],
+        "target_y" : Target["Y"],
+        "target_z" : Target["Z"],
+        "target_long" : target_Longitude,
+        "target_lat" : target_Latitude,
+        "target_height" : target_Height,
+        "target_OM1_name" : Target_context["Closest_OMs"]['Z']['Name'],
+        "target_OM1_distance" : Target_context["Closest_OMs"]['Z']['Distance'],
+        "target_OM2_name" : Target_context["Closest_OMs"]['Y']['Name'],
+        "target_OM2_distance" : Target_context["Closest_OMs"]['Y']['Distance'],
+        "target_OM3_name" : Target_context["Closest_OMs"]['X']['Name'],
+        "target_OM3_distance" : Target_context["Closest_OMs"]['X']['Distance'],
+        "target_closest_QT_beacon_name" : Target_context["Closest_QT_beacon"]['Name'],
+        "target_closest_QT_beacon_distance" : Target_context["Closest_QT_beacon"]['Distance'],
+        "target_state_of_the_day" : target_state_of_the_day,
+        "target_next_event" : target_next_event,
+        "target_next_event_time" : New_time + target_next_event_time*60,
+        "distance_to_poi" : New_Distance_to_POI_Total,
+        "delta_distance_to_poi" : Delta_Distance_to_POI_Total,
+        "total_deviation" : Total_deviation_from_target,
+        "horizontal_deviation" : Flat_angle,
+        "heading" : Bearing,
+        "ETA" : Estimated_time_of_arrival
+    }
 
-        #update the memory with the new content
-        Old_clipboard = new_clipboard
 
-        New_time = time.time() + time_offset
+    return new_data
 
-        #If it contains some coordinates
-        if new_clipboard.startswith("Coordinates:"):
 
 
-            #split the clipboard in sections
-            new_clipboard_splitted = new_clipboard.replace(":", " ").split(" ")
+def space_nav_update(New_Player_Global_coordinates : dict, New_time : float, Target : dict, State : dict):
+    """Computes the data displayed by space_nav for a new player position"""
 
+    #-----------------------------------------------------Distance to POI---------------------------------------------------------------
+    New_Distance_to_POI = {}
+    for i in ["X", "Y", "Z"]:
+        New_Distance_to_POI[i] = abs(Target[i] - New_Player_Global_coordinates[i])
 
-            #get the 3 new XYZ coordinates
-            New_Player_Global_coordinates = {}
-            New_Player_Global_coordinates['X'] = float(new_clipboard_splitted[3])/1000
-            New_Player_Global_coordinates['Y'] = float(new_clipboard_splitted[5])/1000
-            New_Player_Global_coordinates['Z'] = float(new_clipboard_splitted[7])/1000
+    #get the real new distance between the player and the target
+    New_Distance_to_POI_Total = vector_norm(New_Distance_to_POI)
 
 
 
-            #-----------------------------------------------------planetary_nav--------------------------------------------------------------
-            # If the target is within the attraction of a planet
-            if Mode == "planetary_nav":
 
+    #--------------------------------------Delta Distance to POI and Estimated time of arrival-------------------------------------------
+    Course, Delta_Distance_to_POI_Total, Estimated_time_of_arrival = track(State, New_time, New_Player_Global_coordinates, New_Distance_to_POI_Total, target_key(Target))
 
 
-                #---------------------------------------------------Actual Container----------------------------------------------------------------
-                #search in the Databse to see if the player is ina Container
-                Actual_Container = get_current_container(New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"])
 
+    #----------------------------------------------------Course Deviation---------------------------------------------------------------
 
+    #get the vector between current_pos and target_pos
+    Current_target_pos_vector = {}
+    for i in ['X', 'Y', 'Z']:
+        Current_target_pos_vector[i] = Target[i] - New_Player_Global_coordinates[i]
 
-                #---------------------------------------------------New player local coordinates----------------------------------------------------
-                #Time passed since the start of game simulation
-                Time_passed_since_reference_in_seconds = New_time - Reference_time
-                
-                New_player_local_rotated_coordinates = get_local_rotated_coordinates(Time_passed_since_reference_in_seconds, New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"], Actual_Container)
 
+    #get the angle between the current-target_pos vector and the course of the player
+    Course_Deviation = angle_between_vectors(Course, Current_target_pos_vector)
+    
+    
 
-                #---------------------------------------------------New target local coordinates----------------------------------------------------
-                #Grab the rotation speed of the container in the Database and convert it in degrees/s
-                target_Rotation_speed_in_hours_per_rotation = Database["Containers"][Target["Container"]]["Rotation Speed"]
-                try:
-                    target_Rotation_speed_in_degrees_per_second = 0.1 * (1/target_Rotation_speed_in_hours_per_rotation)
-                except ZeroDivisionError:
-                    target_Rotation_speed_in_degrees_per_second = 0
-                
-                #Get the actual rotation state in degrees using the rotation speed of the container, the actual time and a rotational adjustment value
-                target_Rotation_state_in_degrees = ((target_Rotation_speed_in_degrees_per_second * Time_passed_since_reference_in_seconds) + Database["Containers"][Target["Container"]]["Rotation Adjust"]) % 360
 
-                #get the new player rotated coordinates
-                target_rotated_coordinates = rotate_point_2D(Target, radians(target_Rotation_state_in_degrees))
 
 
+    #------------------------------------------------------------Backend to Frontend------------------------------------------------------------
+    # Raw values, formatted by the frontends (or by space_nav_text for the text protocol)
+    new_data = {
+        "time" : New_time,
+        "target" : Target['Name'],
+        "player_x" : New_Player_Global_coordinates['X'],
+        "player_y" : New_Player_Global_coordinates['Y'],
+        "player_z" : New_Player_Global_coordinates['Z'],
+        "target_x" : Target["X"],
+        "target_y" : Target["Y"],
+        "target_z" : Target["Z"],
+        "distance_to_poi" : New_Distance_to_POI_Total,
+        "delta_distance_to_poi" : Delta_Distance_to_POI_Total,
+        "total_deviation" : Course_Deviation,
+        "ETA" : Estimated_time_of_arrival
+    }
+    
 
 
-                #-------------------------------------------------player local Long Lat Height--------------------------------------------------
-                
-                if Actual_Container['Name'] != "None":
-                    player_Latitude, player_Longitude, player_Height = get_lat_long_height(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container)
-                
-                #-------------------------------------------------target local Long Lat Height--------------------------------------------------
-                target_Latitude, target_Longitude, target_Height = get_lat_long_height(Target["X"], Target["Y"], Target["Z"], Database["Containers"][Target["Container"]])
 
 
+    return new_data
 
-                #---------------------------------------------------Distance to POI-----------------------------------------------------------------
-                New_Distance_to_POI = {}
-                
-                if Actual_Container == Target["Container"]:
-                    for i in ["X", "Y", "Z"]:
-                        New_Distance_to_POI[i] = abs(Target[i] - New_player_local_rotated_coordinates[i])
-                
-                
-                else:
-                    for i in ["X", "Y", "Z"]:
-                        New_Distance_to_POI[i] = abs((target_rotated_coordinates[i] + Database["Containers"][Target["Container"]][i]) - New_Player_Global_coordinates[i])
 
-                #get the real new distance between the player and the target
-                New_Distance_to_POI_Total = vector_norm(New_Distance_to_POI)
 
-                if New_Distance_to_POI_Total <= 100:
-                    New_Distance_to_POI_Total_color = "#00ff00"
-                elif New_Distance_to_POI_Total <= 1000:
-                    New_Distance_to_POI_Total_color = "#ffd000"
-                else :
-                    New_Distance_to_POI_Total_color = "#ff3700"
+def companion_update(New_Player_Global_coordinates : dict, New_time : float, Target : dict, State : dict):
+    """Computes the data displayed by the companion for a new player position"""
+    Old_player_Global_coordinates = State["Old_player_Global_coordinates"]
+    Old_player_local_rotated_coordinates = State["Old_player_local_rotated_coordinates"]
+    Old_container = State["Old_container"]
 
+    
+    # Actual container
+    # Search in the Database to see if the player is in a Container
+    Actual_Container = get_current_container(New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"])
+    
+    
+    # If around a container :
+    if Actual_Container['Name'] == "None" :
+        
+        Distance_since_last_update = {}
+        for i in ["X", "Y", "Z"]:
+            Distance_since_last_update[i] = abs(Old_player_Global_coordinates[i] - New_Player_Global_coordinates[i])
+        Distance_since_last_update_Total = vector_norm(Distance_since_last_update)
+    
+    else :
+        
+        # Local coordinates
+        
+        #Time passed since the start of game simulation
+        Time_passed_since_reference_in_seconds = New_time - Reference_time
+        #Grab the rotation speed of the container in the Database and convert it in degrees/s
+        Rotation_speed_in_hours_per_rotation = Actual_Container["Rotation Speed"]
+        try:
+            Rotation_speed_in_degrees_per_second = 0.1 * (1/Rotation_speed_in_hours_per_rotation)
+        except ZeroDivisionError:
+            Rotation_speed_in_degrees_per_second = 0
+            return None
+        
+        #Get the actual rotation state in degrees using the rotation speed of the container, the actual time and a rotational adjustment value
+        Rotation_state_in_degrees = ((Rotation_speed_in_degrees_per_second * Time_passed_since_reference_in_seconds) + Actual_Container["Rotation Adjust"]) % 360
+        
+        #get the new player unrotated coordinates
+        New_player_local_unrotated_coordinates = {}
+        for i in ['X', 'Y', 'Z']:
+            New_player_local_unrotated_coordinates[i] = New_Player_Global_coordinates[i] - Actual_Container[i]
+        
+        #get the new player rotated coordinates
+        New_player_local_rotated_coordinates = rotate_point_2D(New_player_local_unrotated_coordinates, radians(-1*Rotation_state_in_degrees))
+        
+        
+        
+        Distance_since_last_update = {}
+        if Actual_Container["Name"] == Old_container["Name"]:
+            for i in ["X", "Y", "Z"]:
+                Distance_since_last_update[i] = abs(Old_player_local_rotated_coordinates[i] - New_player_local_rotated_coordinates[i])
+        
+        else :
+            for i in ["X", "Y", "Z"]:
+                Distance_since_last_update[i] = abs(Old_player_Global_coordinates[i] - New_Player_Global_coordinates[i])
+        Distance_since_last_update_Total = vector_norm(Distance_since_last_update)
+        
+        
+        
+        
+        # Lattitude, Longitude, Height
+        
+        #Radius of the container
+        Radius = Actual_Container["Body Radius"]
+        
+        #Radial_Distance
+        Radial_Distance = sqrt(New_player_local_rotated_coordinates["X"]**2 + New_player_local_rotated_coordinates["Y"]**2 + New_player_local_rotated_coordinates["Z"]**2)
+        
+        #Height
+        Height = Radial_Distance - Radius
+        
+        #Longitude
+        try :
+            Longitude = -1*degrees(atan2(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"]))
+        except Exception as err:
+            print(f'Error in Longitude : {err} \nx = {New_player_local_rotated_coordinates["X"]}, y = {New_player_local_rotated_coordinates["Y"]} \nPlease report this to Valalol#1790 for me to try to solve this issue')
+            sys.stdout.flush()
+            Longitude = 0
+        
+        #Latitude
+        try :
+            Latitude = degrees(asin(New_player_local_rotated_coordinates["Z"]/Radial_Distance))
+        except Exception as err:
+            print(f'Error in Latitude : {err} \nz = {New_player_local_rotated_coordinates["Z"]}, radius = {Radial_Distance} \nPlease report this at Valalol#1790 for me to try to solve this issue')
+            sys.stdout.flush()
+            Latitude = 0
+        
+        
+        
+        
+        
+        
+        
+        
+        # 3 closest OMs
+        Closest_OM = get_closest_oms(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container)
+    
+    
+    
+    
+    
+    
+    
+        # 2 Closest POIs
+        Player_to_POIs_Distances_Sorted = get_player_closest_POI(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container, State, 2)
 
-                #---------------------------------------------------Delta Distance to POI-----------------------------------------------------------
-                #get the real old distance between the player and the target
-                Old_Distance_to_POI_Total = vector_norm(Old_Distance_to_POI)
 
 
 
 
-                #get the 3 XYZ distance travelled since last update
-                Delta_Distance_to_POI = {}
-                for i in ["X", "Y", "Z"]:
-                    Delta_Distance_to_POI[i] = New_Distance_to_POI[i] - Old_Distance_to_POI[i]
 
-                #get the real distance travelled since last update
-                Delta_Distance_to_POI_Total = New_Distance_to_POI_Total - Old_Distance_to_POI_Total
+    #------------------------------------------------------------Backend to Frontend------------------------------------------------------------
+    # Raw values, formatted by the frontends (or by companion_text for the text protocol), the local fields are None outside of the containers
+    new_data = {
+        "time" : New_time,
+        "player_global_x" : New_Player_Global_coordinates['X'],
+        "player_global_y" : New_Player_Global_coordinates['Y'],
+        "player_global_z" : New_Player_Global_coordinates['Z'],
+        "distance_change" : Distance_since_last_update_Total,
+        "actual_container" : Actual_Container['Name']
+    }
+    for field in Companion_local_fields:
+        new_data[field] = None
+
+    if Actual_Container["Name"] != "None":
+        new_data.update({
+            "player_local_x" : New_player_local_rotated_coordinates['X'],
+            "player_local_y" : New_player_local_rotated_coordinates['Y'],
+            "player_local_z" : New_player_local_rotated_coordinates['Z'],
+            "player_long" : Longitude,
+            "player_lat" : Latitude,
+            "player_height" : Height,
+            "player_OM1_name" : Closest_OM['Z']['OM']['Name'],
+            "player_OM1_distance" : Closest_OM['Z']['Distance'],
+            "player_OM2_name" : Closest_OM['Y']['OM']['Name'],
+            "player_OM2_distance" : Closest_OM['Y']['Distance'],
+            "player_OM3_name" : Closest_OM['X']['OM']['Name'],
+            "player_OM3_distance" : Closest_OM['X']['Distance'],
+            "closest_poi_1_name" : Player_to_POIs_Distances_Sorted[0]['Name'],
+            "closest_poi_1_distance" : Player_to_POIs_Distances_Sorted[0]['Distance'],
+            "closest_poi_2_name" : Player_to_POIs_Distances_Sorted[1]['Name'],
+            "closest_poi_2_distance" : Player_to_POIs_Distances_Sorted[1]['Distance']
+        })
+    
 
-                if Delta_Distance_to_POI_Total <= 0:
-                    Delta_distance_to_poi_color = "#00ff00"
-                else:
-                    Delta_distance_to_poi_color = "#ff3700"
 
 
 
-                #---------------------------------------------------Estimated time of arrival to POI------------------------------------------------
-                #get the time between the last update and this update
-                Delta_time = New_time - Old_time
+    #---------------------------------------------------Update coordinates for the next update------------------------------------------
+    for i in ["X", "Y", "Z"]:
+        Old_player_Global_coordinates[i] = New_Player_Global_coordinates[i]
+    if Actual_Container["Name"] != "None":
+        for i in ["X", "Y", "Z"]:
+            Old_player_local_rotated_coordinates[i] = New_player_local_rotated_coordinates[i]
+    
+    State["Old_container"] = Actual_Container
+    
+    #-------------------------------------------------------------------------------------------------------------------------------------------
 
+    return new_data
 
-                #get the time it would take to reach destination using the same speed
-                try :
-                    Estimated_time_of_arrival = (Delta_time*New_Distance_to_POI_Total)/abs(Delta_Distance_to_POI_Total)
-                except ZeroDivisionError:
-                    Estimated_time_of_arrival = 0.00
 
 
+def radar_update(New_Player_Global_coordinates : dict, New_time : float, Target : dict, State : dict):
+    """Computes the distance, surface distance, bearing and horizontal deviation to every POI of the current container"""
 
-                #----------------------------------------------------Closest Quantumable POI--------------------------------------------------------
-                if Target["QTMarker"] == "FALSE":
-                    Target_to_POIs_Distances_Sorted = get_closest_POI(Target["X"], Target["Y"], Target["Z"], Database["Containers"][Target["Container"]], True)
-                
-                else :
-                    Target_to_POIs_Distances_Sorted = [{
-                        "Name" : "POI itself",
-                        "Distance" : 0
-                    }]
 
+    # Actual container
+    Actual_Container = get_current_container(New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"])
 
-                #----------------------------------------------------Player Closest POI--------------------------------------------------------
-                Player_to_POIs_Distances_Sorted = get_closest_POI(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container, False)
+    new_data = {
+        "time" : New_time,
+        "player_actual_container" : Actual_Container['Name'],
+        "player_long" : None,
+        "player_lat" : None,
+        "player_height" : None,
+        "qt_marker" : Target["QTMarker"],
+        "sort" : Target["Sort"]
+    }
+    for field in Radar_columns:
+        new_data[field] = []
+
+
+    if Actual_Container['Name'] != "None":
+        # Local coordinates
+        New_player_local_rotated_coordinates = get_local_rotated_coordinates(New_time - Reference_time, New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"], Actual_Container)
+        Latitude, Longitude, Height = get_lat_long_height(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container)
+
+        # The course only gives a direction after a previous position in the same container
+        Course = track(State, New_time, New_player_local_rotated_coordinates, 0.0, Actual_Container["Name"])[0]
+        Previous = [New_player_local_rotated_coordinates[i] - Course[i] for i in ["X", "Y", "Z"]]
+
+        # Every POI in a single vectorized pass
+        Radar = get_poi_search().radar(
+            New_player_local_rotated_coordinates["X"],
+            New_player_local_rotated_coordinates["Y"],
+            New_player_local_rotated_coordinates["Z"],
+            Previous,
+            Latitude,
+            Longitude,
+            Actual_Container["Name"],
+            Actual_Container["Body Radius"],
+            None if Target["QTMarker"] == "all" else Target["QTMarker"] == "true"
+        )
+
+        if Target["Sort"] == "name":
+            Order = sorted(range(len(Radar["names"])), key=Radar["names"].__getitem__)
+        else :
+            Order = Radar[Radar_sort_keys[Target["Sort"]]].argsort(kind="stable")
+        Order = Order[:Target["Max"]]
+
+        new_data.update({
+            "player_long" : Longitude,
+            "player_lat" : Latitude,
+            "player_height" : Height
+        })
+        for field, column in Radar_columns.items():
+            Values = Radar[column][Order]
+            if Values.dtype.kind == "f":
+                Values = Values.round(Radar_digits)
+            new_data[field] = Values.tolist()
+
+    return new_data
+
+
+# Fields of radar_update : one list per column of POISearch.radar, in the order of the POIs
+Radar_columns = {
+    "poi_names" : "names",
+    "poi_qt_markers" : "quantum_markers",
+    "poi_distances" : "distances",
+    "poi_surface_distances" : "surface_distances",
+    "poi_bearings" : "bearings",
+    "poi_horizontal_deviations" : "horizontal_deviations"
+}
 
+# Same precision as the other floats of the delta protocol (DeltaEncoder.float_digits)
+Radar_digits = 6
 
-                #-------------------------------------------------------3 Closest OMs to player---------------------------------------------------------------
-                player_Closest_OM = get_closest_oms(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"], New_player_local_rotated_coordinates["Z"], Actual_Container)
+Radar_sort_keys = {
+    "distance" : "distances",
+    "surface_distance" : "surface_distances",
+    "bearing" : "bearings"
+}
 
 
 
-                #-------------------------------------------------------3 Closest OMs to target---------------------------------------------------------------
-                target_Closest_OM = get_closest_oms(Target["X"], Target["Y"], Target["Z"], Database["Containers"][Target["Container"]])
+#-----------------------------------------------------Text protocol--------------------------------------------------------------
+# Compatibility mode of the frontend protocol : the raw data of the updates formatted as text, like the backend always sent it
 
+Companion_local_fields = [
+    "player_local_x", "player_local_y", "player_local_z", "player_long", "player_lat", "player_height",
+    "player_OM1_name", "player_OM1_distance", "player_OM2_name", "player_OM2_distance", "player_OM3_name", "player_OM3_distance",
+    "closest_poi_1_name", "closest_poi_1_distance", "closest_poi_2_name", "closest_poi_2_distance"
+]
 
 
-                #----------------------------------------------------Course Deviation to POI--------------------------------------------------------
-                #get the vector between current_pos and previous_pos
-                Previous_current_pos_vector = {}
-                for i in ['X', 'Y', 'Z']:
-                    Previous_current_pos_vector[i] = New_player_local_rotated_coordinates[i] - Old_player_local_rotated_coordinates[i]
+def distance_color(Distance : float):
+    if Distance <= 100:
+        return "#00ff00"
+    elif Distance <= 1000:
+        return "#ffd000"
+    else :
+        return "#ff3700"
 
 
-                #get the vector between current_pos and target_pos
-                Current_target_pos_vector = {}
-                for i in ['X', 'Y', 'Z']:
-                    Current_target_pos_vector[i] = Target[i] - New_player_local_rotated_coordinates[i]
+def delta_distance_color(Delta_distance : float):
+    if Delta_distance <= 0:
+        return "#00ff00"
+    else:
+        return "#ff3700"
 
 
-                #get the angle between the current-target_pos vector and the previous-current_pos vector
-                Total_deviation_from_target = angle_between_vectors(Previous_current_pos_vector, Current_target_pos_vector)
+def deviation_color(Deviation : float):
+    if Deviation <= 10:
+        return "#00ff00"
+    elif Deviation <= 20:
+        return "#ffd000"
+    else:
+        return "#ff3700"
 
 
-                if Total_deviation_from_target <= 10:
-                    Total_deviation_from_target_color = "#00ff00"
-                elif Total_deviation_from_target <= 20:
-                    Total_deviation_from_target_color = "#ffd000"
-                else:
-                    Total_deviation_from_target_color = "#ff3700"
+# The texts of the updates of a few seconds show the same clock times and ETAs : they are formatted once
+@functools.lru_cache(maxsize=256)
+def clock_second(Second : int):
+    return time.strftime('%H:%M:%S', time.localtime(Second))
 
 
-                #----------------------------------------------------------Flat_angle--------------------------------------------------------------
-                previous = Old_player_local_rotated_coordinates
-                current = New_player_local_rotated_coordinates
+def clock_time(Time : float):
+    return clock_second(floor(Time))
 
 
-                #Vector AB (Previous -> Current)
-                previous_to_current = {}
-                for i in ["X", "Y", "Z"]:
-                    previous_to_current[i] = current[i] - previous[i]
+def rounded_text(Value : float, digits : int):
+    """str(round(Value, digits)) for 1 to 3 digits, formatted without building the rounded float"""
+    # Below 1e11 the digits fit in the 15 significant digits of a float : both give the same text
+    if type(Value) is not float or not -1e11 < Value < 1e11:
+        return str(round(Value, digits))
+    text = "%.*f" % (digits, Value)
+    text = text.rstrip("0")
+    return text + "0" if text[-1] == "." else text
 
-                #Vector AC (C = center of the planet, Previous -> Center)
-                previous_to_center = {}
-                for i in ["X", "Y", "Z"]:
-                    previous_to_center[i] = 0 - previous[i]
 
-                #Vector BD (Current -> Target)
-                current_to_target = {}
-                for i in ["X", "Y", "Z"]:
-                    current_to_target[i] = Target[i] - current[i]
+@functools.lru_cache(maxsize=256)
+def duration_text(Seconds : float):
+    return str(datetime.timedelta(seconds=Seconds))
 
-                    #Vector BC (C = center of the planet, Current -> Center)
-                current_to_center = {}
-                for i in ["X", "Y", "Z"]:
-                    current_to_center[i] = 0 - current[i]
-
-
-
-                #Normal vector of a plane:
-                #abc : Previous/Current/Center
-                n1 = {}
-                n1["X"] = previous_to_current["Y"] * previous_to_center["Z"] - previous_to_current["Z"] * previous_to_center["Y"]
-                n1["Y"] = previous_to_current["Z"] * previous_to_center["X"] - previous_to_current["X"] * previous_to_center["Z"]
-                n1["Z"] = previous_to_current["X"] * previous_to_center["Y"] - previous_to_current["Y"] * previous_to_center["X"]
-
-                #acd : Previous/Center/Target
-                n2 = {}
-                n2["X"] = current_to_target["Y"] * current_to_center["Z"] - current_to_target["Z"] * current_to_center["Y"]
-                n2["Y"] = current_to_target["Z"] * current_to_center["X"] - current_to_target["X"] * current_to_center["Z"]
-                n2["Z"] = current_to_target["X"] * current_to_center["Y"] - current_to_target["Y"] * current_to_center["X"]
-
-                Flat_angle = angle_between_vectors(n1, n2)
-
-
-                if Flat_angle <= 10:
-                    Flat_angle_color = "#00ff00"
-                elif Flat_angle <= 20:
-                    Flat_angle_color = "#ffd000"
-                else:
-                    Flat_angle_color = "#ff3700"
-
-
-
-
-                #----------------------------------------------------------Heading--------------------------------------------------------------
-                
-                bearingX = cos(radians(target_Latitude)) * sin(radians(target_Longitude) - radians(player_Longitude))
-                bearingY = cos(radians(player_Latitude)) * sin(radians(target_Latitude)) - sin(radians(player_Latitude)) * cos(radians(target_Latitude)) * cos(radians(target_Longitude) - radians(player_Longitude))
-
-                Bearing = (degrees(atan2(bearingX, bearingY)) + 360) % 360
-
-
-
-
-                #-------------------------------------------------Sunrise Sunset Calculation----------------------------------------------------
-                player_state_of_the_day, player_next_event, player_next_event_time = get_sunset_sunrise_predictions(
-                    New_player_local_rotated_coordinates["X"], 
-                    New_player_local_rotated_coordinates["Y"], 
-                    New_player_local_rotated_coordinates["Z"], 
-                    player_Latitude, 
-                    player_Longitude, 
-                    player_Height, 
-                    Actual_Container, 
-                    Database["Containers"]["Stanton"]
-                )
-                
-                target_state_of_the_day, target_next_event, target_next_event_time = get_sunset_sunrise_predictions(
-                    Target["X"], 
-                    Target["Y"], 
-                    Target["Z"], 
-                    target_Latitude, 
-                    target_Longitude, 
-                    target_Height, 
-                    Database["Containers"][Target["Container"]], 
-                    Database["Containers"]["Stanton"]
-                )
-
-
-                #------------------------------------------------------------Backend to Frontend------------------------------------------------------------
-                new_data = {
-                    "updated" : f"{time.strftime('%H:%M:%S', time.localtime(time.time()))}",
-                    "target" : Target['Name'],
-                    "player_actual_container" : Actual_Container['Name'],
-                    "target_container" : Target['Container'],
-                    "player_x" : round(New_player_local_rotated_coordinates['X'], 3),
-                    "player_y" : round(New_player_local_rotated_coordinates['Y'], 3),
-                    "player_z" : round(New_player_local_rotated_coordinates['Z'], 3),
-                    "player_long" : f"{round(player_Longitude, 2)}°",
-                    "player_lat" : f"{round(player_Latitude, 2)}°",
-                    "player_height" : f"{round(player_Height, 1)} km",
-                    "player_OM1" : f"{player_Closest_OM['Z']['OM']['Name']} : {round(player_Closest_OM['Z']['Distance'], 3)} km",
-                    "player_OM2" : f"{player_Closest_OM['Y']['OM']['Name']} : {round(player_Closest_OM['Y']['Distance'], 3)} km",
-                    "player_OM3" : f"{player_Closest_OM['X']['OM']['Name']} : {round(player_Closest_OM['X']['Distance'], 3)} km",
-                    "player_closest_poi" : f"{Player_to_POIs_Distances_Sorted[0]['Name']} : {round(Player_to_POIs_Distances_Sorted[0]['Distance'], 3)} km",
-                    "player_state_of_the_day" : f"{player_state_of_the_day}", 
-                    "player_next_event" : f"{player_next_event}", 
-                    "player_next_event_time" : f"{time.strftime('%H:%M:%S', time.localtime(New_time + player_next_event_time*60))}",
-                    "target_x" : Target["X"],
-                    "target_y" : Target["Y"],
-                    "target_z" : Target["Z"],
-                    "target_long" : f"{round(target_Longitude, 2)}°",
-                    "target_lat" : f"{round(target_Latitude, 2)}°",
-                    "target_height" : f"{round(target_Height, 1)} km",
-                    "target_OM1" : f"{target_Closest_OM['Z']['OM']['Name']} : {round(target_Closest_OM['Z']['Distance'], 3)} km",
-                    "target_OM2" : f"{target_Closest_OM['Y']['OM']['Name']} : {round(target_Closest_OM['Y']['Distance'], 3)} km",
-                    "target_OM3" : f"{target_Closest_OM['X']['OM']['Name']} : {round(target_Closest_OM['X']['Distance'], 3)} km",
-                    "target_closest_QT_beacon" : f"{Target_to_POIs_Distances_Sorted[0]['Name']} : {round(Target_to_POIs_Distances_Sorted[0]['Distance'], 3)} km",
-                    "target_state_of_the_day" : f"{target_state_of_the_day}", 
-                    "target_next_event" : f"{target_next_event}", 
-                    "target_next_event_time" : f"{time.strftime('%H:%M:%S', time.localtime(New_time + target_next_event_time*60))}",
-                    "distance_to_poi" : f"{round(New_Distance_to_POI_Total, 3)} km",
-                    "distance_to_poi_color" : New_Distance_to_POI_Total_color,
-                    "delta_distance_to_poi" : f"{round(abs(Delta_Distance_to_POI_Total), 3)} km",
-                    "delta_distance_to_poi_color" : Delta_distance_to_poi_color,
-                    "total_deviation" : f"{round(Total_deviation_from_target, 1)}°",
-                    "total_deviation_color" : Total_deviation_from_target_color,
-                    "horizontal_deviation" : f"{round(Flat_angle, 1)}°",
-                    "horizontal_deviation_color" : Flat_angle_color,
-                    "heading" : f"{round(Bearing, 1)}°",
-                    "ETA" : f"{str(datetime.timedelta(seconds=round(Estimated_time_of_arrival, 0)))}"
-                }
-                print("New data :", json.dumps(new_data))
-                sys.stdout.flush()
 
+def named_distance(data : dict, field : str):
+    return f"{data[field + '_name']} : {rounded_text(data[field + '_distance'], 3)} km"
 
-                #------------------------------------------------------------Logs update------------------------------------------------------------
-                if logs_enabled == True:
-                    if Actual_Container['Name'] != "None":
-                        fields = [
-                            'None',
-                            'Stanton',
-                            str(New_player_local_rotated_coordinates["X"]*1000),
-                            str(New_player_local_rotated_coordinates["Y"]*1000),
-                            str(New_player_local_rotated_coordinates["Z"]*1000),
-                            str(Actual_Container['Name']),
-                            str(New_player_local_rotated_coordinates['X']),
-                            str(New_player_local_rotated_coordinates['Y']),
-                            str(New_player_local_rotated_coordinates['Z']),
-                            str(player_Longitude),
-                            str(player_Latitude),
-                            str(player_Height*1000),
-                            str(time.time()),
-                            time.strftime('%d %b %Y %H:%M:%S', time.gmtime(time.time())),
-                            "",
-                            ""
-                        ]
-                        # field = [
-                        #     'Key', 
-                        #     'System', 
-                        #     'Global_X', 
-                        #     'Global_Y', 
-                        #     'Global_Z', 
-                        #     'Container', 
-                        #     'Local_X', 
-                        #     'Local_Y', 
-                        #     'Local_Z', 
-                        #     'Longitude', 
-                        #     'Latitude', 
-                        #     'Height', 
-                        #     'Time', 
-                        #     'Readable_Time',', 
-                        #     'Player', 
-                        #     'Comment'
-                        # ]
-                        
-                        with open(r'Logs/Logs.csv', 'a', newline='') as csv_file:
-                            writer = csv.writer(csv_file)
-                            writer.writerow(fields)
-
-
-
-                #---------------------------------------------------Update coordinates for the next update------------------------------------------
-                for i in ["X", "Y", "Z"]:
-                    Old_player_Global_coordinates[i] = New_Player_Global_coordinates[i]
-
-                for i in ["X", "Y", "Z"]:
-                    Old_player_local_rotated_coordinates[i] = New_player_local_rotated_coordinates[i]
-
-                for i in ["X", "Y", "Z"]:
-                    Old_Distance_to_POI[i] = New_Distance_to_POI[i]
-
-                Old_time = New_time
-
-                #-------------------------------------------------------------------------------------------------------------------------------------------
-
-
-
-
-
-
-
-
-            #-----------------------------------------------------space_nav------------------------------------------------------------------
-            #If the target is within the attraction of a planet
-            if Mode == "space_nav":
-
-                #-----------------------------------------------------Distance to POI---------------------------------------------------------------
-                New_Distance_to_POI = {}
-                for i in ["X", "Y", "Z"]:
-                    New_Distance_to_POI[i] = abs(Target[i] - New_Player_Global_coordinates[i])
-
-                #get the real new distance between the player and the target
-                New_Distance_to_POI_Total = vector_norm(New_Distance_to_POI)
-
-                if New_Distance_to_POI_Total <= 100:
-                    New_Distance_to_POI_Total_color = "#00ff00"
-                elif New_Distance_to_POI_Total <= 1000:
-                    New_Distance_to_POI_Total_color = "#ffd000"
-                else :
-                    New_Distance_to_POI_Total_color = "#ff3700"
 
+# Fields of planetary_nav that only change with the target
+Target_text_fields = ("target_long", "target_lat", "target_height", "target_OM1_name", "target_OM1_distance", "target_OM2_name", "target_OM2_distance",
+                      "target_OM3_name", "target_OM3_distance", "target_closest_QT_beacon_name", "target_closest_QT_beacon_distance")
 
+@functools.lru_cache(maxsize=64)
+def planetary_nav_target_text(Values : tuple):
+    data = dict(zip(Target_text_fields, Values))
+    return {
+        "target_long" : f"{rounded_text(data['target_long'], 2)}°",
+        "target_lat" : f"{rounded_text(data['target_lat'], 2)}°",
+        "target_height" : f"{rounded_text(data['target_height'], 1)} km",
+        "target_OM1" : named_distance(data, "target_OM1"),
+        "target_OM2" : named_distance(data, "target_OM2"),
+        "target_OM3" : named_distance(data, "target_OM3"),
+        "target_closest_QT_beacon" : named_distance(data, "target_closest_QT_beacon")
+    }
 
-                #---------------------------------------------------Delta Distance to POI-----------------------------------------------------------
-                Old_Distance_to_POI_Total = vector_norm(Old_Distance_to_POI)
 
+def planetary_nav_text(data : dict):
+    Target_text = planetary_nav_target_text(tuple([data[field] for field in Target_text_fields]))
+    return {
+        "updated" : f"{clock_time(Wall_clock())}",
+        "target" : data["target"],
+        "player_actual_container" : data["player_actual_container"],
+        "target_container" : data["target_container"],
+        "player_x" : round(data["player_x"], 3),
+        "player_y" : round(data["player_y"], 3),
+        "player_z" : round(data["player_z"], 3),
+        "player_long" : f"{rounded_text(data['player_long'], 2)}°",
+        "player_lat" : f"{rounded_text(data['player_lat'], 2)}°",
+        "player_height" : f"{rounded_text(data['player_height'], 1)} km",
+        "player_OM1" : named_distance(data, "player_OM1"),
+        "player_OM2" : named_distance(data, "player_OM2"),
+        "player_OM3" : named_distance(data, "player_OM3"),
+        "player_closest_poi" : named_distance(data, "player_closest_poi"),
+        "player_state_of_the_day" : f"{data['player_state_of_the_day']}",
+        "player_next_event" : f"{data['player_next_event']}",
+        "player_next_event_time" : clock_time(data["player_next_event_time"]),
+        "target_x" : data["target_x"],
+        "target_y" : data["target_y"],
+        "target_z" : data["target_z"],
+        "target_long" : Target_text["target_long"],
+        "target_lat" : Target_text["target_lat"],
+        "target_height" : Target_text["target_height"],
+        "target_OM1" : Target_text["target_OM1"],
+        "target_OM2" : Target_text["target_OM2"],
+        "target_OM3" : Target_text["target_OM3"],
+        "target_closest_QT_beacon" : Target_text["target_closest_QT_beacon"],
+        "target_state_of_the_day" : f"{data['target_state_of_the_day']}",
+        "target_next_event" : f"{data['target_next_event']}",
+        "target_next_event_time" : clock_time(data["target_next_event_time"]),
+        "distance_to_poi" : f"{rounded_text(data['distance_to_poi'], 3)} km",
+        "distance_to_poi_color" : distance_color(data["distance_to_poi"]),
+        "delta_distance_to_poi" : f"{rounded_text(abs(data['delta_distance_to_poi']), 3)} km",
+        "delta_distance_to_poi_color" : delta_distance_color(data["delta_distance_to_poi"]),
+        "total_deviation" : f"{rounded_text(data['total_deviation'], 1)}°",
+        "total_deviation_color" : deviation_color(data["total_deviation"]),
+        "horizontal_deviation" : f"{rounded_text(data['horizontal_deviation'], 1)}°",
+        "horizontal_deviation_color" : deviation_color(data["horizontal_deviation"]),
+        "heading" : f"{rounded_text(data['heading'], 1)}°",
+        "ETA" : duration_text(round(data['ETA'], 0))
+    }
 
-                #get the real distance travelled since last update
-                Delta_Distance_to_POI_Total = New_Distance_to_POI_Total - Old_Distance_to_POI_Total
 
+def space_nav_text(data : dict):
+    return {
+        "updated" : f"Updated : {clock_time(Wall_clock())}",
+        "target" : data["target"],
+        "player_x" : round(data["player_x"], 3),
+        "player_y" : round(data["player_y"], 3),
+        "player_z" : round(data["player_z"], 3),
+        "target_x" : round(data["target_x"], 3),
+        "target_y" : round(data["target_y"], 3),
+        "target_z" : round(data["target_z"], 3),
+        "distance_to_poi" : f"{rounded_text(data['distance_to_poi'], 3)} km",
+        "distance_to_poi_color" : distance_color(data["distance_to_poi"]),
+        "delta_distance_to_poi" : f"{rounded_text(abs(data['delta_distance_to_poi']), 3)} km",
+        "delta_distance_to_poi_color" : delta_distance_color(data["delta_distance_to_poi"]),
+        "total_deviation" : f"{rounded_text(data['total_deviation'], 1)}°",
+        "total_deviation_color" : deviation_color(data["total_deviation"]),
+        "ETA" : duration_text(round(data['ETA'], 0))
+    }
 
-                if Delta_Distance_to_POI_Total <= 0:
-                    Delta_distance_to_poi_color = "#00ff00"
-                else:
-                    Delta_distance_to_poi_color = "#ff3700"
 
+def companion_text(data : dict):
+    text = {
+        "updated" : f"Updated : {clock_time(Wall_clock())}",
+        "player_global_x" : f"Global X : {rounded_text(data['player_global_x'], 3)}",
+        "player_global_y" : f"Global Y : {rounded_text(data['player_global_y'], 3)}",
+        "player_global_z" : f"Global Z : {rounded_text(data['player_global_z'], 3)}",
+        "distance_change" : f"Distance since last update : {rounded_text(data['distance_change'], 3)} km",
+    }
+    if data["actual_container"] == "None":
+        text["actual_container"] = "None"
+        for field in ["player_local_x", "player_local_y", "player_local_z", "player_long", "player_lat", "player_height", "player_OM1", "player_OM2", "player_OM3", "closest_poi"]:
+            text[field] = ""
+        return text
+
+    text.update({
+        "actual_container" : f"Actual Container : {data['actual_container']}",
+        "player_local_x" : f"Local X : {rounded_text(data['player_local_x'], 3)}",
+        "player_local_y" : f"Local Y : {rounded_text(data['player_local_y'], 3)}",
+        "player_local_z" : f"Local Z : {rounded_text(data['player_local_z'], 3)}",
+        "player_long" : f"Longitude : {rounded_text(data['player_long'], 2)}°",
+        "player_lat" : f"Latitude : {rounded_text(data['player_lat'], 2)}°",
+        "player_height" : f"Height : {rounded_text(data['player_height'], 1)} km",
+        "player_OM1" : named_distance(data, "player_OM1"),
+        "player_OM2" : named_distance(data, "player_OM2"),
+        "player_OM3" : named_distance(data, "player_OM3"),
+        "closest_poi" : f"Closest POI : \n{data['closest_poi_1_name']} ({rounded_text(data['closest_poi_1_distance'], 3)} km) \n{data['closest_poi_2_name']} ({rounded_text(data['closest_poi_2_distance'], 3)} km)",
+    })
+    return text
+
+
+def radar_text(data : dict):
+    text = {
+        "updated" : f"Updated : {clock_time(Wall_clock())}",
+        "actual_container" : f"Actual Container : {data['player_actual_container']}" if data["player_actual_container"] != "None" else "None",
+        "player_long" : "",
+        "player_lat" : "",
+        "player_height" : ""
+    }
+    if data["player_actual_container"] != "None":
+        text.update({
+            "player_long" : f"Longitude : {rounded_text(data['player_long'], 2)}°",
+            "player_lat" : f"Latitude : {rounded_text(data['player_lat'], 2)}°",
+            "player_height" : f"Height : {rounded_text(data['player_height'], 1)} km"
+        })
+    text["pois"] = [
+        {
+            "name" : Name,
+            "qt_marker" : Quantum_marker,
+            "distance" : f"{rounded_text(Distance, 3)} km",
+            "distance_color" : distance_color(Distance),
+            "surface_distance" : f"{rounded_text(Surface_distance, 3)} km",
+            "bearing" : f"{rounded_text(Bearing, 1)}°",
+            "horizontal_deviation" : f"{rounded_text(Deviation, 1)}°",
+            "horizontal_deviation_color" : deviation_color(Deviation)
+        }
+        for Name, Quantum_marker, Distance, Surface_distance, Bearing, Deviation in zip(*(data[field] for field in Radar_columns))
+    ]
+    return text
 
 
-                #-----------------------------------------------Estimated time of arrival-----------------------------------------------------------
-                #get the time between the last update and this update
-                Delta_time = New_time - Old_time
+Text_formatters = {
+    "planetary_nav": planetary_nav_text,
+    "space_nav": space_nav_text,
+    "companion": companion_text,
+    "radar": radar_text
+}
 
 
-                #get the time it would take to reach destination using the same speed
-                try :
-                    Estimated_time_of_arrival = (Delta_time*New_Distance_to_POI_Total)/abs(Delta_Distance_to_POI_Total)
-                except ZeroDivisionError:
-                    Estimated_time_of_arrival = 0.00
-
-
-
-                #----------------------------------------------------Course Deviation---------------------------------------------------------------
-                #get the vector between current_pos and previous_pos
-                Previous_current_pos_vector = {}
-                for i in ['X', 'Y', 'Z']:
-                    Previous_current_pos_vector[i] = New_Player_Global_coordinates[i] - Old_player_Global_coordinates[i]
-
-
-                #get the vector between current_pos and target_pos
-                Current_target_pos_vector = {}
-                for i in ['X', 'Y', 'Z']:
-                    Current_target_pos_vector[i] = Target[i] - New_Player_Global_coordinates[i]
-
-
-                #get the angle between the current-target_pos vector and the previous-current_pos vector
-                Course_Deviation = angle_between_vectors(Previous_current_pos_vector, Current_target_pos_vector)
-                
-                
-                if Course_Deviation <= 10:
-                    Total_deviation_from_target_color = "#00ff00"
-                elif Course_Deviation <= 20:
-                    Total_deviation_from_target_color = "#ffd000"
-                else:
-                    Total_deviation_from_target_color = "#ff3700"
-
-
-
-
-                #------------------------------------------------------------Backend to Frontend------------------------------------------------------------
-                new_data = {
-                    "updated" : f"Updated : {time.strftime('%H:%M:%S', time.localtime(time.time()))}",
-                    "target" : Target['Name'],
-                    "player_x" : round(New_Player_Global_coordinates['X'], 3),
-                    "player_y" : round(New_Player_Global_coordinates['Y'], 3),
-                    "player_z" : round(New_Player_Global_coordinates['Z'], 3),
-                    "target_x" : round(Target["X"], 3),
-                    "target_y" : round(Target["Y"], 3),
-                    "target_z" : round(Target["Z"], 3),
-                    "distance_to_poi" : f"{round(New_Distance_to_POI_Total, 3)} km",
-                    "distance_to_poi_color" : New_Distance_to_POI_Total_color,
-                    "delta_distance_to_poi" : f"{round(abs(Delta_Distance_to_POI_Total), 3)} km",
-                    "delta_distance_to_poi_color" : Delta_distance_to_poi_color,
-                    "total_deviation" : f"{round(Course_Deviation, 1)}°",
-                    "total_deviation_color" : Total_deviation_from_target_color,
-                    "ETA" : f"{str(datetime.timedelta(seconds=round(Estimated_time_of_arrival, 0)))}"
-                }
-                
-                print("New data :", json.dumps(new_data))
-                sys.stdout.flush()
 
+Update_functions = {
+    "planetary_nav": planetary_nav_update,
+    "space_nav": space_nav_update,
+    "companion": companion_update,
+    "radar": radar_update
+}
+
+
+def print_line(line : str):
+    print(line)
+    sys.stdout.flush()
 
 
+class Frontend_output:
+    """Sends the updates of a mode to a frontend in its protocol version (see protocol.py)"""
 
-                #-------------------------------------------Update coordinates for the next update--------------------------------------------------
-                for i in ["X", "Y", "Z"]:
-                    Old_player_Global_coordinates[i] = New_Player_Global_coordinates[i]
-                
-                for i in ["X", "Y", "Z"]:
-                    Old_Distance_to_POI[i] = New_Distance_to_POI[i]
+    def __init__(self, protocol : int = Compatibility_protocol):
+        self.protocol = protocol
+        self.encoder = DeltaEncoder(settings.get("protocol_keyframe_interval", 50))
+        self.seq = 0
 
-                Old_time = New_time
+    def send_update(self, Mode : str, new_data : dict):
+        if self.protocol == Compatibility_protocol:
+            self.put_update(True, Text_formatters[Mode](new_data))
+        else :
+            encoded = self.encoder.encode(new_data)
+            if encoded is not None:
+                self.put_update(*encoded)
 
+    def update_line(self, keyframe : bool, fields : dict):
+        self.seq += 1
+        return update_line(self.protocol, self.seq, keyframe, fields)
 
 
-            #---------------------------------------------------------------------------------------------------------------------------------------
-            
-            if Mode == "companion":
-                
-                # Actual container
-                # Search in the Database to see if the player is in a Container
-                Actual_Container = get_current_container(New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"])
-                
-                
-                # If around a container :
-                if Actual_Container['Name'] == "None" :
-                    
-                    Distance_since_last_update = {}
-                    for i in ["X", "Y", "Z"]:
-                        Distance_since_last_update[i] = abs(Old_player_Global_coordinates[i] - New_Player_Global_coordinates[i])
-                    Distance_since_last_update_Total = vector_norm(Distance_since_last_update)
-                
+class Stdout_output(Frontend_output):
+    """Frontend of the single mode, reading the standard output of the backend"""
+
+    def send(self, line : str):
+        print_line(line)
+
+    def put_update(self, keyframe : bool, fields : dict):
+        print_line(self.update_line(keyframe, fields))
+
+
+def handle_sample(Sample, Mode : str, Target : dict, State : dict, time_offset : float, output : Frontend_output):
+    """Runs the update of a mode on a text captured by the source, sends its data to the frontend of output and returns it"""
+    #Use the moment the text was captured, not the moment it is processed
+    New_time = Sample.time + time_offset
+
+    #get the 3 new XYZ coordinates
+    New_Player_Global_coordinates = parse_coordinates(Sample.text)
+
+    #If it contains some coordinates
+    new_data = None
+    if New_Player_Global_coordinates is not None:
+        new_data = Update_functions[Mode](New_Player_Global_coordinates, New_time, Target, State)
+        if new_data is not None:
+            output.send_update(Mode, new_data)
+
+    if Sample.text == "1rst hotkey" or Sample.text == "2nd hotkey":
+        output.send(Sample.text)
+
+    return new_data
+
+
+def log_sample(Sample, time_offset : float):
+    """Logs the position of a sample once, whatever the number of frontends using it"""
+    New_Player_Global_coordinates = parse_coordinates(Sample.text)
+    if New_Player_Global_coordinates is not None:
+        log_player_position(New_Player_Global_coordinates, Sample.time + time_offset)
+
+
+
+#-----------------------------------------------------Routes--------------------------------------------------------------
+# planetary_nav can follow a route : the POIs of a container in the order given by route_planner.py, the target
+# moves to the next one once the player is within "route_arrival_distance" km of the current one.
+
+def player_local_position(Sample, time_offset : float, container_name : str):
+    """Local coordinates of the position of a sample if it is in a container, else None"""
+    if Sample is None:
+        return None
+    New_Player_Global_coordinates = parse_coordinates(Sample.text)
+    if New_Player_Global_coordinates is None:
+        return None
+    Actual_Container = get_current_container(New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"])
+    if Actual_Container["Name"] != container_name:
+        return None
+    Local = get_local_rotated_coordinates(Sample.time + time_offset - Reference_time, New_Player_Global_coordinates["X"], New_Player_Global_coordinates["Y"], New_Player_Global_coordinates["Z"], Actual_Container)
+    return (Local["X"], Local["Y"], Local["Z"])
+
+
+def get_route(container_name : str, poi_names : list, optimize : bool = True, Start = None):
+    """Returns the Route through POIs of a container, shortest order first unless optimize is False"""
+    from route_planner import Route, plan_route
+    if container_name not in Planetary_POI_list:
+        raise ValueError(f"Unknown container : {container_name}")
+    if not poi_names:
+        raise ValueError("A route needs at least one POI")
+    Plan = plan_route(get_poi_distances(), container_name, poi_names, Start, optimize=optimize)
+    Targets = [Database["Containers"][container_name]["POI"][name] for name in Plan["stops"]]
+    return Route(Targets, settings.get("route_arrival_distance", 1.0)), Plan["total"]
+
+
+def route_line(Route, total : float):
+    return f"Route: {Route.describe()} ({round(total, 3)} km)"
+
+
+def follow_route(Route, new_data : dict, output : Frontend_output):
+    """Returns the next stop of a route once the player reached the current one, None otherwise"""
+    if Route is None or new_data is None or not Route.arrived(new_data.get("distance_to_poi")):
+        return None
+    Target = Route.advance()
+    if Target is None:
+        output.send("Route: finished")
+        return None
+    output.send("Target: " + Target["Name"])
+    return Target
+
+
+
+#-----------------------------------------------------Hot reload--------------------------------------------------------------
+# With "reload_interval" > 0 (seconds), Database.json, its overlay and settings.json are watched. A change is loaded
+# in a background thread : the new snapshot is compared with the current one and only the POI search entries, POI
+# distances, star constants and target contexts of the changed containers are rebuilt. The sample loops swap them in
+# between two updates, the targets are read again from the new database and the navigation states are kept.
+
+Reload_lock = threading.Lock()
+Pending_reload = None
+
+def prepare_reload(changed_paths : list):
+    """Loads the changed files and rebuilds what depends on them (watcher thread), swapped in by apply_pending_reload"""
+    global Pending_reload
+    with Reload_lock:
+        Reload = dict(Pending_reload or {})
+
+    if any(path != "settings.json" for path in changed_paths):
+        Current = Reload.get("Database", Database)
+        New_Database = load_database('Database.json')
+        if New_Database.snapshot.source_hash != Current.snapshot.source_hash:
+            changed = changed_containers(Current, New_Database)
+            Search = Reload.get("POI_search", POI_search)
+            Distances = Reload.get("POI_distances", POI_distances)
+            if Distances is not None:
+                Distances = Distances.rebuilt(New_Database, changed)
+                try :
+                    Distances.save()
+                except OSError:
+                    pass
+            Reload["Database"] = New_Database
+            Reload["Changed_containers"] = Reload.get("Changed_containers", set()) | changed
+            Reload["Containers_index"] = ContainerIndex(New_Database)
+            Reload["POI_search"] = Search.rebuilt(New_Database, changed) if Search is not None else None
+            Reload["POI_distances"] = Distances
+
+    if "settings.json" in changed_paths:
+        with open("settings.json", "r") as f:
+            Reload["settings"] = json.load(f)
+
+    if Reload:
+        with Reload_lock:
+            Pending_reload = Reload
+
+
+def apply_pending_reload():
+    """Swaps in the reloaded database, indexes and settings (between two updates), returns True if there was a reload"""
+    global Pending_reload, Database, Container_list, Space_POI_list, Planetary_POI_list, Containers_index, POI_search, POI_distances, logs_enabled, logs_modes
+    if Pending_reload is None:
+        return False
+    with Reload_lock:
+        Reload, Pending_reload = Pending_reload, None
+
+    if "Database" in Reload:
+        Database = Reload["Database"]
+        Container_list = list(Database.snapshot.container_names)
+        Space_POI_list = list(Database.snapshot.space_poi_names)
+        Planetary_POI_list = {container_name: list(Database.snapshot.poi_index[container_name]) for container_name in Database.snapshot.container_names}
+        Containers_index = Reload["Containers_index"]
+        POI_search = Reload["POI_search"]
+        POI_distances = Reload["POI_distances"]
+
+        Container_records.clear()
+        Container_OMs.clear()
+        import day_night
+        changed = Reload["Changed_containers"]
+        # The star is a container too : when it changes, the sunrises of every container change
+        if "Stanton" in changed:
+            day_night.clear_star_constants()
+            Target_contexts.clear()
+        else :
+            day_night.clear_star_constants(changed)
+            for key in list(Target_contexts):
+                if key[0] in changed:
+                    del Target_contexts[key]
                 else :
-                    
-                    # Local coordinates
-                    
-                    #Time passed since the start of game simulation
-                    Time_passed_since_reference_in_seconds = New_time - Reference_time
-                    #Grab the rotation speed of the container in the Database and convert it in degrees/s
-                    Rotation_speed_in_hours_per_rotation = Actual_Container["Rotation Speed"]
-                    try:
-                        Rotation_speed_in_degrees_per_second = 0.1 * (1/Rotation_speed_in_hours_per_rotation)
-                    except ZeroDivisionError:
-                        Rotation_speed_in_degrees_per_second = 0
+                    Target_contexts[key] = dict(Target_contexts[key], Container = container_record(key[0]), Source_hash = Database.snapshot.source_hash)
+
+    if "settings" in Reload:
+        # In place : the other threads keep reading the same dict
+        for key in [key for key in settings if key not in Reload["settings"]]:
+            del settings[key]
+        settings.update(Reload["settings"])
+        logs_enabled = settings.get("logs_enabled", False)
+        logs_modes = settings.get("logs_modes", ["planetary_nav"])
+        if logs_enabled == True and Log_writer is None:
+            start_new_log_run()
+
+    return True
+
+
+def refresh_target(Target):
+    """The record of a database target in the current database (the target itself if it is not a record or was removed)"""
+    if not isinstance(Target, RecordView):
+        return Target
+    if Target.table == "space_pois":
+        New_target = Database["Space_POI"].get(Target["Name"])
+    else :
+        Container = Database["Containers"].get(Target["Container"])
+        New_target = Container["POI"].get(Target["Name"]) if Container is not None else None
+    return Target if New_target is None else New_target
+
+
+def refresh_navigation(Target, Route, State : dict):
+    """Reads the target and the stops of the route again from the current database, the navigation state is kept"""
+    if Route is not None:
+        Route.Targets = [refresh_target(Stop) for Stop in Route.Targets]
+    State.pop("Target_context", None)
+    return refresh_target(Target)
+
+
+def watch_files(interval : float):
+    Watcher = FileWatcher(["Database.json", overlay_path_of("Database.json"), "settings.json"], interval)
+    Watcher.start(prepare_reload)
+    return Watcher
+
+
+
+#-----------------------------------------------------metrics--------------------------------------------------------------
+# Off unless "metrics_enabled" is set in settings.json or --metrics is given : the stages are only wrapped by
+# enable_metrics, a backend without metrics runs the same code as before and does not even import metrics.py.
+
+Metrics = None
+# "since" of the stats while they are off
+Start_time = Wall_clock()
+
+
+def timed_stages():
+    """(owner, function name, stage) of every timed stage"""
+    this_module = sys.modules[__name__]
+    stages = [
+        (TimeSync, "request", "ntp"),
+        (ClipboardSource, "paste", "clipboard"),
+        (this_module, "handle_sample", "sample"),
+        (this_module, "parse_coordinates", "parsing"),
+        (this_module, "get_current_container", "container_lookup"),
+        (this_module, "get_closest_POI", "closest_poi"),
+        (this_module, "get_closest_oms", "closest_oms"),
+        (this_module, "get_sunset_sunrise_predictions", "sunrise_sunset"),
+        (Frontend_output, "send_update", "output"),
+        (Frontend_output, "update_line", "serialization"),
+        (this_module, "log_sample", "logs"),
+        (LogWriter, "write_batch", "logs_csv_write"),
+        (LogWriter, "flush", "logs_csv_flush")
+    ]
+    stages += [(Update_functions, Mode, f"update_{Mode}") for Mode in Update_functions]
+    return stages
+
+
+def enable_metrics(port : int = None):
+    """Starts timing the stages and serves their histograms on localhost if a port is given"""
+    global handle_sample, Metrics
+    if Metrics is not None:
+        return
+    from metrics import StageMetrics
+    Metrics = StageMetrics()
+    for owner, function_name, stage in timed_stages():
+        Metrics.instrument(owner, function_name, stage)
+
+    # Time between the capture of a text and the start of its update
+    timed_handle_sample = handle_sample
+    def handle_recorded_sample(Sample, *args):
+        Metrics.record("sample_age", Wall_clock() - Sample.time)
+        return timed_handle_sample(Sample, *args)
+    handle_sample = handle_recorded_sample
+
+    if port is not None:
+        try :
+            print_line(f"Metrics on http://127.0.0.1:{Metrics.serve(port)}/")
+        except OSError as err:
+            print_line(f"Error: Could not serve the metrics on port {port} : {err}")
+
+
+def stats_line(reset : bool = False):
+    """`Stats : {...}` line of the histograms of the stages"""
+    if Metrics is None:
+        return "Stats : " + json.dumps({"enabled": False, "since": Start_time, "stages": {}})
+    stats = Metrics.snapshot()
+    if reset:
+        Metrics.reset()
+    return "Stats : " + json.dumps(stats)
+
+
+def report_metrics(send, interval : float):
+    """Sends a stats line every interval seconds (runs in a background thread)"""
+    while True:
+        time.sleep(interval)
+        send(stats_line())
+
+
+
+#-----------------------------------------------------daemon--------------------------------------------------------------
+# A single long-lived backend shared by every frontend. Frontends connect on a local port and send JSON lines :
+#   {"command": "set_mode", "mode": "planetary_nav"}
+#   {"command": "set_target", "args": ["--container", "Daymar", "--known", "true", "--target", "Javelin Wreck"]}
+#   {"command": "subscribe", "protocol": 2}
+#   {"command": "stats"} (answered by a `Stats : {...}` line, see the metrics section)
+#   {"command": "set_route", "container": "Daymar", "pois": ["Javelin Wreck", ...]} (planetary_nav, see the routes section)
+#   {"command": "next_target"} (next stop of the route)
+# and then receive the same lines as the ones printed by the backend in its single mode, in the protocol asked
+# by subscribe : 1 ("New data : {...}", the default) or 2 (delta-encoded raw values), see protocol.py.
+
+class Frontend_session(Frontend_output):
+    """A frontend connected to the daemon, with its own mode, target and navigation state"""
+
+    def __init__(self, connection : socket.socket):
+        super().__init__()
+        self.connection = connection
+        self.outbox = Outbox()
+        self.Mode = None
+        self.Target = None
+        self.State = new_navigation_state()
+        self.Route = None
+        self.subscribed = False
+
+    def send(self, line : str):
+        self.outbox.put_line(line)
+
+    def put_update(self, keyframe : bool, fields : dict):
+        self.outbox.put_update(keyframe, fields)
+
+    def send_outbox(self):
+        """Sends the lines of the outbox as fast as the frontend reads them (runs in its own thread)"""
+        try :
+            while True:
+                item = self.outbox.get()
+                if item is None:
+                    return
+                line = item[1] if item[0] == "line" else self.update_line(item[1], item[2])
+                self.connection.sendall((line + "\n").encode("utf-8"))
+        except OSError:
+            # The frontend went away, its thread removes the session
+            self.subscribed = False
+
+    def ready(self):
+        return self.subscribed and self.Mode is not None and (self.Target is not None or self.Mode == "companion")
+
+
+def plan_session_route(Session : Frontend_session, command : dict, Last_sample = None, time_offset : float = 0):
+    """Returns the (Route, total, source hash of the database) of a set_route command. The planning can build the POI
+    distances, the daemon runs it before taking the sessions lock so that the updates of the other frontends go on"""
+    if Session.Mode != "planetary_nav":
+        raise ValueError("Routes are followed in planetary_nav mode")
+    Source_hash = Database.snapshot.source_hash
+    container_name = command.get("container")
+    Start = player_local_position(Last_sample, time_offset, container_name) if command.get("from_player", True) else None
+    Route, total = get_route(container_name, [str(poi) for poi in command.get("pois", [])], bool(command.get("optimize", True)), Start)
+    return Route, total, Source_hash
+
+
+def handle_command(Session : Frontend_session, command : dict, Last_sample = None, time_offset : float = 0, Planned_route = None):
+    """Applies a command sent by a frontend to its session (Last_sample : the latest position, start of the routes,
+    Planned_route : plan_session_route of a set_route command)"""
+    name = command.get("command")
+
+    if name == "set_mode":
+        if command.get("mode") not in Update_functions:
+            raise ValueError(f"Unknown mode : {command.get('mode')}")
+        Session.Mode = command["mode"]
+        Session.Target = None
+        Session.Route = None
+        Session.State = new_navigation_state()
+        Session.encoder.reset()
+        Session.send("Mode: " + Session.Mode)
+
+    elif name == "set_target":
+        if Session.Mode is None:
+            raise ValueError("set_mode must be sent before set_target")
+        try :
+            target_args = parser.parse_args([Session.Mode] + [str(arg) for arg in command.get("args", [])])
+        except SystemExit:
+            raise ValueError(f"Invalid target arguments : {command.get('args')}")
+        Session.Target = get_target(Session.Mode, target_args)
+        if Session.Mode == "planetary_nav" and Session.Target is not None:
+            select_target(Session.Target)
+        Session.Route = None
+        Session.State = new_navigation_state()
+        Session.encoder.reset()
+        if Session.Target is not None:
+            Session.send("Target: " + Session.Target["Name"])
+
+    elif name == "set_route":
+        # Planned again if the database was reloaded since
+        if Planned_route is None or Planned_route[2] != Database.snapshot.source_hash:
+            Planned_route = plan_session_route(Session, command, Last_sample, time_offset)
+        Session.Route, total, Source_hash = Planned_route
+        Session.Target = Session.Route.current()
+        Session.State = new_navigation_state()
+        Session.encoder.reset()
+        Session.send(route_line(Session.Route, total))
+        Session.send("Target: " + Session.Target["Name"])
+
+    elif name == "next_target":
+        if Session.Route is None:
+            raise ValueError("No route to follow")
+        if Session.Route.advance() is None:
+            Session.send("Route: finished")
+        else :
+            Session.Target = Session.Route.current()
+            Session.State = new_navigation_state()
+            Session.encoder.reset()
+            Session.send("Target: " + Session.Target["Name"])
+
+    elif name == "stats":
+        Session.send(stats_line(bool(command.get("reset", False))))
+
+    elif name == "subscribe":
+        protocol = command.get("protocol", Compatibility_protocol)
+        if protocol not in Protocol_versions:
+            raise ValueError(f"Unknown protocol : {protocol}")
+        Session.protocol = protocol
+        Session.encoder.reset()
+        Session.subscribed = True
+        # Every page starts its own run in Logs.csv, Map.py shows the track of the last one
+        if logs_enabled == True and Session.Mode in logs_modes:
+            start_new_log_run()
+        Session.send("Python script ready to start !")
+
+    else:
+        raise ValueError(f"Unknown command : {name}")
+
+
+def run_daemon(port : int, Samples_queue : queue.Queue, Clock : TimeSync):
+    """Serves every connected frontend from a single source of coordinates"""
+    # Only needed to report the errors of the sessions
+    import traceback
+
+    Sessions = []
+    Sessions_lock = threading.Lock()
+    # Latest sample of the source, the start of the routes planned from the player
+    Last_sample = None
+
+    def serve_frontend(connection : socket.socket):
+        Session = Frontend_session(connection)
+        threading.Thread(target=Session.send_outbox, daemon=True).start()
+        with Sessions_lock:
+            Sessions.append(Session)
+        try :
+            with connection.makefile("r", encoding="utf-8") as lines:
+                for line in lines:
+                    if not line.strip():
                         continue
-                    
-                    #Get the actual rotation state in degrees using the rotation speed of the container, the actual time and a rotational adjustment value
-                    Rotation_state_in_degrees = ((Rotation_speed_in_degrees_per_second * Time_passed_since_reference_in_seconds) + Actual_Container["Rotation Adjust"]) % 360
-                    
-                    #get the new player unrotated coordinates
-                    New_player_local_unrotated_coordinates = {}
-                    for i in ['X', 'Y', 'Z']:
-                        New_player_local_unrotated_coordinates[i] = New_Player_Global_coordinates[i] - Actual_Container[i]
-                    
-                    #get the new player rotated coordinates
-                    New_player_local_rotated_coordinates = rotate_point_2D(New_player_local_unrotated_coordinates, radians(-1*Rotation_state_in_degrees))
-                    
-                    
-                    
-                    Distance_since_last_update = {}
-                    if Actual_Container["Name"] == Old_container["Name"]:
-                        for i in ["X", "Y", "Z"]:
-                            Distance_since_last_update[i] = abs(Old_player_local_rotated_coordinates[i] - New_player_local_rotated_coordinates[i])
-                    
-                    else :
-                        for i in ["X", "Y", "Z"]:
-                            Distance_since_last_update[i] = abs(Old_player_Global_coordinates[i] - New_Player_Global_coordinates[i])
-                    Distance_since_last_update_Total = vector_norm(Distance_since_last_update)
-                    
-                    
-                    
-                    
-                    # Lattitude, Longitude, Height
-                    
-                    #Radius of the container
-                    Radius = Actual_Container["Body Radius"]
-                    
-                    #Radial_Distance
-                    Radial_Distance = sqrt(New_player_local_rotated_coordinates["X"]**2 + New_player_local_rotated_coordinates["Y"]**2 + New_player_local_rotated_coordinates["Z"]**2)
-                    
-                    #Height
-                    Height = Radial_Distance - Radius
-                    
-                    #Longitude
                     try :
-                        Longitude = -1*degrees(atan2(New_player_local_rotated_coordinates["X"], New_player_local_rotated_coordinates["Y"]))
+                        command = json.loads(line)
+                        # Only the swap of the route needs the lock, not its planning
+                        Planned_route = plan_session_route(Session, command, Last_sample, Clock.offset) if command.get("command") == "set_route" else None
+                        with Sessions_lock:
+                            handle_command(Session, command, Last_sample, Clock.offset, Planned_route)
+                    except (ValueError, KeyError) as err:
+                        Session.send(f"Command error : {err}")
                     except Exception as err:
-                        print(f'Error in Longitude : {err} \nx = {New_player_local_rotated_coordinates["X"]}, y = {New_player_local_rotated_coordinates["Y"]} \nPlease report this to Valalol#1790 for me to try to solve this issue')
-                        sys.stdout.flush()
-                        Longitude = 0
-                    
-                    #Latitude
+                        # A bug in a command only fails this frontend, the daemon keeps serving the others
+                        traceback.print_exc()
+                        sys.stderr.flush()
+                        Session.send(f"Command error : {err!r}")
+        except OSError:
+            pass
+        finally:
+            with Sessions_lock:
+                Sessions.remove(Session)
+            Session.outbox.close()
+            connection.close()
+
+    def accept_frontends(server : socket.socket):
+        while True:
+            connection, address = server.accept()
+            threading.Thread(target=serve_frontend, args=(connection,), daemon=True).start()
+
+    server = socket.create_server(("127.0.0.1", port))
+    threading.Thread(target=accept_frontends, args=(server,), daemon=True).start()
+    print_line(f"Daemon listening on port {server.getsockname()[1]}")
+
+    while True:
+        Sample = Samples_queue.get()
+        with Sessions_lock:
+            if apply_pending_reload():
+                for Session in Sessions:
+                    Session.Target = refresh_navigation(Session.Target, Session.Route, Session.State)
+            if parse_coordinates(Sample.text) is not None:
+                Last_sample = Sample
+            if logs_enabled == True and any(Session.ready() and Session.Mode in logs_modes for Session in Sessions):
+                log_sample(Sample, Clock.offset)
+            for Session in list(Sessions):
+                if Session.ready():
                     try :
-                        Latitude = degrees(asin(New_player_local_rotated_coordinates["Z"]/Radial_Distance))
+                        # Only queues the lines, a frontend that reads slowly does not hold up the others
+                        new_data = handle_sample(Sample, Session.Mode, Session.Target, Session.State, Clock.offset, Session)
+                        Next_target = follow_route(Session.Route, new_data, Session)
+                        if Next_target is not None:
+                            Session.Target = Next_target
+                            Session.State = new_navigation_state()
+                            Session.encoder.reset()
                     except Exception as err:
-                        print(f'Error in Latitude : {err} \nz = {New_player_local_rotated_coordinates["Z"]}, radius = {Radial_Distance} \nPlease report this at Valalol#1790 for me to try to solve this issue')
-                        sys.stdout.flush()
-                        Latitude = 0
-                    
-                    
-                    
-                    
-                    
-                    
-                    
-                    
-                    # 3 closest OMs
-                    
-                    Closest_OM = {}
-                    
-                    if New_player_local_rotated_coordinates["X"] >= 0:
-                        Closest_OM["X"] = {"OM" : Actual_Container["POI"]["OM-5"], "Distance" : vector_norm({"X" : New_player_local_rotated_coordinates["X"] - Actual_Container["POI"]["OM-5"]["X"], "Y" : New_player_local_rotated_coordinates["Y"] - Actual_Container["POI"]["OM-5"]["Y"], "Z" : New_player_local_rotated_coordinates["Z"] - Actual_Container["POI"]["OM-5"]["Z"]})}
-                    else:
-                        Closest_OM["X"] = {"OM" : Actual_Container["POI"]["OM-6"], "Distance" : vector_norm({"X" : New_player_local_rotated_coordinates["X"] - Actual_Container["POI"]["OM-6"]["X"], "Y" : New_player_local_rotated_coordinates["Y"] - Actual_Container["POI"]["OM-6"]["Y"], "Z" : New_player_local_rotated_coordinates["Z"] - Actual_Container["POI"]["OM-6"]["Z"]})}
-                    if New_player_local_rotated_coordinates["Y"] >= 0:
-                        Closest_OM["Y"] = {"OM" : Actual_Container["POI"]["OM-3"], "Distance" : vector_norm({"X" : New_player_local_rotated_coordinates["X"] - Actual_Container["POI"]["OM-3"]["X"], "Y" : New_player_local_rotated_coordinates["Y"] - Actual_Container["POI"]["OM-3"]["Y"], "Z" : New_player_local_rotated_coordinates["Z"] - Actual_Container["POI"]["OM-3"]["Z"]})}
-                    else:
-                        Closest_OM["Y"] = {"OM" : Actual_Container["POI"]["OM-4"], "Distance" : vector_norm({"X" : New_player_local_rotated_coordinates["X"] - Actual_Container["POI"]["OM-4"]["X"], "Y" : New_player_local_rotated_coordinates["Y"] - Actual_Container["POI"]["OM-4"]["Y"], "Z" : New_player_local_rotated_coordinates["Z"] - Actual_Container["POI"]["OM-4"]["Z"]})}
-                    if New_player_local_rotated_coordinates["Z"] >= 0:
-                        Closest_OM["Z"] = {"OM" : Actual_Container["POI"]["OM-1"], "Distance" : vector_norm({"X" : New_player_local_rotated_coordinates["X"] - Actual_Container["POI"]["OM-1"]["X"], "Y" : New_player_local_rotated_coordinates["Y"] - Actual_Container["POI"]["OM-1"]["Y"], "Z" : New_player_local_rotated_coordinates["Z"] - Actual_Container["POI"]["OM-1"]["Z"]})}
-                    else:
-                        Closest_OM["Z"] = {"OM" : Actual_Container["POI"]["OM-2"], "Distance" : vector_norm({"X" : New_player_local_rotated_coordinates["X"] - Actual_Container["POI"]["OM-2"]["X"], "Y" : New_player_local_rotated_coordinates["Y"] - Actual_Container["POI"]["OM-2"]["Y"], "Z" : New_player_local_rotated_coordinates["Z"] - Actual_Container["POI"]["OM-2"]["Z"]})}
-                
-                
-                
-                
-                
-                
-                
-                    # 2 Closest POIs
-                    Player_to_POIs_Distances = []
-                    for POI in Database['Containers'][Actual_Container['Name']]["POI"]:
-                        Vector_POI_Player = {}
-                        for i in ["X", "Y", "Z"]:
-                            Vector_POI_Player[i] = abs(New_player_local_rotated_coordinates[i] - Database["Containers"][Actual_Container['Name']]["POI"][POI][i])
-                        Distance_POI_Player = vector_norm(Vector_POI_Player)
-                        Player_to_POIs_Distances.append({"Name" : POI, "Distance" : Distance_POI_Player})
-                
-                # for POI in Database['Space_POI']:
-                #     Vector_POI_Player = {}
-                #     for i in ["X", "Y", "Z"]:
-                #         Vector_POI_Player[i] = abs(New_Player_Global_coordinates[i] - Database["Space_POI"][POI][i])
-                #     Distance_POI_Player = vector_norm(Vector_POI_Player)
-                #     Player_to_POIs_Distances.append({"Name" : POI, "Distance" : Distance_POI_Player})
-                
-                
-                    Player_to_POIs_Distances_Sorted = sorted(Player_to_POIs_Distances, key=lambda k: k['Distance'])
-
-
-
-
-
-
-                #------------------------------------------------------------Backend to Frontend------------------------------------------------------------
-                if Actual_Container["Name"] == "None":
-                    new_data = {
-                        "updated" : f"Updated : {time.strftime('%H:%M:%S', time.localtime(time.time()))}",
-                        "player_global_x" : f"Global X : {round(New_Player_Global_coordinates['X'], 3)}",
-                        "player_global_y" : f"Global Y : {round(New_Player_Global_coordinates['Y'], 3)}",
-                        "player_global_z" : f"Global Z : {round(New_Player_Global_coordinates['Z'], 3)}",
-                        "distance_change" : f"Distance since last update : {round(Distance_since_last_update_Total, 3)} km",
-                        "actual_container" : "None",
-                        "player_local_x" : "",
-                        "player_local_y" : "",
-                        "player_local_z" : "",
-                        "player_long" : "",
-                        "player_lat" : "",
-                        "player_height" : "",
-                        "player_OM1" : "",
-                        "player_OM2" : "",
-                        "player_OM3" : "",
-                        "closest_poi" : ""
-                    }
-                else :
-                    new_data = {
-                        "updated" : f"Updated : {time.strftime('%H:%M:%S', time.localtime(time.time()))}",
-                        "player_global_x" : f"Global X : {round(New_Player_Global_coordinates['X'], 3)}",
-                        "player_global_y" : f"Global Y : {round(New_Player_Global_coordinates['Y'], 3)}",
-                        "player_global_z" : f"Global Z : {round(New_Player_Global_coordinates['Z'], 3)}",
-                        "distance_change" : f"Distance since last update : {round(Distance_since_last_update_Total, 3)} km",
-                        "actual_container" : f"Actual Container : {Actual_Container['Name']}",
-                        "player_local_x" : f"Local X : {round(New_player_local_rotated_coordinates['X'], 3)}",
-                        "player_local_y" : f"Local Y : {round(New_player_local_rotated_coordinates['Y'], 3)}",
-                        "player_local_z" : f"Local Z : {round(New_player_local_rotated_coordinates['Z'], 3)}",
-                        "player_long" : f"Longitude : {round(Longitude, 2)}°",
-                        "player_lat" : f"Latitude : {round(Latitude, 2)}°",
-                        "player_height" : f"Height : {round(Height, 1)} km",
-                        "player_OM1" : f"{Closest_OM['Z']['OM']['Name']} : {round(Closest_OM['Z']['Distance'], 3)} km",
-                        "player_OM2" : f"{Closest_OM['Y']['OM']['Name']} : {round(Closest_OM['Y']['Distance'], 3)} km",
-                        "player_OM3" : f"{Closest_OM['X']['OM']['Name']} : {round(Closest_OM['X']['Distance'], 3)} km",
-                        "closest_poi" : f"Closest POI : \n{Player_to_POIs_Distances_Sorted[0]['Name']} ({round(Player_to_POIs_Distances_Sorted[0]['Distance'], 3)} km) \n{Player_to_POIs_Distances_Sorted[1]['Name']} ({round(Player_to_POIs_Distances_Sorted[1]['Distance'], 3)} km)",
-                        }
-                
-                print("New data :", json.dumps(new_data))
-                sys.stdout.flush()
+                        # The sample is skipped for this frontend only, the next ones are still processed
+                        traceback.print_exc()
+                        sys.stderr.flush()
+                        Session.send(f"Update error : {err!r}")
 
 
 
+def main():
+    args = parser.parse_args()
 
-                #---------------------------------------------------Update coordinates for the next update------------------------------------------
-                for i in ["X", "Y", "Z"]:
-                    Old_player_Global_coordinates[i] = New_Player_Global_coordinates[i]
-                if Actual_Container["Name"] != "None":
-                    for i in ["X", "Y", "Z"]:
-                        Old_player_local_rotated_coordinates[i] = New_player_local_rotated_coordinates[i]
-                
-                Old_container = Actual_Container
-                
-                Old_time = New_time
-                
-                #-------------------------------------------------------------------------------------------------------------------------------------------
-
-
-        if new_clipboard == "1rst hotkey":
-            print("1rst hotkey")
-            sys.stdout.flush()
+    Mode = args.mode
 
-
-
-        if new_clipboard == "2nd hotkey":
-            print("2nd hotkey")
-            sys.stdout.flush()
+    Route = None
+    if Mode == "planetary_nav" and args.route:
+        try :
+            Route, total = get_route(args.container, args.route, not args.keep_order)
+        except ValueError as err:
+            raise SystemExit(str(err))
+        Target = Route.current()
+    elif Mode != "daemon":
+        Target = get_target(Mode, args)
+
+    print_line("Python script ready to start !")
+    print_line("Mode: " + Mode)
+    if Route is not None:
+        print_line(route_line(Route, total))
+
+    if args.metrics:
+        enable_metrics(args.metrics_port)
+        if settings.get("metrics_interval", 0) > 0:
+            threading.Thread(target=report_metrics, args=(print_line, settings["metrics_interval"]), daemon=True).start()
+
+    # Imports numpy, builds the POI arrays, loads the POI distances and the context of the planetary_nav target while waiting for the first coordinates
+    threading.Thread(target=warm_up_poi_engines, args=(Target if Mode == "planetary_nav" and Route is None else None,), daemon=True).start()
+
+    if settings.get("reload_interval", 0) > 0:
+        watch_files(settings["reload_interval"])
+
+    # The update check and the NTP sync run in the background, the navigation starts with the cached time offset
+    if settings["update_checker"] == True:
+        threading.Thread(target=check_for_updates, daemon=True).start()
+
+    Clock = TimeSync()
+    Clock.start(on_done=lambda time_offset: print_line(f"Time_offset: {time_offset}"))
+
+    # The daemon starts a run for every page instead (subscribe command)
+    if logs_enabled == True and Mode != "daemon":
+        start_new_log_run()
+
+    #Start the coordinates source, every new text it captures ends up in this queue
+    Samples_queue = queue.Queue()
+    Coordinates_source = make_source(args.source, Samples_queue, args.source_path, args.source_port)
+    Coordinates_source.start()
+
+    if Mode == "daemon":
+        run_daemon(args.port, Samples_queue, Clock)
+
+    State = new_navigation_state()
+    Output = Stdout_output(args.protocol)
+    while True:
+        #Wait for the next text captured by the source
+        Sample = Samples_queue.get()
+        if apply_pending_reload():
+            Target = refresh_navigation(Target, Route, State)
+        new_data = handle_sample(Sample, Mode, Target, State, Clock.offset, Output)
+        Next_target = follow_route(Route, new_data, Output)
+        if Next_target is not None:
+            Target = Next_target
+            State = new_navigation_state()
+            Output.encoder.reset()
+        if logs_enabled == True and Mode in logs_modes:
+            log_sample(Sample, Clock.offset)
+
+
+if __name__ == "__main__":
+    main()
 
 
 
 # Hurston : Coordinates: x:12850457093 y:0 z:0
 # Microtech : Coordinates: x:22462016306.0103 y:37185625645.8346 z:0
 # Daymar : Coordinates: x:-18930439540 y:-2610058765 z:0
-
@@ -0,0 +1,226 @@
+"""Per-update pipeline of the modes : throughput and p50/p99 latency of a full update and of each of its stages.
+
+Run from the root of the repository : python benchmarks/bench_pipeline.py [--compare benchmarks/results/pipeline_<commit>.json]
+
+The inputs are fixed (seeded positions around Daymar and in space, one sample per second from a fixed time) and the
+wall clock of the backend is replaced by a fixed one, nothing reads the clipboard or the network.
+The results are saved to benchmarks/results/pipeline_<commit>.json (not tracked by git, they depend on the machine),
+--compare prints the change against an older file and fails when a p50 got slower by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+Root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, Root)
+# backend.py reads settings.json and the database from the current folder
+os.chdir(Root)
+
+import backend
+from coordinate_sources import Sample, parse_coordinates
+from protocol import Compatibility_protocol, Delta_protocol, DeltaEncoder, update_line
+
+
+Fixed_time = 1700000000.0
+Updates = 2000
+
+Results_folder = os.path.join(Root, "benchmarks", "results")
+
+
+
+class Collected_output(backend.Frontend_output):
+    """Frontend keeping the lines of the updates in memory"""
+
+    def __init__(self, protocol : int):
+        super().__init__(protocol)
+        self.lines = []
+
+    def send(self, line : str):
+        self.lines.append(line)
+
+    def put_update(self, keyframe : bool, fields : dict):
+        self.lines.append(self.update_line(keyframe, fields))
+
+
+
+def coordinates_text(Position):
+    """`/showlocation` text of a global position in km"""
+    return f"Coordinates: x:{Position[0]*1000} y:{Position[1]*1000} z:{Position[2]*1000}"
+
+
+def make_inputs(count : int, seed : int = 0):
+    """Texts of positions flying over Daymar (below its OM radius) and of positions anywhere in the system"""
+    random = np.random.default_rng(seed)
+    Daymar = backend.Database["Containers"]["Daymar"]
+    Centre = np.array([Daymar["X"], Daymar["Y"], Daymar["Z"]])
+
+    # Away from the poles, where the sunrise and sunset do not exist
+    Latitude = np.radians(random.uniform(-60, 60, count))
+    Longitude = np.radians(random.uniform(-180, 180, count))
+    directions = np.stack([np.cos(Latitude) * np.cos(Longitude), np.cos(Latitude) * np.sin(Longitude), np.sin(Latitude)], axis=1)
+    Surface = Centre + directions * random.uniform(Daymar["Body Radius"], Daymar["OM Radius"], size=(count, 1))
+    Space = random.uniform(-5e7, 5e7, size=(count, 3))
+    # Half of the space positions are near Daymar, so the companion goes in and out of the container
+    Space[::2] = Surface[::2]
+
+    return [coordinates_text(Position) for Position in Surface], [coordinates_text(Position) for Position in Space]
+
+
+def measure(function, arguments : list, clock = time.perf_counter):
+    """Latencies in seconds of function(*arguments[i]) for every i"""
+    latencies = []
+    for argument in arguments:
+        start = clock()
+        function(*argument)
+        latencies.append(clock() - start)
+    return latencies
+
+
+def summarize(latencies : list):
+    ordered = np.sort(latencies)
+    return {
+        "count": len(ordered),
+        "throughput_per_s": len(ordered) / ordered.sum() if ordered.sum() > 0 else float("inf"),
+        "p50_us": float(np.percentile(ordered, 50)) * 1e6,
+        "p99_us": float(np.percentile(ordered, 99)) * 1e6,
+        "mean_us": float(ordered.mean()) * 1e6
+    }
+
+
+
+def full_updates(Texts : list, Mode : str, Target : dict, protocol : int, clock):
+    """Latencies of handle_sample (parsing, update and serialization) on every text, with a fresh navigation state"""
+    State = backend.new_navigation_state()
+    Output = Collected_output(protocol)
+    Samples = [(Sample(text, Fixed_time + i, "benchmark"),) for i, text in enumerate(Texts)]
+    return measure(lambda Sample: backend.handle_sample(Sample, Mode, Target, State, 0, Output), Samples, clock)
+
+
+def stages(Texts : list, Target : dict, clock):
+    """Latencies of each stage of a planetary_nav update"""
+    Times = [Fixed_time + i for i in range(len(Texts))]
+    Results = {}
+
+    Results["parsing"] = measure(parse_coordinates, [(text,) for text in Texts], clock)
+    Positions = [parse_coordinates(text) for text in Texts]
+
+    Results["container_lookup"] = measure(backend.get_current_container, [(P["X"], P["Y"], P["Z"]) for P in Positions], clock)
+    Containers = [backend.get_current_container(P["X"], P["Y"], P["Z"]) for P in Positions]
+
+    rotation_arguments = [(Time - backend.Reference_time, P["X"], P["Y"], P["Z"], Container) for Time, P, Container in zip(Times, Positions, Containers)]
+    Results["rotation"] = measure(backend.get_local_rotated_coordinates, rotation_arguments, clock)
+    Locals = [backend.get_local_rotated_coordinates(*argument) for argument in rotation_arguments]
+
+    Results["poi_search"] = measure(backend.get_closest_POI, [(L["X"], L["Y"], L["Z"], Container, False, 1) for L, Container in zip(Locals, Containers)], clock)
+
+    sunrise_arguments = []
+    for Time, L, Container in zip(Times, Locals, Containers):
+        Latitude, Longitude, Height = backend.get_lat_long_height(L["X"], L["Y"], L["Z"], Container)
+        sunrise_arguments.append((L["X"], L["Y"], L["Z"], Latitude, Longitude, Height, Container, backend.Database["Containers"]["Stanton"], Time - backend.Reference_time))
+    Results["sunrise"] = measure(backend.get_sunset_sunrise_predictions, sunrise_arguments, clock)
+
+    State = backend.new_navigation_state()
+    Data = [backend.planetary_nav_update(P, Time, Target, State) for P, Time in zip(Positions, Times)]
+    Results["serialization_text"] = measure(lambda data: update_line(Compatibility_protocol, 0, True, backend.planetary_nav_text(data)), [(data,) for data in Data], clock)
+    Encoder = DeltaEncoder()
+    Results["serialization_delta"] = measure(lambda data: update_line(Delta_protocol, 0, *Encoder.encode(data)), [(data,) for data in Data], clock)
+
+    return Results
+
+
+def run_benchmarks(count : int = Updates, clock = time.perf_counter):
+    """Returns {benchmark name: summary}"""
+    backend.Wall_clock = lambda: Fixed_time
+    # numpy and the POI arrays are loaded on the first search, not inside the measures
+    backend.get_poi_search()
+
+    Surface, Space = make_inputs(count)
+    Planetary_target = backend.get_target("planetary_nav", backend.parser.parse_args(["planetary_nav", "--container", "Daymar", "--known", "true", "--target", "Javelin Wreck"]))
+    Space_target = backend.get_target("space_nav", backend.parser.parse_args(["space_nav", "--known", "false", "--x", "-18930539.54", "--y", "-2610158.765", "--z", "500"]))
+
+    cases = [
+        ("planetary_nav", Surface, Planetary_target),
+        ("space_nav", Space, Space_target),
+        ("companion", Space, None)
+    ]
+
+    Results = {}
+    for Mode, Texts, Target in cases:
+        for protocol, protocol_name in [(Compatibility_protocol, "text"), (Delta_protocol, "delta")]:
+            # Warm up the caches of the mode before the measure
+            full_updates(Texts[:50], Mode, Target, protocol, clock)
+            Results[f"{Mode}/{protocol_name}"] = summarize(full_updates(Texts, Mode, Target, protocol, clock))
+
+    for stage, latencies in stages(Surface, Planetary_target, clock).items():
+        Results[f"stage/{stage}"] = summarize(latencies)
+
+    return Results
+
+
+
+def current_commit():
+    try :
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(Results : dict, path : str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "commit": current_commit(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "results": Results
+        }, f, indent=4)
+
+
+def print_results(Results : dict, Previous : dict = None):
+    print(f"{'benchmark':<32} {'updates/s':>11} {'p50 us':>9} {'p99 us':>9}" + (f" {'previous p50':>13} {'change':>8}" if Previous else ""))
+    for name, summary in Results.items():
+        line = f"{name:<32} {summary['throughput_per_s']:>11.0f} {summary['p50_us']:>9.1f} {summary['p99_us']:>9.1f}"
+        if Previous and name in Previous:
+            line += f" {Previous[name]['p50_us']:>13.1f} {summary['p50_us'] / Previous[name]['p50_us'] - 1:>+8.0%}"
+        print(line)
+
+
+def regressions(Results : dict, Previous : dict, threshold : float):
+    return [name for name, summary in Results.items() if name in Previous and summary["p50_us"] > Previous[name]["p50_us"] * (1 + threshold)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the per-update pipeline of the modes")
+    parser.add_argument("--updates", type=int, default=Updates)
+    parser.add_argument("--save", type=str, help="Results file (benchmarks/results/pipeline_<commit>.json by default)")
+    parser.add_argument("--compare", type=str, help="Results file of a previous version")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown of a p50 reported as a regression")
+    args = parser.parse_args()
+
+    Previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            Previous = json.load(f)["results"]
+
+    Results = run_benchmarks(args.updates)
+    print_results(Results, Previous)
+
+    path = args.save or os.path.join(Results_folder, f"pipeline_{current_commit()}.json")
+    save_results(Results, path)
+    print(f"Results saved to {path}")
+
+    if Previous:
+        slower = regressions(Results, Previous, args.threshold)
+        if slower:
+            raise SystemExit(f"Regressions (p50 more than {args.threshold:.0%} slower) : {', '.join(slower)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Nearest POI search : the former dict + full sort get_closest_POI against the NumPy top-k engine.
+
+Run from the root of the repository : python benchmarks/bench_poi_search.py
+"""
+import os
+import sys
+import time
+from math import sqrt
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_snapshot import load_database
+from poi_search import POISearch
+
+
+
+def legacy_get_closest_POI(X : float, Y : float, Z : float, Container : dict, Quantum_marker : bool = False):
+    """get_closest_POI as it was before the NumPy engine"""
+    Distances_to_POIs = []
+    for POI in Container["POI"]:
+        Vector_POI = {
+            "X": abs(X - Container["POI"][POI]["X"]),
+            "Y": abs(Y - Container["POI"][POI]["Y"]),
+            "Z": abs(Z - Container["POI"][POI]["Z"])
+        }
+        Distance_POI = sqrt(Vector_POI["X"]**2 + Vector_POI["Y"]**2 + Vector_POI["Z"]**2)
+        if Quantum_marker and Container["POI"][POI]["QTMarker"] == "TRUE" or not Quantum_marker:
+            Distances_to_POIs.append({"Name" : POI, "Distance" : Distance_POI})
+    return sorted(Distances_to_POIs, key=lambda k: k['Distance'])
+
+
+def time_per_call(function, queries, repeat : int = 3):
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            function(*query)
+        best = min(best, (time.perf_counter() - start) / len(queries))
+    return best * 1e6
+
+
+def synthetic_container(count : int, seed : int = 0):
+    """A container dict and its engine with `count` POIs spread on a 1000 km sphere"""
+    random = np.random.default_rng(seed)
+    directions = random.normal(size=(count, 3))
+    coordinates = 1000 * directions / np.linalg.norm(directions, axis=1)[:, None]
+    quantum_markers = random.random(count) < 0.2
+    names = [f"POI {i}" for i in range(count)]
+    Container = {"Name": "Synthetic", "POI": {
+        name: {"X": x, "Y": y, "Z": z, "QTMarker": "TRUE" if qt else "FALSE"}
+        for name, (x, y, z), qt in zip(names, coordinates, quantum_markers)
+    }}
+    return Container, POISearch(names, coordinates, quantum_markers, {"Synthetic": (0, count)})
+
+
+def main():
+    Database = load_database("Database.json")
+    Engine = POISearch.from_database(Database)
+    random = np.random.default_rng(1)
+
+    print(f"{'container':<12} {'POIs':>7} {'legacy us':>11} {'numpy us':>10} {'speedup':>8}")
+
+    cases = []
+    for name in Database["Containers"]:
+        Container = Database["Containers"][name]
+        if len(Container["POI"]) >= 20:
+            cases.append((name, Container, Engine, 200))
+    for count in [100, 1000, 10000, 100000]:
+        Container, Synthetic_engine = synthetic_container(count)
+        cases.append(("Synthetic", Container, Synthetic_engine, max(3, 20000 // count)))
+
+    for name, Container, Case_engine, query_count in cases:
+        queries = [tuple(point) for point in random.uniform(-1000, 1000, size=(query_count, 3))]
+
+        # Both answer the same closest POI
+        for X, Y, Z in queries[:3]:
+            assert legacy_get_closest_POI(X, Y, Z, Container)[0]["Name"] == Case_engine.closest(X, Y, Z, Container["Name"])[0][0]
+
+        legacy = time_per_call(lambda X, Y, Z: legacy_get_closest_POI(X, Y, Z, Container, True), queries)
+        engine = time_per_call(lambda X, Y, Z: Case_engine.closest(X, Y, Z, Container["Name"], 1, True), queries)
+        print(f"{name:<12} {len(Container['POI']):>7} {legacy:>11.1f} {engine:>10.1f} {legacy / engine:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
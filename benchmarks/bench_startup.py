@@ -0,0 +1,70 @@
+"""Startup budget of the backend : time until the first "Python script ready" line with the network unreachable.
+
+Run from the root of the repository : python benchmarks/bench_startup.py
+"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+Budget_ms = 150
+Runs = 10
+
+Root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def measure_once(directory : str):
+    # Every HTTP request goes to a closed local port, the NTP server is queried in the background anyway
+    env = dict(os.environ, HTTP_PROXY="http://127.0.0.1:9", HTTPS_PROXY="http://127.0.0.1:9", NO_PROXY="")
+    # Like an install, the first launch leaves the bytecode of the modules behind : without it every launch
+    # compiles the whole backend again
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "backend.py", "planetary_nav", "--container", "Daymar", "--known", "true", "--target", "Javelin Wreck", "--source", "stdin"],
+        cwd=directory, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try :
+        for line in process.stdout:
+            if line.startswith("Python script ready"):
+                return (time.perf_counter() - start) * 1000
+        raise RuntimeError("The backend stopped before being ready")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    # Work on a copy so the run does not touch the Logs and Cache folders of the repository
+    with tempfile.TemporaryDirectory() as directory:
+        for name in os.listdir(Root):
+            if name.endswith(".py") or name.endswith(".json"):
+                shutil.copy(os.path.join(Root, name), directory)
+
+        # The first launch compiles the database snapshot and the modules, the budget is for the launches after it
+        measure_once(directory)
+        timings = [measure_once(directory) for i in range(Runs)]
+
+    # What a bare interpreter costs on this machine, to tell the backend's share apart
+    interpreter = []
+    for i in range(Runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        interpreter.append((time.perf_counter() - start) * 1000)
+
+    median = statistics.median(timings)
+    print(f"Time to ready : median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms (budget {Budget_ms} ms)")
+    print(f"Bare interpreter : median {statistics.median(interpreter):.1f} ms")
+
+    if median > Budget_ms:
+        raise SystemExit(f"Startup budget exceeded : {median:.1f} ms > {Budget_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
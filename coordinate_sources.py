@@ -0,0 +1,184 @@
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import namedtuple
+
+
+# A piece of text coming from a source and the moment it was captured (time.time(), before any NTP offset)
+Sample = namedtuple("Sample", ["text", "time", "source"])
+
+
+
+def parse_coordinates(text : str):
+    """Returns the global XYZ coordinates (in km) of a `Coordinates: x:.. y:.. z:..` string, or None"""
+    if not text.startswith("Coordinates:"):
+        return None
+
+    #split the text in sections
+    text_splitted = text.replace(":", " ").split(" ")
+
+    try :
+        return {
+            "X": float(text_splitted[3])/1000,
+            "Y": float(text_splitted[5])/1000,
+            "Z": float(text_splitted[7])/1000
+        }
+    except (IndexError, ValueError):
+        return None
+
+
+
+class CoordinateSource(threading.Thread):
+    """Base class of the sources, every new text is pushed as a Sample in the shared queue"""
+
+    name = "source"
+
+    def __init__(self, Samples_queue : queue.Queue):
+        super().__init__(daemon=True)
+        self.Samples_queue = Samples_queue
+        self.stopped = threading.Event()
+
+    def push(self, text : str, captured_time : float = None):
+        if captured_time is None:
+            captured_time = time.time()
+        # The queue is unbounded so a slow consumer never makes a source drop a sample
+        self.Samples_queue.put(Sample(text.strip(), captured_time, self.name))
+
+    def stop(self):
+        self.stopped.set()
+
+
+
+class ClipboardSource(CoordinateSource):
+    """Polls the clipboard, fast right after a change and slower and slower while it stays idle"""
+
+    name = "clipboard"
+
+    # The idle interval is also the latency of the first /showlocation after a pause : it stays under the 200 ms
+    # of the old fixed polling, reading the clipboard 10 times a second costs next to nothing
+    def __init__(self, Samples_queue : queue.Queue, min_interval : float = 1/50, max_interval : float = 1/10, backoff : float = 1.5):
+        super().__init__(Samples_queue)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+    def paste(self):
+        return self.clipboard.paste()
+
+    def run(self):
+        import pyperclip
+        self.clipboard = pyperclip
+
+        #Reset the clipboard content
+        pyperclip.copy("")
+        Old_clipboard = ""
+        interval = self.min_interval
+
+        while not self.stopped.is_set():
+            new_clipboard = self.paste()
+            captured_time = time.time()
+
+            if new_clipboard == Old_clipboard or new_clipboard == "":
+                #Nothing new, wait a bit longer than last time
+                interval = min(interval * self.backoff, self.max_interval)
+            else :
+                Old_clipboard = new_clipboard
+                self.push(new_clipboard, captured_time)
+                #Something happened, a new command is likely to follow soon
+                interval = self.min_interval
+
+            self.stopped.wait(interval)
+
+
+
+class FileTailSource(CoordinateSource):
+    """Follows a text file like `tail -f` and pushes every new line"""
+
+    name = "file"
+
+    def __init__(self, Samples_queue : queue.Queue, path : str, from_start : bool = False, interval : float = 1/10):
+        super().__init__(Samples_queue)
+        self.path = path
+        self.from_start = from_start
+        self.interval = interval
+
+    def run(self):
+        while not os.path.isfile(self.path):
+            if self.stopped.wait(self.interval):
+                return
+
+        with open(self.path, "r") as f:
+            if not self.from_start:
+                f.seek(0, os.SEEK_END)
+            pending = ""
+            while not self.stopped.is_set():
+                chunk = f.readline()
+                if not chunk:
+                    # Truncated or replaced file : start again from its beginning
+                    if os.path.isfile(self.path) and os.path.getsize(self.path) < f.tell():
+                        f.seek(0)
+                    self.stopped.wait(self.interval)
+                    continue
+                pending += chunk
+                # Only push complete lines, the writer may not have finished the last one
+                if pending.endswith("\n"):
+                    self.push(pending)
+                    pending = ""
+
+
+
+class StdinSource(CoordinateSource):
+    """Pushes every line written on the standard input"""
+
+    name = "stdin"
+
+    def run(self):
+        for line in sys.stdin:
+            if self.stopped.is_set():
+                break
+            self.push(line)
+
+
+
+class SocketSource(CoordinateSource):
+    """Listens on a local TCP port, every client can send lines of text"""
+
+    name = "socket"
+
+    def __init__(self, Samples_queue : queue.Queue, port : int, host : str = "127.0.0.1"):
+        super().__init__(Samples_queue)
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+
+    def handle_client(self, connection : socket.socket):
+        with connection, connection.makefile("r") as lines:
+            for line in lines:
+                self.push(line)
+
+    def run(self):
+        with self.server:
+            while not self.stopped.is_set():
+                connection, address = self.server.accept()
+                threading.Thread(target=self.handle_client, args=(connection,), daemon=True).start()
+
+
+
+def make_source(source_type : str, Samples_queue : queue.Queue, path : str = None, port : int = None):
+    """Returns the source matching the --source argument of the backend"""
+    if source_type == "clipboard":
+        return ClipboardSource(Samples_queue)
+    elif source_type == "file":
+        if path is None:
+            raise SystemExit("The file source needs a --source_path")
+        return FileTailSource(Samples_queue, path)
+    elif source_type == "stdin":
+        return StdinSource(Samples_queue)
+    elif source_type == "socket":
+        if port is None:
+            raise SystemExit("The socket source needs a --source_port")
+        return SocketSource(Samples_queue, port)
+    else:
+        raise SystemExit(f"Unknown coordinates source : {source_type}")
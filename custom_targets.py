@@ -0,0 +1,165 @@
+"""Local coordinates of custom planetary targets given by their OM distances or by their latitude/longitude/height.
+
+Usage :
+    python custom_targets.py pois.csv --container Daymar -o pois_xyz.csv
+
+The OMs of a container are on its axes (OM-1/OM-2 on +Z/-Z, OM-3/OM-4 on +Y/-Y, OM-5/OM-6 on +X/-X). A position
+is the least-squares fit of its distances to 3 OMs and of its distance to the centre (Body Radius + height), see
+navigation_math.trilaterate : the RMS of the 4 errors (km) tells how consistent they are. When the 3 OMs include an
+opposite pair (OM-1/OM-2, OM-3/OM-4, OM-5/OM-6) their plane contains the centre and the two mirror positions are at
+the same height : such triplets, and the ones that repeat an OM, are ambiguous and give no position.
+Heights are above the surface of the container, distances and heights in km, angles in degrees.
+
+The input CSV has a Name column and either OM1, OM1_Distance, OM2, OM2_Distance, OM3, OM3_Distance and Height
+columns (OM names as "OM-1" or "om1") or Latitude, Longitude and Height columns, plus a Container column when
+there is no --container. Every row of a container is solved in one vectorized call. The output has the fields
+of the POIs of Database.json followed by Latitude, Longitude, Height and Residual, the ambiguous rows have nan
+coordinates (poi_ingest.py skips them).
+"""
+import argparse
+import csv
+import re
+import sys
+
+import numpy as np
+
+import navigation_math
+from database_snapshot import load_database
+
+
+OM_names = ["OM-1", "OM-2", "OM-3", "OM-4", "OM-5", "OM-6"]
+OM_name_pattern = re.compile(r"^\s*om\s*-?\s*([1-6])\s*$", re.IGNORECASE)
+
+Output_fields = ["Name", "Container", "X", "Y", "Z", "QTMarker", "Latitude", "Longitude", "Height", "Residual"]
+
+# km, an OM entry whose distances and height are further than this from meeting is refused
+Max_residual = 1.0
+
+
+
+def om_index(name : str):
+    """Index in OM_names of "OM-1", "om1", "OM 1" ..."""
+    match = OM_name_pattern.match(str(name))
+    if match is None:
+        raise ValueError(f"Unknown OM : {name}")
+    return int(match.group(1)) - 1
+
+
+def om_positions(Container : dict):
+    """(6, 3) local coordinates of the OMs of a container, in the order of OM_names"""
+    return np.array([[Container["POI"][name][axis] for axis in ["X", "Y", "Z"]] for name in OM_names], dtype=np.float64)
+
+
+def solve_oms(Container : dict, OMs, OM_distances, Heights):
+    """(N, 3) local positions, (N,) residuals in km and (N,) ambiguous flags of N targets given by 3 OM names and distances and their height"""
+    # Community lists repeat the same few OM names : each spelling is parsed once
+    Names, Inverse = np.unique(np.asarray(OMs, dtype=str).reshape(-1), return_inverse=True)
+    Indices = np.array([om_index(name) for name in Names], dtype=np.intp)[Inverse].reshape(-1, 3)
+    Centres = om_positions(Container)[Indices]
+    Radial_distance = Container["Body Radius"] + np.asarray(Heights, dtype=np.float64)
+    return navigation_math.trilaterate(Centres, np.asarray(OM_distances, dtype=np.float64).reshape(-1, 3), Radial_distance)
+
+
+def solve_lat_long_height(Container : dict, Latitudes, Longitudes, Heights):
+    """(N, 3) local positions of N targets given by their latitude, longitude and height"""
+    return navigation_math.lat_long_height_to_local(Latitudes, Longitudes, Heights, Container["Body Radius"]).reshape(-1, 3)
+
+
+def custom_target(Container : dict, Position):
+    """Target dict of a custom POI of a container (the one of the xyz entry of backend.get_target)"""
+    return {
+        'Name': 'Custom POI',
+        'Container': Container["Name"],
+        'X': float(Position[0]),
+        'Y': float(Position[1]),
+        'Z': float(Position[2]),
+        "QTMarker": "FALSE"
+    }
+
+
+def target_from_oms(Container : dict, OMs : list, OM_distances : list, Height : float):
+    if None in OMs or None in OM_distances or Height is None:
+        raise ValueError("The OM entry needs 3 OM names, 3 distances and a height")
+    Positions, Residuals, Ambiguous = solve_oms(Container, [OMs], [OM_distances], [Height])
+    if Ambiguous[0] or not np.isfinite(Positions[0]).all():
+        raise ValueError(f"The OMs {', '.join(map(str, OMs))} do not locate a single position : use 3 different OMs without an opposite pair")
+    if Residuals[0] > Max_residual:
+        raise ValueError(f"The OM distances and the height are {Residuals[0]:.3f} km from meeting at one position")
+    return custom_target(Container, Positions[0])
+
+
+def target_from_lat_long_height(Container : dict, Latitude : float, Longitude : float, Height : float):
+    if None in (Latitude, Longitude, Height):
+        raise ValueError("The Long/Lat/Height entry needs a latitude, a longitude and a height")
+    return custom_target(Container, solve_lat_long_height(Container, [Latitude], [Longitude], [Height])[0])
+
+
+
+#-----------------------------------------------------Batch--------------------------------------------------------------
+
+def solve_rows(Container : dict, rows : list):
+    """Output rows of input CSV rows of a container, solved in one call"""
+    Heights = [float(row["Height"]) for row in rows]
+    if "OM1" in rows[0]:
+        OMs = [[row["OM1"], row["OM2"], row["OM3"]] for row in rows]
+        OM_distances = [[float(row["OM1_Distance"]), float(row["OM2_Distance"]), float(row["OM3_Distance"])] for row in rows]
+        Positions, Residuals, Ambiguous = solve_oms(Container, OMs, OM_distances, Heights)
+        Positions[Ambiguous] = np.nan
+    else :
+        Positions = solve_lat_long_height(Container, [float(row["Latitude"]) for row in rows], [float(row["Longitude"]) for row in rows], Heights)
+        Residuals = np.zeros(len(rows))
+
+    Latitudes, Longitudes, Solved_heights = navigation_math.lat_long_height(Positions, Container["Body Radius"])
+    return [
+        {"Name": row["Name"], "Container": Container["Name"], "X": x, "Y": y, "Z": z, "QTMarker": "FALSE",
+         "Latitude": latitude, "Longitude": longitude, "Height": height, "Residual": residual}
+        for row, (x, y, z), latitude, longitude, height, residual
+        in zip(rows, Positions.tolist(), Latitudes.tolist(), Longitudes.tolist(), Solved_heights.tolist(), Residuals.tolist())
+    ]
+
+
+def solve_file(Database, f, container_name : str = None):
+    """Output rows of an input CSV file, the rows of each container solved together"""
+    rows_by_container = {}
+    for row in csv.DictReader(f):
+        rows_by_container.setdefault(row.get("Container") or container_name, []).append(row)
+
+    Output_rows = []
+    for name, rows in rows_by_container.items():
+        if name is None:
+            raise ValueError("The rows without Container need --container")
+        Output_rows += solve_rows(Database["Containers"][name], rows)
+    return Output_rows
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local coordinates of custom POIs given by OM distances or latitude/longitude/height")
+    parser.add_argument("input", type=str)
+    parser.add_argument("--container", type=str, help="Container of the rows without a Container column")
+    parser.add_argument("-o", "--output", type=str, help="Output CSV (standard output by default)")
+    args = parser.parse_args()
+
+    Database = load_database('Database.json')
+    with open(args.input, newline='') as f:
+        Output_rows = solve_file(Database, f, args.container)
+
+    output = open(args.output, "w", newline='') if args.output else sys.stdout
+    try :
+        writer = csv.DictWriter(output, fieldnames=Output_fields)
+        writer.writeheader()
+        writer.writerows(Output_rows)
+    finally:
+        if args.output:
+            output.close()
+
+    Residuals = np.array([row["Residual"] for row in Output_rows])
+    Ambiguous = np.array([not np.isfinite(row["X"]) for row in Output_rows])
+    if len(Residuals) > Ambiguous.sum():
+        print(f"{len(Residuals)} POIs, residual max {np.nanmax(Residuals[~Ambiguous])*1000:.1f} m, {int(np.sum(Residuals[~Ambiguous] > 0.01))} above 10 m", file=sys.stderr)
+    if Ambiguous.any():
+        print(f"{int(Ambiguous.sum())} POIs without position : their OMs include an opposite pair or the same OM twice", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Compiled snapshot of Database.json.
+
+The JSON database is compiled once into a binary file made of a small JSON header (names, string fields,
+layout) followed by float64 tables :
+- "containers" : one row per container (X, Y, Z, qw, qx, qy, qz, OM Radius, Rotation Speed, Rotation Adjust, ...)
+- "pois"       : one row per planetary POI (X, Y, Z, qw, qx, qy, qz), grouped by container
+- "space_pois" : one row per space POI
+
+The POIs added by poi_ingest.py are appended to an overlay file next to the JSON (Database_overlay.jsonl, one POI
+record per line) and merged with it when the snapshot is compiled.
+The snapshot is memory-mapped and reused as long as the sha256 of the JSON and of the overlay has not changed.
+`load_database` returns read-only views that behave like the dicts of the JSON file, so the existing
+`Database["Containers"][name]["POI"][poi]["X"]` accesses keep working on top of the tables.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+
+Snapshot_version = 1
+Magic = b"SCNDB\x00\x00\x01"
+Default_snapshot_path = "Cache/Database.snapshot"
+Overlay_suffix = "_overlay.jsonl"
+
+
+
+#---------------------------------------------------------Compilation---------------------------------------------------------------
+
+def database_hash(*contents : bytes):
+    """Returns the sha256 of the raw content of the database files"""
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def overlay_path_of(path : str):
+    """Database.json -> Database_overlay.jsonl"""
+    return os.path.splitext(path)[0] + Overlay_suffix
+
+
+def read_overlay(content : bytes):
+    """POI records of the content of an overlay file, the last line is skipped if an append was cut short"""
+    records = []
+    for line in content.splitlines():
+        try :
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records
+
+
+def merge_overlay(Database : dict, records : list):
+    """Adds the overlay POIs to a parsed database (a later record replaces an earlier one of the same name)"""
+    for record in records:
+        container = Database["Containers"].get(record.get("Container"))
+        if container is not None and isinstance(record.get("Name"), str):
+            container["POI"][record["Name"]] = record
+    return Database
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def encode_table(records : list, skip_keys : tuple = ()):
+    """Splits a list of dicts into numeric columns (float64 rows) and string columns (kept in the header)"""
+    keys = []
+    numeric_fields = []
+    for record in records:
+        for key, value in record.items():
+            if key in skip_keys:
+                continue
+            if key not in keys:
+                keys.append(key)
+            if is_number(value) and key not in numeric_fields:
+                numeric_fields.append(key)
+
+    string_fields = [key for key in keys if key not in numeric_fields]
+
+    rows = []
+    strings = []
+    for record in records:
+        rows.append([float(record[key]) if key in record else float("nan") for key in numeric_fields])
+        strings.append([record.get(key) for key in string_fields])
+
+    return {"keys": keys, "numeric_fields": numeric_fields, "string_fields": string_fields, "strings": strings}, rows
+
+
+def compile_snapshot(Database : dict, source_hash : str):
+    """Returns the bytes of the snapshot of a parsed database"""
+    container_names = list(Database["Containers"])
+    containers = [Database["Containers"][name] for name in container_names]
+
+    pois = []
+    poi_offsets = [0]
+    for container in containers:
+        pois.extend(container["POI"].values())
+        poi_offsets.append(len(pois))
+
+    space_pois = list(Database["Space_POI"].values())
+
+    tables = {}
+    arrays = {}
+    tables["containers"], arrays["containers"] = encode_table(containers, skip_keys=("POI",))
+    tables["pois"], arrays["pois"] = encode_table(pois)
+    tables["space_pois"], arrays["space_pois"] = encode_table(space_pois)
+
+    header = {
+        "version": Snapshot_version,
+        "source_hash": source_hash,
+        "container_names": container_names,
+        "poi_names": [name for container in containers for name in container["POI"]],
+        "poi_offsets": poi_offsets,
+        "space_poi_names": list(Database["Space_POI"]),
+        "tables": tables,
+        "layout": {}
+    }
+
+    # The float64 tables follow the header, each one aligned on 8 bytes
+    body = b""
+    for name in ["containers", "pois", "space_pois"]:
+        rows = arrays[name]
+        columns = len(tables[name]["numeric_fields"])
+        header["layout"][name] = {"offset": len(body), "rows": len(rows), "columns": columns}
+        body += struct.pack(f"<{len(rows) * columns}d", *[value for row in rows for value in row])
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(Magic) + 8 + len(header_bytes)) % 8)
+
+    return Magic + struct.pack("<Q", len(header_bytes)) + header_bytes + body
+
+
+def write_snapshot(path : str, content : bytes):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(content)
+    os.replace(temporary_path, path)
+
+
+
+#---------------------------------------------------------Loading---------------------------------------------------------------
+
+class Snapshot:
+    """Header and memory-mapped tables of a compiled database"""
+
+    def __init__(self, buffer):
+        if bytes(buffer[:len(Magic)]) != Magic:
+            raise ValueError("Not a database snapshot")
+        header_length = struct.unpack_from("<Q", buffer, len(Magic))[0]
+        start = len(Magic) + 8
+        self.buffer = buffer
+        self.header = json.loads(bytes(buffer[start:start + header_length]))
+        self.body_offset = start + header_length
+
+        self.source_hash = self.header["source_hash"]
+        self.container_names = self.header["container_names"]
+        self.poi_names = self.header["poi_names"]
+        self.poi_offsets = self.header["poi_offsets"]
+        self.space_poi_names = self.header["space_poi_names"]
+        self.tables = self.header["tables"]
+
+        # name -> row index maps
+        self.container_index = {name: i for i, name in enumerate(self.container_names)}
+        self.poi_index = {}
+        for i, container_name in enumerate(self.container_names):
+            self.poi_index[container_name] = {
+                self.poi_names[row]: row for row in range(self.poi_offsets[i], self.poi_offsets[i + 1])
+            }
+        self.space_poi_index = {name: i for i, name in enumerate(self.space_poi_names)}
+
+        # field -> column maps of every table
+        self.numeric_columns = {}
+        self.string_columns = {}
+        for name, table in self.tables.items():
+            self.numeric_columns[name] = {field: i for i, field in enumerate(table["numeric_fields"])}
+            self.string_columns[name] = {field: i for i, field in enumerate(table["string_fields"])}
+
+        self.values = {}
+        for name, layout in self.header["layout"].items():
+            size = layout["rows"] * layout["columns"] * 8
+            offset = self.body_offset + layout["offset"]
+            self.values[name] = memoryview(buffer)[offset:offset + size].cast("d")
+
+    def table_shape(self, name : str):
+        layout = self.header["layout"][name]
+        return layout["rows"], layout["columns"]
+
+    def array(self, name : str):
+        """Returns a table as a (rows, columns) float64 NumPy array sharing the mapped memory"""
+        import numpy as np
+        return np.frombuffer(self.values[name], dtype=np.float64).reshape(self.table_shape(name))
+
+    def column(self, name : str, field : str):
+        return self.numeric_columns[name][field]
+
+    def container_poi_rows(self, container_name : str):
+        """Returns the (start, end) rows of the POIs of a container in the "pois" table"""
+        i = self.container_index[container_name]
+        return self.poi_offsets[i], self.poi_offsets[i + 1]
+
+
+
+class RecordView(Mapping):
+    """Read-only dict-like view of one row of a snapshot table"""
+
+    __slots__ = ("snapshot", "table", "row", "children", "columns", "values", "offset")
+
+    def __init__(self, snapshot : Snapshot, table : str, row : int, children : Mapping = None):
+        self.snapshot = snapshot
+        self.table = table
+        self.row = row
+        self.children = children
+        # The numeric fields are read on every update : their lookups are resolved once per view
+        self.columns = snapshot.numeric_columns[table]
+        self.values = snapshot.values[table]
+        self.offset = row * len(self.columns)
+
+    def __getitem__(self, key):
+        column = self.columns.get(key)
+        if column is not None:
+            return self.values[self.offset + column]
+        if key == "POI" and self.children is not None:
+            return self.children
+        return self.snapshot.tables[self.table]["strings"][self.row][self.snapshot.string_columns[self.table][key]]
+
+    def __iter__(self):
+        yield from self.snapshot.tables[self.table]["keys"]
+        if self.children is not None:
+            yield "POI"
+
+    def __len__(self):
+        return len(self.snapshot.tables[self.table]["keys"]) + (self.children is not None)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+
+class NamedRecords(Mapping):
+    """Read-only dict-like view name -> RecordView, the views are created on first access"""
+
+    def __init__(self, snapshot : Snapshot, table : str, index : dict, children : dict = None):
+        self.snapshot = snapshot
+        self.table = table
+        self.index = index
+        self.children = children or {}
+        self.views = {}
+
+    def __getitem__(self, name):
+        view = self.views.get(name)
+        if view is None:
+            view = RecordView(self.snapshot, self.table, self.index[name], self.children.get(name))
+            self.views[name] = view
+        return view
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+
+
+class DatabaseView(Mapping):
+    """Read-only view with the same structure as Database.json : {"Containers": {...}, "Space_POI": {...}}"""
+
+    def __init__(self, snapshot : Snapshot):
+        self.snapshot = snapshot
+        POIs = {
+            container_name: NamedRecords(snapshot, "pois", snapshot.poi_index[container_name])
+            for container_name in snapshot.container_names
+        }
+        self.sections = {
+            "Containers": NamedRecords(snapshot, "containers", snapshot.container_index, POIs),
+            "Space_POI": NamedRecords(snapshot, "space_pois", snapshot.space_poi_index)
+        }
+
+    def __getitem__(self, key):
+        return self.sections[key]
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def __len__(self):
+        return len(self.sections)
+
+
+
+def same_record(a : Mapping, b : Mapping):
+    """True if two records have the same fields and values (POIs of a container left aside)"""
+    keys = [key for key in a if key != "POI"]
+    if keys != [key for key in b if key != "POI"]:
+        return False
+    # Missing numeric fields are NaN in the tables
+    return all(a[key] == b[key] or (a[key] != a[key] and b[key] != b[key]) for key in keys)
+
+
+def changed_containers(old : DatabaseView, new : DatabaseView):
+    """Names of the containers whose record or POIs differ between two databases, added and removed ones included"""
+    old_containers, new_containers = old["Containers"], new["Containers"]
+    changed = set(old_containers) ^ set(new_containers)
+    for name in set(old_containers) & set(new_containers):
+        old_POIs, new_POIs = old_containers[name]["POI"], new_containers[name]["POI"]
+        if (not same_record(old_containers[name], new_containers[name]) or list(old_POIs) != list(new_POIs)
+                or not all(same_record(old_POIs[poi], new_POIs[poi]) for poi in old_POIs)):
+            changed.add(name)
+    return changed
+
+
+
+def open_snapshot(path : str):
+    with open(path, "rb") as f:
+        try :
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return None
+    try :
+        return Snapshot(buffer)
+    except (ValueError, KeyError, struct.error):
+        return None
+
+
+def read_overlay_content(overlay_path : str):
+    try :
+        with open(overlay_path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def load_database(path : str = "Database.json", snapshot_path : str = Default_snapshot_path, overlay_path : str = None):
+    """Returns a DatabaseView of the database and its overlay, compiling their snapshot first if it is missing or outdated"""
+    with open(path, "rb") as f:
+        content = f.read()
+    overlay = read_overlay_content(overlay_path_of(path) if overlay_path is None else overlay_path)
+    # Without overlay the hash is the one of the JSON alone
+    source_hash = database_hash(content, overlay)
+
+    snapshot = None
+    if os.path.isfile(snapshot_path):
+        snapshot = open_snapshot(snapshot_path)
+        if snapshot is not None and (snapshot.header.get("version") != Snapshot_version or snapshot.source_hash != source_hash):
+            snapshot = None
+
+    if snapshot is None:
+        compiled = compile_snapshot(merge_overlay(json.loads(content), read_overlay(overlay)), source_hash)
+        try :
+            write_snapshot(snapshot_path, compiled)
+        except OSError:
+            # Read-only install folder or a snapshot still mapped by another backend : use it from memory
+            return DatabaseView(Snapshot(compiled))
+        snapshot = open_snapshot(snapshot_path) or Snapshot(compiled)
+
+    return DatabaseView(snapshot)
@@ -0,0 +1,237 @@
+"""Vectorized day/night cycle : the formulas of get_sunset_sunrise_predictions on arrays of positions.
+
+The star position in the frame of a container, its declination, apparent radius and the meridian only
+depend on the container and the star, they are computed once per container by `get_star_constants`.
+`day_states` then evaluates the hour angle, the state of the day and the next event for any number of
+positions at once, and `day_state_grid` does it for a whole latitude/longitude grid (night shading of Map.py).
+"""
+from math import sqrt, degrees, acos, asin, atan2, copysign, pi
+
+import numpy as np
+
+
+States_of_the_day = ["After midnight", "Morning Twilight", "Morning", "Afternoon", "Evening Twilight", "Before midnight", "Unknown"]
+Unknown_state = len(States_of_the_day) - 1
+Events = ["Sunrise", "Sunset", "N/A", "Unknown"]
+
+# (container name, star name) -> star_constants
+Star_constants_cache = {}
+
+
+
+def star_constants(Container, Star):
+    """Values of the sunrise/sunset calculation that only depend on the container and the star"""
+    # Stanton X Y Z coordinates in refrence of the center of the system
+    sx, sy, sz = Star["X"], Star["Y"], Star["Z"]
+
+    # Container X Y Z coordinates in refrence of the center of the system
+    bx, by, bz = Container["X"], Container["Y"], Container["Z"]
+
+    # Container qw/qx/qy/qz quaternion rotation
+    qw, qx, qy, qz = Container["qw"], Container["qx"], Container["qy"], Container["qz"]
+
+    # Stanton X Y Z coordinates in refrence of the center of the container
+    bsx = ((1-(2*qy**2)-(2*qz**2))*(sx-bx))+(((2*qx*qy)-(2*qz*qw))*(sy-by))+(((2*qx*qz)+(2*qy*qw))*(sz-bz))
+    bsy = (((2*qx*qy)+(2*qz*qw))*(sx-bx))+((1-(2*qx**2)-(2*qz**2))*(sy-by))+(((2*qy*qz)-(2*qx*qw))*(sz-bz))
+    bsz = (((2*qx*qz)-(2*qy*qw))*(sx-bx))+(((2*qy*qz)+(2*qx*qw))*(sy-by))+((1-(2*qx**2)-(2*qy**2))*(sz-bz))
+
+    # Solar Declination of Stanton
+    Solar_declination = degrees(acos((((sqrt(bsx**2+bsy**2+bsz**2))**2)+((sqrt(bsx**2+bsy**2))**2)-(bsz**2))/(2*(sqrt(bsx**2+bsy**2+bsz**2))*(sqrt(bsx**2+bsy**2)))))*copysign(1,bsz)
+
+    # Apparent Radius of Stanton
+    Apparent_Radius = degrees(asin(Star["Body Radius"]/(sqrt((bsx)**2+(bsy)**2+(bsz)**2))))
+
+    # Meridian determine where the star would be if the planet did not rotate.
+    # Between the planet and Stanton there is a plane that contains the north pole and south pole
+    # of the planet and the center of Stanton. Locations on the surface of the planet on this plane
+    # experience the phenomenon we call noon.
+    Meridian = degrees( (atan2(bsy,bsx)-(pi/2)) % (2*pi) )
+
+    rotation_speed = Container["Rotation Speed"]
+
+    return {
+        "Container": Container["Name"],
+        "Star_in_container_frame": (bsx, bsy, bsz),
+        "Solar_declination": Solar_declination,
+        "Apparent_Radius": Apparent_Radius,
+        "Meridian": Meridian,
+        # Length of day is the planet rotation rate expressed as a fraction of a 24 hr day.
+        "LengthOfDay": 3600*rotation_speed/86400,
+        # Angular Rotation Rate is simply the Planet Rotation Rate converted from Hours into degrees per minute.
+        "AngularRotationRate": 6/rotation_speed if rotation_speed != 0 else 0,
+        "RotationCorrection": Container["Rotation Adjust"],
+        "Body_Radius": Container["Body Radius"]
+    }
+
+
+def divide_or(a, b, default : float):
+    """a / b, default where b is 0"""
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return np.divide(a, b, out=np.full(np.broadcast_shapes(a.shape, b.shape), default), where=b != 0)
+
+
+def get_star_constants(Container, Star):
+    """star_constants of a container, computed on the first call only"""
+    key = (Container["Name"], Star["Name"])
+    Constants = Star_constants_cache.get(key)
+    if Constants is None:
+        Constants = star_constants(Container, Star)
+        Star_constants_cache[key] = Constants
+    return Constants
+
+
+def clear_star_constants(container_names = None):
+    """Forgets the cached constants (of some containers only if given), when the database changes"""
+    if container_names is None:
+        Star_constants_cache.clear()
+        return
+    for key in [key for key in Star_constants_cache if key[0] in container_names]:
+        del Star_constants_cache[key]
+
+
+def current_rotation(Constants : dict, Time_passed):
+    """How far the container has rotated in its current day/night cycle, in degrees remaining before the next cycle"""
+    # A Julian Date is simply the number of days and fraction of a day since a specific event. (01/01/2020 00:00:00)
+    JulianDate = np.asarray(Time_passed, dtype=np.float64)/(24*60*60)
+
+    # Number of day/night cycles since Jan 1, 2020, only the fractional part is interesting
+    CurrentCycle = divide_or(JulianDate, Constants["LengthOfDay"], 1.0)
+
+    # The rotation correction accounts for the rotation of the planet on Jan 1, 2020, it is measured in-game
+    return (360-(CurrentCycle%1)*360-Constants["RotationCorrection"])%360
+
+
+def hour_angles(Latitude, Longitude, Height, Constants : dict, Time_passed):
+    """Returns the (HourAngle, RiseSetHourAngle) arrays of positions on the container, NaN where the star never rises or sets"""
+    Latitude = np.asarray(Latitude, dtype=np.float64)
+    Longitude = np.asarray(Longitude, dtype=np.float64)
+    Height = np.asarray(Height, dtype=np.float64)
+    Radius = Constants["Body_Radius"]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Determine correction for location height
+        ElevationCorrection = np.where(Height < 0, 0.0, np.degrees(np.arccos(Radius/(Radius + np.maximum(Height, 0)))))
+
+        # The star rises at + (positive value) rise/set hour angle and sets at - (negative value) rise/set hour angle
+        RiseSetHourAngle = np.degrees(np.arccos(-np.tan(np.radians(Latitude))*np.tan(np.radians(Constants["Solar_declination"])))) + Constants["Apparent_Radius"] + ElevationCorrection
+
+    # Current Hour Angle of the star, between -180 and 180
+    HourAngle = (current_rotation(Constants, Time_passed)-(Longitude%360-Constants["Meridian"])%360)%360
+    HourAngle = np.where(HourAngle > 180, HourAngle - 360, HourAngle)
+
+    return HourAngle, RiseSetHourAngle
+
+
+def minutes_until(HourAngle, Event_HourAngle, AngularRotationRate, LengthOfDay):
+    """Minutes until the star reaches a given hour angle (0 on containers that do not rotate)"""
+    Minutes = divide_or(HourAngle - Event_HourAngle, AngularRotationRate, 0.0)
+    return np.where((HourAngle <= Event_HourAngle) & (np.asarray(AngularRotationRate) != 0), Minutes + LengthOfDay*24*60, Minutes)
+
+
+def states_of_the_day(HourAngle, RiseSetHourAngle):
+    """Index in States_of_the_day of hour angles, Unknown where the star never rises or sets"""
+    # Hour Angles between 180 and the +Rise Hour Angle are before sunrise.
+    # Between +Rise Hour angle and 0 are after sunrise before noon. 0 noon,
+    # between 0 and -Set Hour Angle is afternoon,
+    # between -Set Hour Angle and -180 is after sunset.
+    with np.errstate(invalid="ignore"):
+        conditions = [
+            (180 >= HourAngle) & (HourAngle > RiseSetHourAngle+12),
+            (RiseSetHourAngle+12 >= HourAngle) & (HourAngle > RiseSetHourAngle),
+            (RiseSetHourAngle >= HourAngle) & (HourAngle > 0),
+            (0 >= HourAngle) & (HourAngle > -1*RiseSetHourAngle),
+            (-1*RiseSetHourAngle >= HourAngle) & (HourAngle > -1*RiseSetHourAngle-12),
+            (-1*RiseSetHourAngle-12 >= HourAngle) & (HourAngle >= -180),
+        ]
+    return np.select(conditions, range(len(conditions)), default=Unknown_state)
+
+
+def day_states(Latitude, Longitude, Height, Constants : dict, Time_passed):
+    """Returns (state, next_event, next_event_time) arrays : indices in States_of_the_day and Events, and minutes"""
+    HourAngle, RiseSetHourAngle = hour_angles(Latitude, Longitude, Height, Constants, Time_passed)
+    HourAngle, RiseSetHourAngle = np.broadcast_arrays(HourAngle, RiseSetHourAngle)
+
+    sunrise = minutes_until(HourAngle, RiseSetHourAngle, Constants["AngularRotationRate"], Constants["LengthOfDay"])
+    sunset = minutes_until(HourAngle, -1*RiseSetHourAngle, Constants["AngularRotationRate"], Constants["LengthOfDay"])
+
+    state = states_of_the_day(HourAngle, RiseSetHourAngle)
+
+    # Sunset is next in the morning and the afternoon, sunrise otherwise
+    is_day = (state == 2) | (state == 3)
+    next_event = np.where(is_day, 1, 0)
+    next_event_time = np.where(is_day, sunset, sunrise)
+
+    next_event = np.where(np.asarray(Constants["AngularRotationRate"]) == 0, 2, next_event)
+    unknown = state == Unknown_state
+    next_event = np.where(unknown, 3, next_event)
+    next_event_time = np.where(unknown, 0.0, next_event_time)
+
+    return state, next_event, next_event_time
+
+
+def day_state_grid(Constants : dict, Time_passed : float, Latitudes, Longitudes, Height : float = 0):
+    """Returns the (len(Latitudes), len(Longitudes)) grids of the hour angle and of the state of the day (index in States_of_the_day)"""
+    Latitudes = np.asarray(Latitudes, dtype=np.float64)[:, None]
+    Longitudes = np.asarray(Longitudes, dtype=np.float64)[None, :]
+    HourAngle, RiseSetHourAngle = hour_angles(Latitudes, Longitudes, Height, Constants, Time_passed)
+    HourAngle, RiseSetHourAngle = np.broadcast_arrays(HourAngle, RiseSetHourAngle)
+
+    return HourAngle, states_of_the_day(HourAngle, RiseSetHourAngle)
+
+
+#---------------------------------------------------------Forecasts---------------------------------------------------------------
+
+Forecast_events = ["Sunrise", "Noon", "Sunset", "Midnight"]
+
+
+def stack_constants(Constants_list : list, counts : list):
+    """Merges the star_constants of several containers into arrays with one value per position (counts[i] positions for Constants_list[i])"""
+    keys = ["Solar_declination", "Apparent_Radius", "Meridian", "LengthOfDay", "AngularRotationRate", "RotationCorrection", "Body_Radius"]
+    return {key: np.repeat([Constants[key] for Constants in Constants_list], counts) for key in keys}
+
+
+def next_events(Latitude, Longitude, Height, Constants : dict, Time_passed, count : int = 1):
+    """Returns {event: (..., count) array} of the next times (in seconds since the reference) the star reaches the sunrise,
+    noon, sunset and midnight hour angles, NaN when it never does (polar day or night, container that does not rotate)"""
+    HourAngle, RiseSetHourAngle = hour_angles(Latitude, Longitude, Height, Constants, Time_passed)
+    AngularRotationRate = np.asarray(Constants["AngularRotationRate"], dtype=np.float64)
+    LengthOfDay = np.asarray(Constants["LengthOfDay"], dtype=np.float64)
+    Time_passed = np.asarray(Time_passed, dtype=np.float64)
+
+    # The hour angle decreases with time : sunrise at +RiseSetHourAngle, noon at 0, sunset at -RiseSetHourAngle, midnight at +-180
+    Event_hour_angles = {"Sunrise": RiseSetHourAngle, "Noon": 0.0, "Sunset": -1*RiseSetHourAngle, "Midnight": 180.0}
+    Occurrences = np.arange(count)
+
+    Forecast = {}
+    for event in Forecast_events:
+        First = Time_passed + minutes_until(HourAngle, Event_hour_angles[event], AngularRotationRate, LengthOfDay)*60
+        First = np.where(AngularRotationRate != 0, First, np.nan)
+        # The same event comes back every day of the container
+        Forecast[event] = First[..., None] + (LengthOfDay*24*60*60)[..., None]*Occurrences
+    return Forecast
+
+
+def daylight_between(Latitude, Longitude, Height, Constants : dict, Time_start, Time_end, whole_interval : bool = True):
+    """Which positions have the star up (Morning or Afternoon) for the whole [Time_start, Time_end] interval,
+    or at some point of it if whole_interval is False"""
+    HourAngle, RiseSetHourAngle = hour_angles(Latitude, Longitude, Height, Constants, Time_start)
+    AngularRotationRate = np.asarray(Constants["AngularRotationRate"], dtype=np.float64)
+    Duration = (np.asarray(Time_end, dtype=np.float64) - Time_start)/60
+
+    # Positions where the star never sets or never rises
+    Cosine = -np.tan(np.radians(Latitude))*np.tan(np.radians(Constants["Solar_declination"]))
+    with np.errstate(invalid="ignore"):
+        Polar_day = (Cosine < -1) | (RiseSetHourAngle >= 180)
+        Polar_night = Cosine > 1
+        Daylight = (RiseSetHourAngle >= HourAngle) & (HourAngle > -1*RiseSetHourAngle)
+
+    if whole_interval:
+        Until_sunset = minutes_until(HourAngle, -1*RiseSetHourAngle, AngularRotationRate, Constants["LengthOfDay"])
+        with np.errstate(invalid="ignore"):
+            Result = Daylight & ((AngularRotationRate == 0) | (Until_sunset >= Duration))
+    else :
+        Until_sunrise = minutes_until(HourAngle, RiseSetHourAngle, AngularRotationRate, Constants["LengthOfDay"])
+        with np.errstate(invalid="ignore"):
+            Result = Daylight | ((AngularRotationRate != 0) & (Until_sunrise <= Duration))
+
+    return (Result | Polar_day) & ~Polar_night
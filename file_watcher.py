@@ -0,0 +1,64 @@
+import os
+import sys
+import threading
+import time
+
+
+
+class FileWatcher:
+    """Polls the modification time and size of files, calls on_change with the changed ones from a background thread"""
+
+    def __init__(self, paths : list, interval : float = 2.0):
+        self.paths = list(paths)
+        self.interval = interval
+        self.signatures = {path: self.signature(path) for path in self.paths}
+        # Paths whose last reload failed once
+        self.failed = set()
+        self.running = False
+
+    @staticmethod
+    def signature(path : str):
+        """(modification time, size) of a file, None if it does not exist"""
+        try :
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self):
+        """Returns the paths modified, created or deleted since the last poll"""
+        changed = []
+        for path in self.paths:
+            signature = self.signature(path)
+            if signature != self.signatures[path]:
+                self.signatures[path] = signature
+                changed.append(path)
+        return changed
+
+    def watch(self, on_change):
+        while self.running:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                try :
+                    on_change(changed)
+                except Exception as e:
+                    retry = [path for path in changed if path not in self.failed]
+                    if retry:
+                        # Most likely caught in the middle of its save : read again at the next poll
+                        self.failed.update(retry)
+                        for path in retry:
+                            self.signatures[path] = None
+                    else :
+                        print(f"Error: Could not reload {', '.join(changed)} : {e}")
+                        sys.stdout.flush()
+                        self.failed.difference_update(changed)
+                else :
+                    self.failed.difference_update(changed)
+
+    def start(self, on_change):
+        self.running = True
+        threading.Thread(target=self.watch, args=(on_change,), daemon=True).start()
+
+    def stop(self):
+        self.running = False
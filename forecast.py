@@ -0,0 +1,121 @@
+"""Sunrise/sunset forecasts of every POI of a container, or of the whole database, in one vectorized pass.
+
+Usage :
+    python forecast.py --container Daymar --events 3
+    python forecast.py --all --time 2026-10-18T12:00
+    python forecast.py --all --daylight_from 2026-10-18T12:00 --daylight_to 2026-10-18T14:00
+
+The forecast lists the next sunrise, noon, sunset and midnight times (UTC) of every POI, empty when they never
+happen (polar day or night, container that does not rotate).
+With --daylight_from/--daylight_to only the POIs that have the star up during the whole interval are listed,
+or at some point of it with --any.
+Times are unix seconds or ISO dates (UTC).
+"""
+import argparse
+import csv
+import datetime
+import sys
+import time
+
+import numpy as np
+
+import day_night
+import navigation_math
+from database_snapshot import load_database
+
+
+Reference_time = (datetime.datetime(2020, 1, 1) - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+
+def parse_time(text : str):
+    """Unix seconds or ISO date in UTC -> unix seconds"""
+    try :
+        return float(text)
+    except ValueError:
+        date = datetime.datetime.fromisoformat(text)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        return date.timestamp()
+
+
+def readable_time(unix_time : float):
+    if np.isnan(unix_time):
+        return ""
+    return datetime.datetime.fromtimestamp(unix_time, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def load_pois(Database, container_names : list):
+    """Returns the container names, POI names, latitudes, longitudes, heights and stacked star constants of the POIs of the containers"""
+    snapshot = Database.snapshot
+    pois = snapshot.array("pois")
+    columns = [snapshot.column("pois", axis) for axis in ["X", "Y", "Z"]]
+    Star = Database["Containers"]["Stanton"]
+
+    Containers, Names, Local, Radii, Constants_list, counts = [], [], [], [], [], []
+    for container_name in container_names:
+        start, end = snapshot.container_poi_rows(container_name)
+        if start == end or container_name == Star["Name"]:
+            continue
+        Container = Database["Containers"][container_name]
+        Containers += [container_name] * (end - start)
+        Names += snapshot.poi_names[start:end]
+        Local.append(pois[start:end][:, columns])
+        Radii.append(np.full(end - start, Container["Body Radius"]))
+        Constants_list.append(day_night.get_star_constants(Container, Star))
+        counts.append(end - start)
+
+    if not counts:
+        return [], [], np.empty(0), np.empty(0), np.empty(0), day_night.stack_constants([], [])
+
+    Latitude, Longitude, Height = navigation_math.lat_long_height(np.concatenate(Local), np.concatenate(Radii))
+    return Containers, Names, Latitude, Longitude, Height, day_night.stack_constants(Constants_list, counts)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sunrise, noon, sunset and midnight forecasts of the POIs")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--container", type=str, action="append", help="Container of the POIs (can be repeated)")
+    selection.add_argument("--all", action="store_true", help="Every POI of the database")
+    parser.add_argument("--events", type=int, default=1, help="Number of forecasted days")
+    parser.add_argument("--time", type=parse_time, help="Start of the forecast (now by default)")
+    parser.add_argument("--daylight_from", type=parse_time, help="Lists the POIs in daylight from this time ...")
+    parser.add_argument("--daylight_to", type=parse_time, help="... to this time")
+    parser.add_argument("--any", action="store_true", help="Daylight at some point of the interval instead of all of it")
+    parser.add_argument("-o", "--output", type=str, help="Output CSV file (stdout by default)")
+    args = parser.parse_args()
+
+    if (args.daylight_from is None) != (args.daylight_to is None):
+        parser.error("--daylight_from and --daylight_to go together")
+
+    Database = load_database('Database.json')
+    container_names = Database.snapshot.container_names if args.all else args.container
+    for container_name in container_names:
+        if container_name not in Database["Containers"]:
+            parser.error(f"Unknown container {container_name}")
+
+    Containers, Names, Latitude, Longitude, Height, Constants = load_pois(Database, container_names)
+
+    output = open(args.output, "w", newline='') if args.output else sys.stdout
+    writer = csv.writer(output)
+
+    if args.daylight_from is not None:
+        Daylight = day_night.daylight_between(Latitude, Longitude, Height, Constants, args.daylight_from - Reference_time, args.daylight_to - Reference_time, whole_interval=not args.any)
+        writer.writerow(["Container", "POI"])
+        writer.writerows([(Containers[i], Names[i]) for i in np.flatnonzero(Daylight)])
+    else :
+        Time = time.time() if args.time is None else args.time
+        Forecast = day_night.next_events(Latitude, Longitude, Height, Constants, Time - Reference_time, args.events)
+        writer.writerow(["Container", "POI"] + [f"{event}_{day + 1}" for day in range(args.events) for event in day_night.Forecast_events])
+        # Events of one day next to each other, then the next day
+        Times = np.stack([Forecast[event] for event in day_night.Forecast_events], axis=-1).reshape(len(Names), -1) + Reference_time
+        for i, row_times in enumerate(Times.tolist()):
+            writer.writerow([Containers[i], Names[i]] + [readable_time(unix_time) for unix_time in row_times])
+
+    if args.output:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,5 +7,6 @@ pip install pyperclip
 pip install tk
 pip install requests
 pip install ntplib
+pip install numpy
 ECHO Library installed!!
 PAUSE
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""Background writer of Logs/Logs.csv.
+
+The navigation loop only puts rows in a bounded queue. A thread writes them in batches, flushes them to the
+file after a number of rows or a delay, fsyncs it regularly so a crash loses at most a few seconds of logs,
+and rotates the file when it gets too big : Logs.csv -> Logs.1.csv -> Logs.2.csv ...
+A batch that cannot be written (permissions, full disk ...) is dropped and reported once, the file is opened again
+for the next one : the thread keeps running.
+"""
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+
+
+Log_fields = ['Key', 'System' ,'Global_X', 'Global_Y', 'Global_Z', 'Container', 'Local_X', 'Local_Y', 'Local_Z', 'Longitude', 'Latitude', 'Height', 'Time', 'Readable_Time', 'Player', 'Comment']
+
+
+
+class LogWriter(threading.Thread):
+    """Thread appending the rows it is given to a CSV file"""
+
+    def __init__(self, path : str = "Logs/Logs.csv", fields : list = Log_fields, max_queued_rows : int = 10000, batch_size : int = 64, flush_interval : float = 1.0, fsync_interval : float = 10.0, max_bytes : int = 50*1024*1024, backup_count : int = 5):
+        super().__init__(daemon=True)
+        self.path = path
+        self.fields = fields
+        self.rows = queue.Queue(maxsize=max_queued_rows)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped_rows = 0
+        self.file = None
+        self.writer = None
+        # Set from the first error until a batch is written again, so a lasting error is only reported once
+        self.failing = False
+
+    def write(self, row : list):
+        """Queues a row, never blocks the caller : the row is dropped (and counted) if the writer is too far behind"""
+        try :
+            self.rows.put_nowait(row)
+        except queue.Full:
+            self.dropped_rows += 1
+
+    def new_run(self):
+        self.write(['New_Run'])
+
+    def close(self, timeout : float = 5):
+        """Writes the queued rows and stops the thread"""
+        self.rows.put(None)
+        self.join(timeout)
+
+    def open_file(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        new_file = not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(self.fields)
+            # The readers of the file (Map.py) need the header before the first rows
+            self.file.flush()
+
+    def rotate(self):
+        """Renames Logs.csv to Logs.1.csv (and the older ones to .2, .3 ...) and starts a new Logs.csv"""
+        self.sync()
+        self.file.close()
+        base, extension = os.path.splitext(self.path)
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.isfile(f"{base}.{i}{extension}"):
+                os.replace(f"{base}.{i}{extension}", f"{base}.{i+1}{extension}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{base}.1{extension}")
+        else :
+            os.remove(self.path)
+        self.open_file()
+
+    def write_batch(self, batch : list):
+        self.writer.writerows(batch)
+
+    def flush(self):
+        self.file.flush()
+
+    def sync(self):
+        self.flush()
+        os.fsync(self.file.fileno())
+
+    def close_file(self):
+        """Closes the file after an error, whatever state it is in"""
+        try :
+            if self.file is not None:
+                self.file.close()
+        except OSError:
+            pass
+        self.file = None
+        self.writer = None
+
+    def report(self, err : Exception):
+        if not self.failing:
+            # The standard output of the backend is read by the frontends, like its other errors
+            print(f"Error: Could not write the logs in {self.path} : {err}")
+            sys.stdout.flush()
+        self.failing = True
+
+    def run(self):
+        pending_rows = 0
+        last_flush = last_sync = time.monotonic()
+        running = True
+
+        while running:
+            # Without pending rows there is nothing to flush, wait for the next one
+            timeout = max(0, last_flush + self.flush_interval - time.monotonic()) if pending_rows else None
+            try :
+                batch = [self.rows.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+
+            # Everything already queued goes in the same batch
+            while len(batch) < self.batch_size:
+                try :
+                    batch.append(self.rows.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+
+            if not batch and not pending_rows:
+                continue
+
+            written = False
+            try :
+                if self.file is None:
+                    self.open_file()
+                self.write_batch(batch)
+                written = True
+                pending_rows += len(batch)
+
+                now = time.monotonic()
+                if pending_rows and (pending_rows >= self.batch_size or now - last_flush >= self.flush_interval or not running):
+                    self.flush()
+                    pending_rows = 0
+                    last_flush = now
+                    if now - last_sync >= self.fsync_interval or not running:
+                        os.fsync(self.file.fileno())
+                        last_sync = now
+                    if self.max_bytes and self.file.tell() >= self.max_bytes:
+                        self.rotate()
+                self.failing = False
+            except (OSError, csv.Error) as err:
+                # The rows already given to the file are written when it is closed, the others are lost
+                if not written:
+                    self.dropped_rows += len(batch)
+                pending_rows = 0
+                self.report(err)
+                self.close_file()
+
+        if self.file is not None:
+            try :
+                self.sync()
+            except OSError as err:
+                self.report(err)
+            self.close_file()
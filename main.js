@@ -2,6 +2,49 @@ const electron = require('electron')
 const app = electron.app
 const BrowserWindow = electron.BrowserWindow
 
+const fs = require('fs')
+const path = require('path')
+let { PythonShell } = require('python-shell')
+
+
+// A single backend process shared by every page, the pages talk to it through pages/backend_client.js
+let backend = null
+let quitting = false
+
+// The backend is started again if it stops, unless it keeps stopping right after its start
+const max_restarts = 5
+const restart_window = 60 * 1000
+let restart_times = []
+
+function startBackend() {
+  var settings_json = JSON.parse(fs.readFileSync(path.join(process.cwd(), 'settings.json')))
+
+  backend = new PythonShell('backend.py', {
+      mode: 'text',
+      args: ['daemon', '--port', String(settings_json.backend_port || 48600)]
+  })
+
+  backend.on('message', (message) => console.log(message))
+  backend.on('stderr', (stderr) => console.log(stderr))
+  backend.on('error', (err) => console.log(err))
+  backend.on('close', () => {
+      backend = null
+      if (quitting) {
+          return
+      }
+      var now = Date.now()
+      restart_times = restart_times.filter((time) => now - time < restart_window)
+      if (restart_times.length >= max_restarts) {
+          console.log('The backend stopped ' + max_restarts + ' times in a minute, it is not started again')
+          electron.dialog.showErrorBox('Navitool', 'The backend stopped and could not be started again.\nPlease report the issue to Valalol#1790 on Discord')
+          return
+      }
+      restart_times.push(now)
+      console.log('The backend stopped, starting it again')
+      startBackend()
+  })
+}
+
 
 function createWindow() {
   window = new BrowserWindow({
@@ -26,7 +69,10 @@ function createWindow() {
   })
 }
 
-app.on('ready', createWindow)
+app.on('ready', () => {
+  startBackend()
+  createWindow()
+})
 
 app.on('window-all-closed', () => {
   if (process.platform !== 'darwin') {
@@ -34,6 +80,13 @@ app.on('window-all-closed', () => {
   }
 })
 
+app.on('will-quit', () => {
+  quitting = true
+  if (backend !== null) {
+      backend.kill()
+  }
+})
+
 app.on('activated', () => {
   if (window === null) {
       createWindow()
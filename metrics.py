@@ -0,0 +1,146 @@
+"""Optional timing of the stages of the backend : NTP, clipboard, closest POI, sunrise/sunset, frontend output, Logs.csv ...
+
+Disabled, nothing is timed and the code of the stages is left as it is. Enabled, the functions of the timed stages
+are replaced by wrappers recording their durations in one histogram per stage. The histograms are read with
+`snapshot()` (sent as a `Stats : {...}` line by the backend) or as text on a local HTTP endpoint :
+    http://127.0.0.1:<metrics_port>/        table of the stages
+    http://127.0.0.1:<metrics_port>/json    same as the `Stats :` line
+"""
+import json
+import math
+import threading
+import time
+
+
+# Bucket i holds the durations up to 2**i us, the last one everything longer (2**26 us is about a minute)
+Bucket_count = 28
+
+
+
+class Histogram:
+    """Durations of a stage in power of 2 buckets of microseconds"""
+
+    def __init__(self):
+        self.buckets = [0] * Bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds : float):
+        microseconds = seconds * 1e6
+        # frexp gives the exponent of the next power of 2, without a log
+        bucket = math.frexp(microseconds)[1] if microseconds > 1 else 0
+        self.buckets[min(bucket, Bucket_count - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction : float):
+        """Estimate in us of a percentile, interpolated inside its bucket"""
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                low = 2.0 ** (bucket - 1) if bucket > 0 else 0.0
+                return min(low + (2.0 ** bucket - low) * (rank - seen) / count, self.max * 1e6)
+            seen += count
+        return self.max * 1e6
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "p50_us": self.percentile(0.5),
+            "p99_us": self.percentile(0.99),
+            "max_us": self.max * 1e6,
+            "buckets": {f"le_{2**bucket}us": count for bucket, count in enumerate(self.buckets) if count}
+        }
+
+
+
+class StageMetrics:
+    """Histograms of the timed stages"""
+
+    def __init__(self, clock = time.perf_counter):
+        self.clock = clock
+        self.enabled = False
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.server = None
+
+    def record(self, stage : str, seconds : float):
+        # The stages run in several threads (sources, NTP, Logs.csv writer, frontend senders)
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.record(seconds)
+
+    def timed(self, function, stage : str):
+        """Wrapper of a function recording its durations, exceptions included"""
+        clock = self.clock
+        record = self.record
+
+        def timed_function(*args, **kwargs):
+            start = clock()
+            try :
+                return function(*args, **kwargs)
+            finally:
+                record(stage, clock() - start)
+
+        timed_function.__wrapped__ = function
+        timed_function.__name__ = getattr(function, "__name__", stage)
+        return timed_function
+
+    def instrument(self, owner, attribute : str, stage : str):
+        """Replaces a function of a module, a class or a dict by its timed wrapper"""
+        self.enabled = True
+        if isinstance(owner, dict):
+            owner[attribute] = self.timed(owner[attribute], stage)
+        else :
+            setattr(owner, attribute, self.timed(getattr(owner, attribute), stage))
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        """{"enabled": .., "since": unix time of the start or last reset, "stages": {stage: summary}}"""
+        with self.lock:
+            return {"enabled": self.enabled, "since": self.started, "stages": {stage: histogram.summary() for stage, histogram in sorted(self.histograms.items())}}
+
+    def text(self):
+        lines = [f"{'stage':<28} {'count':>9} {'mean us':>10} {'p50 us':>10} {'p99 us':>10} {'max us':>10}"]
+        for stage, summary in self.snapshot()["stages"].items():
+            lines.append(f"{stage:<28} {summary['count']:>9} {summary['mean_us']:>10.1f} {summary['p50_us']:>10.1f} {summary['p99_us']:>10.1f} {summary['max_us']:>10.1f}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port : int, host : str = "127.0.0.1"):
+        """Serves the histograms on a local HTTP endpoint from a background thread, returns the port"""
+        # Only imported when the endpoint is started, it weighs more than the rest of this module
+        import http.server
+        Metrics = self
+
+        class Stats_handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") == "/json":
+                    body, content_type = json.dumps(Metrics.snapshot()), "application/json"
+                else :
+                    body, content_type = Metrics.text(), "text/plain; charset=utf-8"
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # The standard output of the backend is read by the frontends
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Stats_handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
@@ -0,0 +1,185 @@
+"""Vectorized navigation math : the same formulas as the functions of navigation_scalar.py, on arrays of vectors.
+
+Every function takes array-likes whose last axis is (X, Y, Z) : a single (3,) vector or a (N, 3) array of them,
+and returns NumPy values of the matching shape. navigation_scalar.py computes the same formulas with math for the
+single position of an update (used by backend.py), tests/test_navigation_math.py checks that both agree.
+Angles are in degrees, distances in km and times in seconds since the 2020-01-01 reference, like in backend.py.
+"""
+import numpy as np
+
+
+
+def as_vectors(Vectors):
+    return np.asarray(Vectors, dtype=np.float64)
+
+
+def vector_norm(Vectors):
+    """Norm of vectors"""
+    Vectors = as_vectors(Vectors)
+    return np.sqrt(vector_product(Vectors, Vectors))
+
+
+def vector_product(a, b):
+    """Dot product of vectors"""
+    a, b = as_vectors(a), as_vectors(b)
+    return a[..., 0]*b[..., 0] + a[..., 1]*b[..., 1] + a[..., 2]*b[..., 2]
+
+
+def angle_between_vectors(a, b):
+    """Angle in degrees between vectors, 0 when one of them is null"""
+    Norms = vector_norm(a) * vector_norm(b)
+    # Null vectors keep a cosine of 1, so an angle of 0
+    Cosine = np.divide(vector_product(a, b), Norms, out=np.ones_like(Norms), where=Norms != 0)
+    # Rounding errors can put the cosine of (anti)parallel vectors slightly outside of [-1, 1]
+    return np.degrees(np.arccos(np.minimum(np.maximum(Cosine, -1.0), 1.0)))
+
+
+def rotation_speed_degrees_per_second(Rotation_speed):
+    """Converts the "Rotation Speed" of containers (hours per rotation) to degrees per second (0 if it does not rotate)"""
+    Rotation_speed = np.asarray(Rotation_speed, dtype=np.float64)
+    Inverse = np.divide(1, Rotation_speed, out=np.zeros_like(Rotation_speed), where=Rotation_speed != 0)
+    return 0.1 * Inverse
+
+
+def rotation_state_degrees(Time_passed, Rotation_speed, Rotation_adjust):
+    """Rotation of containers in degrees at the given times"""
+    return (rotation_speed_degrees_per_second(Rotation_speed) * Time_passed + Rotation_adjust) % 360
+
+
+def rotate_z(Points, Angle):
+    """Rotates points around the Z axis by angles in radians (same as rotate_point_2D)"""
+    Points = as_vectors(Points)
+    cos_angle = np.cos(Angle)
+    sin_angle = np.sin(Angle)
+    X, Y = Points[..., 0], Points[..., 1]
+    Rotated = np.empty(np.broadcast_shapes(Points.shape, np.shape(Angle) + (3,)))
+    Rotated[..., 0] = X * cos_angle - Y * sin_angle
+    Rotated[..., 1] = X * sin_angle + Y * cos_angle
+    Rotated[..., 2] = Points[..., 2]
+    return Rotated
+
+
+def global_to_local(Positions, Centres, Rotation_state):
+    """Global positions -> local rotated coordinates of containers (same as get_local_rotated_coordinates)"""
+    Unrotated = as_vectors(Positions) - as_vectors(Centres)
+    return rotate_z(Unrotated, np.radians(-1 * np.asarray(Rotation_state, dtype=np.float64)))
+
+
+def local_to_global(Local, Centres, Rotation_state):
+    """Local rotated coordinates of containers -> global positions (inverse of global_to_local)"""
+    Rotated = rotate_z(Local, np.radians(np.asarray(Rotation_state, dtype=np.float64)))
+    return Rotated + as_vectors(Centres)
+
+
+def lat_long_height(Local, Body_radius):
+    """Local rotated coordinates -> (Latitude, Longitude, Height) (same as get_lat_long_height)"""
+    Local = as_vectors(Local)
+    Radial_Distance = vector_norm(Local)
+    Height = Radial_Distance - Body_radius
+    # The latitude of the centre of the container is 0
+    Sine = np.divide(Local[..., 2], Radial_Distance, out=np.zeros_like(Radial_Distance), where=Radial_Distance > 0)
+    Latitude = np.degrees(np.arcsin(Sine))
+    Longitude = -1 * np.degrees(np.arctan2(Local[..., 0], Local[..., 1]))
+    return Latitude, Longitude, Height
+
+
+def lat_long_height_to_local(Latitude, Longitude, Height, Body_radius):
+    """(Latitude, Longitude, Height) -> local rotated coordinates (inverse of lat_long_height)"""
+    Latitude, Longitude = np.radians(Latitude), np.radians(Longitude)
+    Radial_Distance = np.asarray(Body_radius, dtype=np.float64) + Height
+    Latitude, Longitude, Radial_Distance = np.broadcast_arrays(Latitude, Longitude, Radial_Distance)
+    Local = np.empty(Latitude.shape + (3,))
+    Local[..., 0] = -1 * Radial_Distance * np.cos(Latitude) * np.sin(Longitude)
+    Local[..., 1] = Radial_Distance * np.cos(Latitude) * np.cos(Longitude)
+    Local[..., 2] = Radial_Distance * np.sin(Latitude)
+    return Local
+
+
+def great_circle_distances(a, b, Body_radius):
+    """(len(a), len(b)) distances on the surface between the directions of two sets of local positions"""
+    a, b = as_vectors(a).reshape(-1, 3), as_vectors(b).reshape(-1, 3)
+    Norms_a, Norms_b = vector_norm(a), vector_norm(b)
+    Cosines = (a @ b.T) / np.outer(np.where(Norms_a > 0, Norms_a, 1.0), np.where(Norms_b > 0, Norms_b, 1.0))
+    # sin from cos loses little here : two POIs 10 m apart on a moon still get 7 significant digits
+    Sines = np.sqrt(np.maximum(1 - Cosines * Cosines, 0))
+    return np.arctan2(Sines, Cosines) * Body_radius
+
+
+# Two least-squares positions this far apart (km) whose residuals differ by less than Ambiguity_residual (km) are
+# both solutions : the data cannot tell them apart
+Ambiguity_distance = 0.1
+Ambiguity_residual = 0.001
+
+
+def least_squares_errors(Positions, Centres, Distances, Radial_distance):
+    """(..., 4) errors of positions : distances to the 3 centres, then distance to the origin"""
+    return np.concatenate([vector_norm(Positions[..., None, :] - Centres) - Distances, (vector_norm(Positions) - Radial_distance)[..., None]], axis=-1)
+
+
+def refine_positions(Positions, Centres, Distances, Radial_distance, iterations : int):
+    """Gauss-Newton steps of positions on the squares of their least_squares_errors"""
+    for iteration in range(iterations):
+        Delta = Positions[..., None, :] - Centres
+        Rows = np.concatenate([Delta / vector_norm(Delta)[..., None], (Positions / vector_norm(Positions)[..., None])[..., None, :]], axis=-2)
+        Errors = least_squares_errors(Positions, Centres, Distances, Radial_distance)
+        Rows_T = np.swapaxes(Rows, -1, -2)
+        # The small damping keeps the normal equations solvable when a row is null
+        Steps = np.linalg.solve(Rows_T @ Rows + 1e-12 * np.eye(3), (Rows_T @ Errors[..., None]))[..., 0]
+        Positions = Positions - Steps
+    return Positions
+
+
+def trilaterate(Centres, Distances, Radial_distance, iterations : int = 8):
+    """Least-squares positions at given distances of 3 centres and at a given distance from the origin
+    Centres (..., 3, 3), Distances (..., 3), Radial_distance (...) : the two intersections of the spheres are refined on
+    the 4 constraints and the one that fits best is kept. Returns the positions, the RMS of their 4 errors (km) and
+    whether they are ambiguous : the other one fits as well, as when the plane of the centres contains the origin
+    (two opposite OMs). Centres that are not 3 distinct points off a line give NaN, ambiguous."""
+    Centres, Distances = as_vectors(Centres), as_vectors(Distances)
+    Radial_distance = np.broadcast_to(as_vectors(Radial_distance), Distances.shape[:-1])
+    P1, P2, P3 = Centres[..., 0, :], Centres[..., 1, :], Centres[..., 2, :]
+    d1, d2, d3 = Distances[..., 0], Distances[..., 1], Distances[..., 2]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Frame of the 3 centres : P1 at the origin, P2 on ex, P3 in the (ex, ey) plane
+        d = vector_norm(P2 - P1)
+        ex = (P2 - P1) / d[..., None]
+        i = vector_product(ex, P3 - P1)
+        ey = P3 - P1 - i[..., None] * ex
+        j = vector_norm(ey)
+        ey = ey / j[..., None]
+        ez = np.cross(ex, ey)
+
+        x = (d1*d1 - d2*d2 + d*d) / (2*d)
+        y = (d1*d1 - d3*d3 + i*i + j*j) / (2*j) - i*x/j
+        z = np.sqrt(np.maximum(d1*d1 - x*x - y*y, 0))
+
+        In_plane = P1 + x[..., None] * ex + y[..., None] * ey
+        Degenerate = ~np.isfinite(In_plane).all(axis=-1) | (d == 0) | (j == 0)
+        # Spheres that do not meet give the same point twice : it is pushed off the plane on both sides
+        Offset = np.maximum(z, Ambiguity_distance)[..., None] * np.where(Degenerate[..., None], 0.0, ez)
+        In_plane = np.where(Degenerate[..., None], 1.0, In_plane)
+        Above = refine_positions(In_plane + Offset, Centres, Distances, Radial_distance, iterations)
+        Below = refine_positions(In_plane - Offset, Centres, Distances, Radial_distance, iterations)
+
+        Above_errors = least_squares_errors(Above, Centres, Distances, Radial_distance)
+        Below_errors = least_squares_errors(Below, Centres, Distances, Radial_distance)
+        Above_residuals = np.sqrt(np.mean(Above_errors * Above_errors, axis=-1))
+        Below_residuals = np.sqrt(np.mean(Below_errors * Below_errors, axis=-1))
+
+    Above_fits_better = Above_residuals <= Below_residuals
+    Positions = np.where(Above_fits_better[..., None], Above, Below)
+    Residuals = np.where(Above_fits_better, Above_residuals, Below_residuals)
+    Ambiguous = Degenerate | ((vector_norm(Above - Below) > Ambiguity_distance) & (np.abs(Above_residuals - Below_residuals) < Ambiguity_residual))
+    Positions = np.where(Degenerate[..., None], np.nan, Positions)
+    Residuals = np.where(Degenerate, np.nan, Residuals)
+    return Positions, Residuals, Ambiguous
+
+
+def bearing(Latitude, Longitude, Target_latitude, Target_longitude):
+    """Initial great-circle bearing in degrees (0 to 360) from positions to targets"""
+    Latitude, Target_latitude = np.radians(Latitude), np.radians(Target_latitude)
+    Delta_longitude = np.radians(Target_longitude) - np.radians(Longitude)
+    bearingX = np.cos(Target_latitude) * np.sin(Delta_longitude)
+    bearingY = np.cos(Latitude) * np.sin(Target_latitude) - np.sin(Latitude) * np.cos(Target_latitude) * np.cos(Delta_longitude)
+    return (np.degrees(np.arctan2(bearingX, bearingY)) + 360) % 360
@@ -0,0 +1,77 @@
+"""Scalar navigation math : the functions of navigation_math for a single position, on {"X", "Y", "Z"} dicts and floats.
+
+The backend computes one position per update : on a single vector numpy costs more than the computation itself
+(about 30 us per call against 1 us here) and importing it would delay the start of the backend. Every function
+mirrors the navigation_math function named in its docstring, formula for formula, and tests/test_navigation_math.py
+checks that both give the same results. Angles are in degrees, distances in km and times in seconds since the
+2020-01-01 reference.
+"""
+from math import sqrt, degrees, radians, cos, acos, sin, asin, atan2
+
+
+
+def xyz(a):
+    return (a["X"], a["Y"], a["Z"])
+
+def xyz_dict(Vector):
+    return {"X": float(Vector[0]), "Y": float(Vector[1]), "Z": float(Vector[2])}
+
+def vector_norm(a):
+    """Returns the norm of a vector (navigation_math.vector_norm)"""
+    return sqrt(a["X"]*a["X"] + a["Y"]*a["Y"] + a["Z"]*a["Z"])
+
+def vector_product(a, b):
+    """Returns the dot product of two vectors (navigation_math.vector_product)"""
+    return a["X"]*b["X"] + a["Y"]*b["Y"] + a["Z"]*b["Z"]
+
+def angle_between_vectors(a, b):
+    """Function that returns an angle in degrees between 2 vectors (navigation_math.angle_between_vectors)"""
+    Norms = vector_norm(a) * vector_norm(b)
+    # Null vectors keep a cosine of 1, so an angle of 0
+    Cosine = vector_product(a, b) / Norms if Norms != 0 else 1.0
+    return degrees(acos(min(max(Cosine, -1.0), 1.0)))
+
+
+def rotation_speed_degrees_per_second(Rotation_speed : float):
+    """Converts the "Rotation Speed" of a container (hours per rotation) to degrees per second (navigation_math.rotation_speed_degrees_per_second)"""
+    return 0.1 * (1/Rotation_speed) if Rotation_speed != 0 else 0
+
+def rotation_state_degrees(Time_passed : float, Rotation_speed : float, Rotation_adjust : float):
+    """Rotation of a container in degrees at a given time (navigation_math.rotation_state_degrees)"""
+    return (rotation_speed_degrees_per_second(Rotation_speed) * Time_passed + Rotation_adjust) % 360
+
+def rotate_point_2D(Unrotated_coordinates, angle):
+    """Rotates a point around the Z axis by an angle in radians (navigation_math.rotate_z)"""
+    cos_angle = cos(angle)
+    sin_angle = sin(angle)
+    return {
+        "X": Unrotated_coordinates["X"] * cos_angle - Unrotated_coordinates["Y"] * sin_angle,
+        "Y": Unrotated_coordinates["X"] * sin_angle + Unrotated_coordinates["Y"] * cos_angle,
+        "Z": Unrotated_coordinates["Z"]
+    }
+
+
+def get_local_rotated_coordinates(Time_passed : float, X : float, Y : float, Z : float, Actual_Container : dict):
+    """Global position -> local rotated coordinates of a container (navigation_math.global_to_local)"""
+    Rotation_state_in_degrees = rotation_state_degrees(Time_passed, Actual_Container["Rotation Speed"], Actual_Container["Rotation Adjust"])
+    Unrotated_coordinates = {"X": X - Actual_Container["X"], "Y": Y - Actual_Container["Y"], "Z": Z - Actual_Container["Z"]}
+    return rotate_point_2D(Unrotated_coordinates, radians(-1 * Rotation_state_in_degrees))
+
+
+def get_lat_long_height(X : float, Y : float, Z : float, Container : dict):
+    """Local rotated coordinates -> [Latitude, Longitude, Height] (navigation_math.lat_long_height)"""
+    Radial_Distance = sqrt(X*X + Y*Y + Z*Z)
+    Height = Radial_Distance - Container["Body Radius"]
+    # The latitude of the centre of the container is 0
+    Latitude = degrees(asin(Z/Radial_Distance)) if Radial_Distance > 0 else 0.0
+    Longitude = -1*degrees(atan2(X, Y))
+    return [Latitude, Longitude, Height]
+
+
+def get_bearing(Latitude : float, Longitude : float, Target_latitude : float, Target_longitude : float):
+    """Returns the initial great-circle bearing in degrees from a position to a target (navigation_math.bearing)"""
+    Latitude, Target_latitude = radians(Latitude), radians(Target_latitude)
+    Delta_longitude = radians(Target_longitude) - radians(Longitude)
+    bearingX = cos(Target_latitude) * sin(Delta_longitude)
+    bearingY = cos(Latitude) * sin(Target_latitude) - sin(Latitude) * cos(Target_latitude) * cos(Delta_longitude)
+    return (degrees(atan2(bearingX, bearingY)) + 360) % 360
@@ -0,0 +1,82 @@
+// Connection to the backend daemon started by main.js, shared by every page.
+// Each page sends its own commands (set_mode, set_target, subscribe) and receives its own stream of lines.
+// With {command: 'subscribe', protocol: 2} the updates are JSON lines holding only the raw values that changed
+// (see protocol.py) : they are merged here and on_update gets the complete data of every update.
+// If the daemon stops, main.js starts it again : the page reconnects and sends its commands again.
+
+const net = require('net')
+const fs = require('fs')
+
+
+function connect_backend(commands, on_message, on_error, on_update) {
+    var settings_json = JSON.parse(fs.readFileSync('settings.json'))
+    var port = settings_json.backend_port || 48600
+
+    var socket = new net.Socket()
+    var buffer = ''
+    var attempts = 0
+    var data = {}
+    var closing = false
+
+    socket.setEncoding('utf8')
+
+    socket.on('connect', function () {
+        attempts = 0
+        commands.forEach(function (command) {
+            socket.write(JSON.stringify(command) + '\n')
+        })
+    })
+
+    socket.on('data', function (chunk) {
+        buffer += chunk
+        var lines = buffer.split('\n')
+        buffer = lines.pop()
+        lines.forEach(function (line) {
+            if (line.startsWith('{')) {
+                var update = JSON.parse(line)
+                // Keyframes replace everything, the other updates only hold the fields that changed
+                data = update.key ? update.data : Object.assign(data, update.data)
+                on_update(data, update.data)
+            } else {
+                on_message(line)
+            }
+        })
+    })
+
+    socket.on('error', function (err) {
+        // The daemon may still be starting when the first page opens
+        if (err.code == 'ECONNREFUSED' && attempts < 40) {
+            attempts += 1
+            setTimeout(function () {
+                socket.connect(port, '127.0.0.1')
+            }, 250)
+        } else {
+            on_error(err)
+        }
+    })
+
+    socket.on('close', function (had_error) {
+        // A refused connection is already retried by the error handler
+        if (closing || had_error) {
+            return
+        }
+        on_message('Backend disconnected, reconnecting...')
+        buffer = ''
+        data = {}
+        setTimeout(function () {
+            socket.connect(port, '127.0.0.1')
+        }, 250)
+    })
+
+    socket.connect(port, '127.0.0.1')
+
+    window.addEventListener('beforeunload', function () {
+        closing = true
+        socket.destroy()
+    })
+
+    return socket
+}
+
+
+module.exports = { connect_backend }
@@ -1,62 +1,64 @@
 window.resizeTo(350,450)
 
-let { PythonShell } = require('python-shell')
+let { connect_backend } = require('../backend_client.js')
+let format = require('../formatting.js')
 
 
-var options = {
-    mode: 'text',
-    args: ["companion"]
-};
-
-let pyshell = new PythonShell('backend.py', options);
+var commands = [
+    { command: 'set_mode', mode: 'companion' },
+    { command: 'subscribe', protocol: 2 }
+];
 
 
 error_message = "Something Wrong Happened. \nPlease see the error below \nIf anything shows up please report the issue to Valalol#1790 on Discord"
 
-pyshell.on('stderr', function (stderr) {
-    console.log(stderr)
-    window.resizeTo(350, 850)
-
-    document.getElementById("companion_status_icon").src = '../../Images/red_dot.png';
-    document.getElementById("companion_status_message").innerText = error_message
-    document.getElementById("companion_error_message").innerText = err
-})
-
-pyshell.on('error', function (err) {
+function on_error(err) {
     console.log(err)
     window.resizeTo(350, 850)
 
     document.getElementById("companion_status_icon").src = '../../Images/red_dot.png';
     document.getElementById("companion_status_message").innerText = error_message
     document.getElementById("companion_error_message").innerText = err
-})
+}
+
 
 
+function on_update(data) {
+    var in_container = data["actual_container"] != "None"
+    // Outside of the containers the local fields are null and their lines are left empty
+    function local_text(text) {
+        return in_container ? text() : ""
+    }
 
-pyshell.on('message', (message) => {
+    document.getElementById("companion_updated").innerText = "Updated : " + format.clock_time(Date.now() / 1000)
+    document.getElementById("companion_player_X_global_coordinate").innerText = "Global X : " + format.round(data["player_global_x"], 3)
+    document.getElementById("companion_player_Y_global_coordinate").innerText = "Global Y : " + format.round(data["player_global_y"], 3)
+    document.getElementById("companion_player_Z_global_coordinate").innerText = "Global Z : " + format.round(data["player_global_z"], 3)
+    document.getElementById("distance_changed").innerText = "Distance since last update : " + format.km(data["distance_change"], 3)
+    document.getElementById("companion_player_container").innerText = in_container ? "Actual Container : " + data["actual_container"] : "None"
+    document.getElementById("companion_player_X_local_coordinate").innerText = local_text(() => "Local X : " + format.round(data["player_local_x"], 3))
+    document.getElementById("companion_player_Y_local_coordinate").innerText = local_text(() => "Local Y : " + format.round(data["player_local_y"], 3))
+    document.getElementById("companion_player_Z_local_coordinate").innerText = local_text(() => "Local Z : " + format.round(data["player_local_z"], 3))
+    document.getElementById("companion_player_longitude").innerText = local_text(() => "Longitude : " + format.degrees(data["player_long"], 2))
+    document.getElementById("companion_player_latitude").innerText = local_text(() => "Latitude : " + format.degrees(data["player_lat"], 2))
+    document.getElementById("companion_player_height").innerText = local_text(() => "Height : " + format.km(data["player_height"], 1))
+    document.getElementById("companion_OM1").innerText = local_text(() => format.named_distance(data, "player_OM1"))
+    document.getElementById("companion_OM2").innerText = local_text(() => format.named_distance(data, "player_OM2"))
+    document.getElementById("companion_OM3").innerText = local_text(() => format.named_distance(data, "player_OM3"))
+    document.getElementById("companion_closest_poi").innerText = local_text(() => "Closest POI : \n" + data["closest_poi_1_name"] + " (" + format.km(data["closest_poi_1_distance"], 3) + ") \n" + data["closest_poi_2_name"] + " (" + format.km(data["closest_poi_2_distance"], 3) + ")")
+    console.log("Succefully updated the GUI")
+}
+
+
+function on_message(message) {
     console.log(message)
-    if (message.startsWith("New data : ")) {
-        var new_data = JSON.parse(message.slice(11));
-
-        document.getElementById("companion_updated").innerText = new_data["updated"]
-        document.getElementById("companion_player_X_global_coordinate").innerText = new_data["player_global_x"]
-        document.getElementById("companion_player_Y_global_coordinate").innerText = new_data["player_global_y"]
-        document.getElementById("companion_player_Z_global_coordinate").innerText = new_data["player_global_z"]
-        document.getElementById("distance_changed").innerText = new_data["distance_change"]
-        document.getElementById("companion_player_container").innerText = new_data["actual_container"]
-        document.getElementById("companion_player_X_local_coordinate").innerText = new_data["player_local_x"]
-        document.getElementById("companion_player_Y_local_coordinate").innerText = new_data["player_local_y"]
-        document.getElementById("companion_player_Z_local_coordinate").innerText = new_data["player_local_z"]
-        document.getElementById("companion_player_longitude").innerText = new_data["player_long"]
-        document.getElementById("companion_player_latitude").innerText = new_data["player_lat"]
-        document.getElementById("companion_player_height").innerText = new_data["player_height"]
-        document.getElementById("companion_OM1").innerText = new_data["player_OM1"]
-        document.getElementById("companion_OM2").innerText = new_data["player_OM2"]
-        document.getElementById("companion_OM3").innerText = new_data["player_OM3"]
-        document.getElementById("companion_closest_poi").innerText = new_data["closest_poi"]
-        console.log("Succefully updated the GUI")
+    if (message.startsWith("Command error : ") || message.startsWith("Update error : ")) {
+        on_error(message)
     }
-})
+}
+
+
+connect_backend(commands, on_message, on_error, on_update)
 
 
 
@@ -0,0 +1,65 @@
+// Formatting of the raw values sent by the backend with the protocol 2, same output as the text protocol of backend.py.
+
+// Same as str(round(value, digits)) in Python, NaN is sent as null
+function round(value, digits) {
+    if (value === null) {
+        return "nan"
+    }
+    var rounded = Number(value.toFixed(digits))
+    return Number.isInteger(rounded) ? rounded.toFixed(1) : String(rounded)
+}
+
+function km(value, digits) {
+    return round(value, digits) + " km"
+}
+
+function degrees(value, digits) {
+    return round(value, digits) + "°"
+}
+
+function named_distance(data, field) {
+    return data[field + "_name"] + " : " + km(data[field + "_distance"], 3)
+}
+
+function clock_time(unix_time) {
+    return new Date(unix_time * 1000).toTimeString().slice(0, 8)
+}
+
+// Same as str(datetime.timedelta(seconds=...)) : "1 day, 2:03:04"
+function duration(seconds) {
+    seconds = Math.round(seconds)
+    var days = Math.floor(seconds / 86400)
+    seconds -= days * 86400
+    var hours = Math.floor(seconds / 3600)
+    var minutes = Math.floor((seconds % 3600) / 60)
+    var text = hours + ":" + String(minutes).padStart(2, "0") + ":" + String(seconds % 60).padStart(2, "0")
+    if (days != 0) {
+        text = days + (Math.abs(days) == 1 ? " day, " : " days, ") + text
+    }
+    return text
+}
+
+function distance_color(distance) {
+    if (distance <= 100) {
+        return "#00ff00"
+    } else if (distance <= 1000) {
+        return "#ffd000"
+    }
+    return "#ff3700"
+}
+
+function delta_distance_color(delta_distance) {
+    return delta_distance <= 0 ? "#00ff00" : "#ff3700"
+}
+
+function deviation_color(deviation) {
+    if (deviation <= 10) {
+        return "#00ff00"
+    } else if (deviation <= 20) {
+        return "#ffd000"
+    }
+    return "#ff3700"
+}
+
+
+module.exports = { round, km, degrees, named_distance, clock_time, duration, distance_color, delta_distance_color, deviation_color }
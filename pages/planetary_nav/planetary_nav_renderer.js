@@ -1,6 +1,7 @@
 window.resizeTo(350, 750)
 
-let { PythonShell } = require('python-shell')
+let { connect_backend } = require('../backend_client.js')
+let format = require('../formatting.js')
 
 const queryString = window.location.search;
 const urlParams = new URLSearchParams(queryString);
@@ -9,26 +10,21 @@ const urlParams = new URLSearchParams(queryString);
 // custom oms : ../planetary_nav/planetary_nav.html?container=Aberdeen&known=false&entry_type=oms&OM1_name=om1&OM1_value=242&OM2_name=om4&OM2_value=258.38&OM3_name=om6&OM3_value=8988.36&height=85.3
 // custom xyz : ../planetary_nav/planetary_nav.html?container=Aberdeen&known=false&entry_type=xyz&x=424.3&y=42.456&z=147.6
 // custom llh : ../planetary_nav/planetary_nav.html?container=Aberdeen&known=false&entry_type=longlatheight&lat=25.5325&long=42.52&height=52.4412
+// route : ../planetary_nav/planetary_nav.html?container=Daymar&route=Javelin Wreck|Kudre Ore|TPF (visiting order chosen by the backend)
 
 var container = urlParams.get('container');
 var known = urlParams.get('known');
 
 if (known == "true") {
     var target = urlParams.get('target');
-    var options = {
-        mode: 'text',
-        args: ["planetary_nav", "--container", container, "--known", "true", "--target", target]
-    };
+    var target_args = ["--container", container, "--known", "true", "--target", target];
 } else {
     var entry_type = urlParams.get('entry_type');
     if (entry_type == "xyz") {
         var x = urlParams.get('x');
         var y = urlParams.get('y');
         var z = urlParams.get('z');
-        var options = {
-            mode: 'text',
-            args: ["planetary_nav", "--container", container, "--known", "false", "--entry_type", "xyz", "--x", x, "--y", y, "--z", z]
-        };
+        var target_args = ["--container", container, "--known", "false", "--entry_type", "xyz", "--x", x, "--y", y, "--z", z];
     } else if (entry_type == "oms") {
         var OM1_name = urlParams.get('OM1_name');
         var OM1_value = urlParams.get('OM1_value');
@@ -37,94 +33,96 @@ if (known == "true") {
         var OM3_name = urlParams.get('OM3_name');
         var OM3_value = urlParams.get('OM3_value');
         var height = urlParams.get('height');
-        var options = {
-            mode: 'text',
-            args: ["planetary_nav", "--container", container, "--known", "false", "--entry_type", "oms", "--OM1_name", OM1_name, "--OM1_value", OM1_value, "--OM2_name", OM2_name, "--OM2_value", OM2_value, "--OM3_name", OM3_name, "--OM3_value", OM3_value, "--height", height]
-        };
+        var target_args = ["--container", container, "--known", "false", "--entry_type", "oms", "--OM1_name", OM1_name, "--OM1_value", OM1_value, "--OM2_name", OM2_name, "--OM2_value", OM2_value, "--OM3_name", OM3_name, "--OM3_value", OM3_value, "--height", height];
     } else if (entry_type == "longlatheight") {
         var lat = urlParams.get('lat');
         var long = urlParams.get('long');
         var height = urlParams.get('height');
-        var options = {
-            mode: 'text',
-            args: ["planetary_nav", "--container", container, "--known", "false", "--entry_type", "longlatheight", "--lat", lat, "--long", long, "--height", height]
-        };
+        var target_args = ["--container", container, "--known", "false", "--entry_type", "longlatheight", "--lat", lat, "--long", long, "--height", height];
     }
 }
 
-let pyshell = new PythonShell('backend.py', options);
+var route = urlParams.get('route');
 
+var commands = [
+    { command: 'set_mode', mode: 'planetary_nav' },
+    route ? { command: 'set_route', container: container, pois: route.split('|') } : { command: 'set_target', args: target_args },
+    { command: 'subscribe', protocol: 2 }
+];
 
-error_message = "Something Wrong Happened. \nPlease see the error below \nIf anything shows up please report the issue to Valalol#1790 on Discord"
-
-pyshell.on('stderr', function (stderr) {
-    console.log(stderr)
-    window.resizeTo(350, 850)
 
-    document.getElementById("planetary_status_icon").src = '../../Images/red_dot.png';
-    document.getElementById("planetary_status_message").innerText = error_message
-    document.getElementById("planetary_error_message").innerText = stderr
-})
+error_message = "Something Wrong Happened. \nPlease see the error below \nIf anything shows up please report the issue to Valalol#1790 on Discord"
 
-pyshell.on('error', function (err) {
+function on_error(err) {
     console.log(err)
     window.resizeTo(350, 850)
 
     document.getElementById("planetary_status_icon").src = '../../Images/red_dot.png';
     document.getElementById("planetary_status_message").innerText = error_message
     document.getElementById("planetary_error_message").innerText = err
-})
+}
 
 
 
-pyshell.on('message', (message) => {
+function set_text(id, text, color) {
+    var element = document.getElementById(id)
+    element.innerText = text
+    if (color !== undefined) {
+        element.style.color = color
+    }
+}
+
+
+function on_update(data) {
+    set_text("planetary_updated_value", format.clock_time(Date.now() / 1000))
+    set_text("planetary_target_selected_value", data["target"])
+    set_text("planetary_player_container_value", data["player_actual_container"])
+    set_text("player_X_local_coordinate_value", format.round(data["player_x"], 3))
+    set_text("player_Y_local_coordinate_value", format.round(data["player_y"], 3))
+    set_text("player_Z_local_coordinate_value", format.round(data["player_z"], 3))
+    set_text("player_longitude_value", format.degrees(data["player_long"], 2))
+    set_text("player_latitude_value", format.degrees(data["player_lat"], 2))
+    set_text("player_height_value", format.km(data["player_height"], 1))
+    set_text("player_OM1_value", format.named_distance(data, "player_OM1"))
+    set_text("player_OM2_value", format.named_distance(data, "player_OM2"))
+    set_text("player_OM3_value", format.named_distance(data, "player_OM3"))
+    set_text("player_closest_poi_value", format.named_distance(data, "player_closest_poi"))
+    set_text("player_state_of_the_day_value", data["player_state_of_the_day"])
+    set_text("player_next_event_value", data["player_next_event"])
+    set_text("player_next_event_time_value", format.clock_time(data["player_next_event_time"]))
+    set_text("target_container_value", data["target_container"])
+    set_text("target_X_local_coordinate_value", data["target_x"])
+    set_text("target_Y_local_coordinate_value", data["target_y"])
+    set_text("target_Z_local_coordinate_value", data["target_z"])
+    set_text("target_longitude_value", format.degrees(data["target_long"], 2))
+    set_text("target_latitude_value", format.degrees(data["target_lat"], 2))
+    set_text("target_height_value", format.km(data["target_height"], 1))
+    set_text("target_OM1_value", format.named_distance(data, "target_OM1"))
+    set_text("target_OM2_value", format.named_distance(data, "target_OM2"))
+    set_text("target_OM3_value", format.named_distance(data, "target_OM3"))
+    set_text("target_closest_QT_beacon_value", format.named_distance(data, "target_closest_QT_beacon"))
+    set_text("target_state_of_the_day_value", data["target_state_of_the_day"])
+    set_text("target_next_event_value", data["target_next_event"])
+    set_text("target_next_event_time_value", format.clock_time(data["target_next_event_time"]))
+    set_text("planetary_distance_to_poi_value", format.km(data["distance_to_poi"], 3), format.distance_color(data["distance_to_poi"]))
+    set_text("planetary_distance_to_poi_value_delta", format.km(Math.abs(data["delta_distance_to_poi"]), 3), format.delta_distance_color(data["delta_distance_to_poi"]))
+    set_text("planetary_course_deviation_value", format.degrees(data["total_deviation"], 1), format.deviation_color(data["total_deviation"]))
+    set_text("planetary_flat_angle_value", format.degrees(data["horizontal_deviation"], 1), format.deviation_color(data["horizontal_deviation"]))
+    set_text("planetary_heading_value", format.degrees(data["heading"], 1))
+    set_text("planetary_ETA_value", format.duration(data["ETA"]))
+    console.log("Succefully updated the GUI")
+}
+
+
+function on_message(message) {
     console.log(message)
-    if (message.startsWith("New data : ")) {
-        var new_data = JSON.parse(message.slice(11));
-
-        document.getElementById("planetary_updated_value").innerText = new_data["updated"]
-        document.getElementById("planetary_target_selected_value").innerText = new_data["target"]
-        document.getElementById("planetary_player_container_value").innerText = new_data["player_actual_container"]
-        document.getElementById("player_X_local_coordinate_value").innerText = new_data["player_x"]
-        document.getElementById("player_Y_local_coordinate_value").innerText = new_data["player_y"]
-        document.getElementById("player_Z_local_coordinate_value").innerText = new_data["player_z"]
-        document.getElementById("player_longitude_value").innerText = new_data["player_long"]
-        document.getElementById("player_latitude_value").innerText = new_data["player_lat"]
-        document.getElementById("player_height_value").innerText = new_data["player_height"]
-        document.getElementById("player_OM1_value").innerText = new_data["player_OM1"]
-        document.getElementById("player_OM2_value").innerText = new_data["player_OM2"]
-        document.getElementById("player_OM3_value").innerText = new_data["player_OM3"]
-        document.getElementById("player_closest_poi_value").innerText = new_data["player_closest_poi"]
-        document.getElementById("player_state_of_the_day_value").innerText = new_data["player_state_of_the_day"]
-        document.getElementById("player_next_event_value").innerText = new_data["player_next_event"]
-        document.getElementById("player_next_event_time_value").innerText = new_data["player_next_event_time"]
-        document.getElementById("target_container_value").innerText = new_data["target_container"]
-        document.getElementById("target_X_local_coordinate_value").innerText = new_data["target_x"]
-        document.getElementById("target_Y_local_coordinate_value").innerText = new_data["target_y"]
-        document.getElementById("target_Z_local_coordinate_value").innerText = new_data["target_z"]
-        document.getElementById("target_longitude_value").innerText = new_data["target_long"]
-        document.getElementById("target_latitude_value").innerText = new_data["target_lat"]
-        document.getElementById("target_height_value").innerText = new_data["target_height"]
-        document.getElementById("target_OM1_value").innerText = new_data["target_OM1"]
-        document.getElementById("target_OM2_value").innerText = new_data["target_OM2"]
-        document.getElementById("target_OM3_value").innerText = new_data["target_OM3"]
-        document.getElementById("target_closest_QT_beacon_value").innerText = new_data["target_closest_QT_beacon"]
-        document.getElementById("target_state_of_the_day_value").innerText = new_data["target_state_of_the_day"]
-        document.getElementById("target_next_event_value").innerText = new_data["target_next_event"]
-        document.getElementById("target_next_event_time_value").innerText = new_data["target_next_event_time"]
-        document.getElementById("planetary_distance_to_poi_value").innerText = new_data["distance_to_poi"]
-        document.getElementById("planetary_distance_to_poi_value").style.color = new_data["distance_to_poi_color"]
-        document.getElementById("planetary_distance_to_poi_value_delta").innerText = new_data["delta_distance_to_poi"]
-        document.getElementById("planetary_distance_to_poi_value_delta").style.color = new_data["delta_distance_to_poi_color"]
-        document.getElementById("planetary_course_deviation_value").innerText = new_data["total_deviation"]
-        document.getElementById("planetary_course_deviation_value").style.color = new_data["total_deviation_color"]
-        document.getElementById("planetary_flat_angle_value").innerText = new_data["horizontal_deviation"]
-        document.getElementById("planetary_flat_angle_value").style.color = new_data["horizontal_deviation_color"]
-        document.getElementById("planetary_heading_value").innerText = new_data["heading"]
-        document.getElementById("planetary_ETA_value").innerText = new_data["ETA"]
-        console.log("Succefully updated the GUI")
+    if (message.startsWith("Command error : ") || message.startsWith("Update error : ")) {
+        on_error(message)
     }
-})
+}
+
+
+connect_backend(commands, on_message, on_error, on_update)
 
 
 
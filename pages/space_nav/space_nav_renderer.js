@@ -1,6 +1,7 @@
 window.resizeTo(350,367)
 
-let { PythonShell } = require('python-shell')
+let { connect_backend } = require('../backend_client.js')
+let format = require('../formatting.js')
 
 const queryString = window.location.search;
 const urlParams = new URLSearchParams(queryString);
@@ -12,69 +13,70 @@ var known = urlParams.get('known');
 
 if (known == "true") {
     var target = urlParams.get('target');
-    var options = {
-        mode: 'text',
-        args: ["space_nav", "--known", "true", "--target", target]
-    };
+    var target_args = ["--known", "true", "--target", target];
 } else {
     var x = urlParams.get('x');
     var y = urlParams.get('y');
     var z = urlParams.get('z');
-    var options = {
-        mode: 'text',
-        args: ["space_nav", "--known", "false", "--x", x, "--y", y, "--z", z]
-    };
+    var target_args = ["--known", "false", "--x", x, "--y", y, "--z", z];
 }
 
 
-let pyshell = new PythonShell('backend.py', options);
+var commands = [
+    { command: 'set_mode', mode: 'space_nav' },
+    { command: 'set_target', args: target_args },
+    { command: 'subscribe', protocol: 2 }
+];
 
 
 error_message = "Something Wrong Happened. \nPlease see the error below \nIf anything shows up please report the issue to Valalol#1790 on Discord"
 
-pyshell.on('stderr', function (stderr) {
-    console.log(stderr)
-    window.resizeTo(350, 850)
-
-    document.getElementById("space_status_icon").src = '../../Images/red_dot.png';
-    document.getElementById("space_status_message").innerText = error_message
-    document.getElementById("space_error_message").innerText = stderr
-})
-
-pyshell.on('error', function (err) {
+function on_error(err) {
     console.log(err)
     window.resizeTo(350, 850)
 
     document.getElementById("space_status_icon").src = '../../Images/red_dot.png';
     document.getElementById("space_status_message").innerText = error_message
     document.getElementById("space_error_message").innerText = err
-})
+}
+
+
 
+function set_text(id, text, color) {
+    var element = document.getElementById(id)
+    element.innerText = text
+    if (color !== undefined) {
+        element.style.color = color
+    }
+}
+
+
+function on_update(data) {
+    set_text("space_updated_value", "Updated : " + format.clock_time(Date.now() / 1000))
+    set_text("space_target_selected_value", data["target"])
+    set_text("player_X_global_coordinate_value", format.round(data["player_x"], 3))
+    set_text("player_Y_global_coordinate_value", format.round(data["player_y"], 3))
+    set_text("player_Z_global_coordinate_value", format.round(data["player_z"], 3))
+    set_text("target_X_global_coordinate_value", format.round(data["target_x"], 3))
+    set_text("target_Y_global_coordinate_value", format.round(data["target_y"], 3))
+    set_text("target_Z_global_coordinate_value", format.round(data["target_z"], 3))
+    set_text("space_distance_to_poi_value", format.km(data["distance_to_poi"], 3), format.distance_color(data["distance_to_poi"]))
+    set_text("space_distance_to_poi_value_delta", format.km(Math.abs(data["delta_distance_to_poi"]), 3), format.delta_distance_color(data["delta_distance_to_poi"]))
+    set_text("space_course_deviation_value", format.degrees(data["total_deviation"], 1), format.deviation_color(data["total_deviation"]))
+    set_text("space_ETA_value", format.duration(data["ETA"]))
+    console.log("Succefully updated the GUI")
+}
 
 
-pyshell.on('message', (message) => {
+function on_message(message) {
     console.log(message)
-    if (message.startsWith("New data : ")) {
-        var new_data = JSON.parse(message.slice(11));
-
-        document.getElementById("space_updated_value").innerText = new_data["updated"]
-        document.getElementById("space_target_selected_value").innerText = new_data["target"]
-        document.getElementById("player_X_global_coordinate_value").innerText = new_data["player_x"]
-        document.getElementById("player_Y_global_coordinate_value").innerText = new_data["player_y"]
-        document.getElementById("player_Z_global_coordinate_value").innerText = new_data["player_z"]
-        document.getElementById("target_X_global_coordinate_value").innerText = new_data["target_x"]
-        document.getElementById("target_Y_global_coordinate_value").innerText = new_data["target_y"]
-        document.getElementById("target_Z_global_coordinate_value").innerText = new_data["target_z"]
-        document.getElementById("space_distance_to_poi_value").innerText = new_data["distance_to_poi"]
-        document.getElementById("space_distance_to_poi_value").style.color = new_data["distance_to_poi_color"]
-        document.getElementById("space_distance_to_poi_value_delta").innerText = new_data["delta_distance_to_poi"]
-        document.getElementById("space_distance_to_poi_value_delta").style.color = new_data["delta_distance_to_poi_color"]
-        document.getElementById("space_course_deviation_value").innerText = new_data["total_deviation"]
-        document.getElementById("space_course_deviation_value").style.color = new_data["total_deviation_color"]
-        document.getElementById("space_ETA_value").innerText = new_data["ETA"]
-        console.log("Succefully updated the GUI")
+    if (message.startsWith("Command error : ") || message.startsWith("Update error : ")) {
+        on_error(message)
     }
-})
+}
+
+
+connect_backend(commands, on_message, on_error, on_update)
 
 
 
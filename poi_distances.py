@@ -0,0 +1,164 @@
+"""Distances between every pair of POIs of each container, kept on disk.
+
+POIs do not move in the local frame of their container, so for every container the cache holds :
+- "chord"   : (P, P) straight-line distances in km
+- "surface" : (P, P) great-circle distances in km on the surface of the container
+- "quantum" : (P, k) rows of the k POIs with a quantum marker closest to every POI (itself first if it has one)
+and the closest beacon, nearest neighbour and route queries are lookups in these tables.
+
+The tables are saved to Cache/POI_distances.npz with the sha256 of Database.json (the one of the snapshot) and
+rebuilt when the database changes.
+"""
+import json
+import os
+
+import numpy as np
+
+import navigation_math
+
+
+Cache_version = 1
+Default_cache_path = "Cache/POI_distances.npz"
+
+# Closest quantum markers kept per POI
+Quantum_neighbours = 5
+
+
+
+def container_tables(Coordinates, quantum_markers, body_radius : float, k : int = Quantum_neighbours):
+    """{"chord", "surface", "quantum"} tables of the POIs of a container"""
+    delta = Coordinates[:, None, :] - Coordinates[None, :, :]
+    Chord = np.sqrt(np.einsum("ijk,ijk->ij", delta, delta))
+    Surface = navigation_math.great_circle_distances(Coordinates, Coordinates, body_radius)
+
+    Quantum_rows = np.flatnonzero(quantum_markers)
+    k = min(k, len(Quantum_rows))
+    # Stable sort : equal distances keep the order of the database, like the POI search
+    Order = np.argsort(Chord[:, Quantum_rows], axis=1, kind="stable")[:, :k]
+    return {"chord": Chord, "surface": Surface, "quantum": Quantum_rows[Order]}
+
+
+
+class POIDistanceCache:
+    """All-pairs POI distances of every container of a database"""
+
+    def __init__(self, Database, tables : dict):
+        self.Database = Database
+        self.snapshot = Database.snapshot
+        self.tables = tables
+        self.rows = {}
+        self.quantum_lists = {}
+
+    @classmethod
+    def build(cls, Database, k : int = Quantum_neighbours, container_names = None):
+        """Tables of the containers of a database (of some of them only if given)"""
+        snapshot = Database.snapshot
+        pois = snapshot.array("pois")
+        columns = [snapshot.column("pois", axis) for axis in ["X", "Y", "Z"]]
+        quantum_column = snapshot.string_columns["pois"]["QTMarker"]
+
+        tables = {}
+        for container_name in snapshot.container_names:
+            start, end = snapshot.container_poi_rows(container_name)
+            if start == end or (container_names is not None and container_name not in container_names):
+                continue
+            quantum_markers = np.array([strings[quantum_column] == "TRUE" for strings in snapshot.tables["pois"]["strings"][start:end]], dtype=bool)
+            tables[container_name] = container_tables(pois[start:end][:, columns], quantum_markers, Database["Containers"][container_name]["Body Radius"], k)
+        return cls(Database, tables)
+
+    def rebuilt(self, Database, container_names):
+        """New cache of a database with the tables of some containers built again, the others shared with this one"""
+        cache = POIDistanceCache.build(Database, container_names=container_names)
+        for container_name, tables in self.tables.items():
+            if container_name not in container_names and container_name in Database.snapshot.container_index:
+                cache.tables[container_name] = tables
+                if container_name in self.quantum_lists:
+                    cache.quantum_lists[container_name] = self.quantum_lists[container_name]
+        return cache
+
+    def save(self, path : str = Default_cache_path):
+        """Writes the tables next to the hash of the database (through a temporary file, like the snapshot)"""
+        arrays = {f"{container_name}/{table}": values for container_name, container in self.tables.items() for table, values in container.items()}
+        header = {"version": Cache_version, "source_hash": self.snapshot.source_hash, "containers": list(self.tables)}
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            np.savez(f, header=np.array(json.dumps(header)), **arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, Database, path : str = Default_cache_path):
+        """Returns the cache saved for this database, None if it is missing, unreadable or outdated"""
+        try :
+            with np.load(path, allow_pickle=False) as saved:
+                header = json.loads(str(saved["header"]))
+                if header.get("version") != Cache_version or header.get("source_hash") != Database.snapshot.source_hash:
+                    return None
+                tables = {container_name: {table: saved[f"{container_name}/{table}"] for table in ["chord", "surface", "quantum"]} for container_name in header["containers"]}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(Database, tables)
+
+    #-----------------------------------------------------Queries--------------------------------------------------------------
+
+    def row(self, container_name : str, poi_name : str):
+        rows = self.rows.get(container_name)
+        if rows is None:
+            start, end = self.snapshot.container_poi_rows(container_name)
+            rows = self.rows[container_name] = {name: row for row, name in enumerate(self.snapshot.poi_names[start:end])}
+        return rows[poi_name]
+
+    def names(self, container_name : str):
+        start, end = self.snapshot.container_poi_rows(container_name)
+        return self.snapshot.poi_names[start:end]
+
+    def distance(self, container_name : str, a : str, b : str, surface : bool = False):
+        """Distance in km between two POIs of a container, in a straight line or on the surface"""
+        return float(self.tables[container_name]["surface" if surface else "chord"][self.row(container_name, a), self.row(container_name, b)])
+
+    def closest_quantum(self, container_name : str, poi_name : str):
+        """[{"Name", "Distance"}] of the POIs with a quantum marker closest to a POI, closest first (like get_closest_POI)"""
+        lists = self.quantum_lists.get(container_name)
+        if lists is None:
+            container = self.tables.get(container_name)
+            if container is None:
+                return []
+            names = self.names(container_name)
+            Distances = np.take_along_axis(container["chord"], container["quantum"], axis=1).tolist()
+            lists = self.quantum_lists[container_name] = [
+                [{"Name": names[row], "Distance": distance} for row, distance in zip(rows, distances)]
+                for rows, distances in zip(container["quantum"].tolist(), Distances)
+            ]
+        return lists[self.row(container_name, poi_name)]
+
+    def nearest(self, container_name : str, poi_name : str, k : int = 1, surface : bool = False):
+        """[{"Name", "Distance"}] of the k other POIs closest to a POI"""
+        Distances = self.tables[container_name]["surface" if surface else "chord"][self.row(container_name, poi_name)]
+        Order = np.argsort(Distances, kind="stable")
+        names = self.names(container_name)
+        return [{"Name": names[row], "Distance": float(Distances[row])} for row in Order.tolist() if names[row] != poi_name][:k]
+
+    def get(self, container_name : str):
+        """(POI names, {name: row}, local coordinates, surface distances) of a container, the matrices of route_planner"""
+        start, end = self.snapshot.container_poi_rows(container_name)
+        columns = [self.snapshot.column("pois", axis) for axis in ["X", "Y", "Z"]]
+        names = self.names(container_name)
+        if container_name not in self.rows:
+            self.rows[container_name] = {name: row for row, name in enumerate(names)}
+        return names, self.rows[container_name], self.snapshot.array("pois")[start:end][:, columns], self.tables[container_name]["surface"]
+
+
+
+def load_distance_cache(Database, path : str = Default_cache_path):
+    """Returns the distance cache of the database, rebuilt and saved if the database changed"""
+    cache = POIDistanceCache.load(Database, path)
+    if cache is None:
+        cache = POIDistanceCache.build(Database)
+        try :
+            cache.save(path)
+        except OSError:
+            # Read-only install folder : the cache is only kept in memory
+            pass
+    return cache
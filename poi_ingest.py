@@ -0,0 +1,260 @@
+"""Adds community POIs to the database without rewriting Database.json.
+
+Usage :
+    python poi_ingest.py community_pois.csv more_pois.jsonl
+    python poi_ingest.py --compact
+
+The records (CSV with a header or JSON lines) need a Name, a Container and the local X, Y, Z in km, QTMarker and
+the qw/qx/qy/qz rotation are optional. They are read in batches and each one is :
+- validated : known container, finite coordinates, between "Max_depth" km under the surface and "Max_altitude"
+  OM Radius from the centre for the containers with a body
+- de-duplicated : a POI of the same name, or within --dedupe_distance km of another POI of the same container
+  (in the database, the overlay or earlier in the input) is skipped. The positions are kept in a spatial hash of
+  cells of that size, a record is compared with the POIs of the 27 cells around it
+- appended to the overlay (Database_overlay.jsonl), one JSON line per POI.
+
+Only the containers of the input are indexed, so the time of an ingest grows with the size of the batch, not of the
+database. load_database merges the overlay when it compiles the snapshot. --compact writes the overlay POIs into
+Database.json (same formatting) and empties the overlay.
+The output of custom_targets.py can be ingested as it is.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from collections import Counter
+
+from database_snapshot import load_database, merge_overlay, overlay_path_of, read_overlay, read_overlay_content
+
+
+Batch_size = 10000
+
+# km, two POIs closer than this are the same place
+Default_dedupe_distance = 0.05
+
+# Bounds of the POIs of containers with a body : caves and bunkers go a bit under the surface, stations and
+# orbital markers up to 1.6 OM Radius in the current database
+Max_depth = 5.0
+Max_altitude = 2.0
+
+Rotation_fields = ["qw", "qx", "qy", "qz"]
+Default_rotation = {"qw": 1.0, "qx": 0.0, "qy": 0.0, "qz": 0.0}
+
+
+
+class SpatialHash:
+    """Positions in cubic cells of a given size, to find the ones near a position without comparing all of them"""
+
+    def __init__(self, cell_size : float):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell(self, X : float, Y : float, Z : float):
+        return (math.floor(X / self.cell_size), math.floor(Y / self.cell_size), math.floor(Z / self.cell_size))
+
+    def add(self, X : float, Y : float, Z : float, name : str):
+        self.cells.setdefault(self.cell(X, Y, Z), []).append((X, Y, Z, name))
+
+    def near(self, X : float, Y : float, Z : float, distance : float):
+        """Name of a position within distance (at most the cell size), None if there is none"""
+        cx, cy, cz = self.cell(X, Y, Z)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for x, y, z, name in self.cells.get((cx + dx, cy + dy, cz + dz), ()):
+                        if (x - X)**2 + (y - Y)**2 + (z - Z)**2 <= distance * distance:
+                            return name
+        return None
+
+
+
+#-----------------------------------------------------Reading--------------------------------------------------------------
+
+def read_records(path : str):
+    """Yields the records of a CSV or JSON lines file one by one"""
+    with open(path, newline='', encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    try :
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None
+        else :
+            yield from csv.DictReader(f)
+
+
+def batches(records, size : int = Batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def as_float(value):
+    try :
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+
+#-----------------------------------------------------Validation--------------------------------------------------------------
+
+def normalize_record(record):
+    """POI record with the fields and types of Database.json, or the reason it is rejected"""
+    if not isinstance(record, dict):
+        return None, "unreadable"
+    name = str(record.get("Name") or "").strip()
+    if not name:
+        return None, "no name"
+    POI = {"Name": name, "Container": str(record.get("Container") or "").strip()}
+    for axis in ["X", "Y", "Z"]:
+        POI[axis] = as_float(record.get(axis))
+        if not math.isfinite(POI[axis]):
+            return None, f"invalid {axis}"
+    for field in Rotation_fields:
+        value = as_float(record.get(field, Default_rotation[field]))
+        POI[field] = value if math.isfinite(value) else Default_rotation[field]
+    POI["QTMarker"] = "TRUE" if str(record.get("QTMarker", "FALSE")).strip().upper() == "TRUE" else "FALSE"
+    return POI, None
+
+
+def out_of_bounds(POI : dict, Container):
+    """Reason a POI is outside of its container, None if it is inside"""
+    Radial_distance = math.sqrt(POI["X"]**2 + POI["Y"]**2 + POI["Z"]**2)
+    if Container["Body Radius"] > 0 and Radial_distance < Container["Body Radius"] - Max_depth:
+        return "under the surface"
+    if Container["OM Radius"] > 0 and Radial_distance > Max_altitude * Container["OM Radius"]:
+        return "too far from the container"
+    return None
+
+
+
+#-----------------------------------------------------Ingest--------------------------------------------------------------
+
+class Ingest:
+    """Validates and de-duplicates POI records against a database, the accepted ones are appended to its overlay"""
+
+    def __init__(self, Database, overlay_path : str, dedupe_distance : float = Default_dedupe_distance):
+        self.Database = Database
+        self.snapshot = Database.snapshot
+        self.overlay_path = overlay_path
+        self.dedupe_distance = dedupe_distance
+        self.indexes = {}
+        self.counts = Counter()
+        self.examples = {}
+
+    def container_index(self, container_name : str):
+        """(names, spatial hash) of the POIs of a container, built the first time the container is met"""
+        index = self.indexes.get(container_name)
+        if index is None:
+            names = set()
+            positions = SpatialHash(self.dedupe_distance)
+            start, end = self.snapshot.container_poi_rows(container_name)
+            columns = [self.snapshot.column("pois", axis) for axis in ["X", "Y", "Z"]]
+            for name, (X, Y, Z) in zip(self.snapshot.poi_names[start:end], self.snapshot.array("pois")[start:end][:, columns].tolist()):
+                names.add(name)
+                positions.add(X, Y, Z, name)
+            index = self.indexes[container_name] = (names, positions)
+        return index
+
+    def reject(self, reason : str, record):
+        self.counts[reason] += 1
+        self.examples.setdefault(reason, record.get("Name") if isinstance(record, dict) else record)
+
+    def check(self, record):
+        """Returns the POI of a record if it is accepted"""
+        POI, reason = normalize_record(record)
+        if POI is None:
+            return self.reject(reason, record)
+        if POI["Container"] not in self.snapshot.container_index:
+            return self.reject("unknown container", record)
+        reason = out_of_bounds(POI, self.Database["Containers"][POI["Container"]])
+        if reason is not None:
+            return self.reject(reason, record)
+
+        names, positions = self.container_index(POI["Container"])
+        if POI["Name"] in names:
+            return self.reject("duplicate name", record)
+        if positions.near(POI["X"], POI["Y"], POI["Z"], self.dedupe_distance) is not None:
+            return self.reject("duplicate position", record)
+
+        names.add(POI["Name"])
+        positions.add(POI["X"], POI["Y"], POI["Z"], POI["Name"])
+        self.counts["added"] += 1
+        return POI
+
+    def add_batch(self, records : list):
+        """Appends the accepted records of a batch to the overlay in one write"""
+        lines = [json.dumps(POI) + "\n" for POI in map(self.check, records) if POI is not None]
+        if not lines:
+            return
+        with open(self.overlay_path, "a+b") as f:
+            # A line cut short by an interrupted ingest is ended before the new ones (read_overlay skips it)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+
+def compact(path : str, overlay_path : str):
+    """Writes the POIs of the overlay into the JSON database and empties the overlay, returns their number"""
+    records = read_overlay(read_overlay_content(overlay_path))
+    if not records:
+        return 0
+    with open(path, "rb") as f:
+        Database = json.loads(f.read())
+    merge_overlay(Database, records)
+
+    # Same formatting as Database.json : 4 spaces, CRLF, no final line break
+    content = json.dumps(Database, indent=4).replace("\n", "\r\n").encode("utf-8")
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(content)
+    os.replace(temporary_path, path)
+    # Merging the overlay again would change nothing if this was not reached
+    os.remove(overlay_path)
+    return len(records)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adds POIs to the overlay of the database, or merges the overlay into it")
+    parser.add_argument("inputs", type=str, nargs="*", help="CSV or JSON lines files of POI records")
+    parser.add_argument("--compact", action="store_true", help="Writes the overlay into the database")
+    parser.add_argument("--database", type=str, default="Database.json")
+    parser.add_argument("--overlay", type=str, help="Overlay file (next to the database by default)")
+    parser.add_argument("--dedupe_distance", type=float, default=Default_dedupe_distance, help="km")
+    args = parser.parse_args()
+
+    overlay_path = args.overlay or overlay_path_of(args.database)
+
+    if args.inputs:
+        Database = load_database(args.database, overlay_path=overlay_path)
+        ingest = Ingest(Database, overlay_path, args.dedupe_distance)
+        for path in args.inputs:
+            for batch in batches(read_records(path)):
+                ingest.add_batch(batch)
+        rejected = ", ".join(f"{count} {reason} (e.g. {ingest.examples[reason]})" for reason, count in ingest.counts.items() if reason != "added")
+        print(f"{ingest.counts['added']} POIs added to {overlay_path}" + (f", rejected : {rejected}" if rejected else ""), file=sys.stderr)
+
+    if args.compact:
+        print(f"{compact(args.database, overlay_path)} POIs written to {args.database}", file=sys.stderr)
+
+    if not args.inputs and not args.compact:
+        parser.error("nothing to ingest")
+
+
+if __name__ == "__main__":
+    main()
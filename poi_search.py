@@ -0,0 +1,195 @@
+"""Nearest POI search on NumPy arrays.
+
+Every container gets a (P, 3) array of its POI local coordinates and a mask of its quantum markers.
+A query computes the P squared distances in one vectorized pass and only partially sorts them with
+`argpartition` to get the k closest ones. `radar` computes the distances, bearings and deviations to every
+POI of a container in the same way.
+"""
+from math import sqrt
+
+import numpy as np
+
+import navigation_math
+
+
+
+class POISearch:
+    """Top-k nearest POI queries per container"""
+
+    def __init__(self, names : list, coordinates, quantum_markers, container_rows : dict):
+        coordinates = np.ascontiguousarray(coordinates, dtype=np.float64).reshape(-1, 3)
+        quantum_markers = np.asarray(quantum_markers, dtype=bool)
+
+        self.containers = {}
+        self.quantum_markers = {}
+        for container_name, (start, end) in container_rows.items():
+            container_names = np.array(names[start:end], dtype=object)
+            container_coordinates = coordinates[start:end]
+            mask = quantum_markers[start:end]
+            self.containers[container_name] = {
+                False: (container_names, container_coordinates),
+                True: (container_names[mask], np.ascontiguousarray(container_coordinates[mask]))
+            }
+            self.quantum_markers[container_name] = mask
+        # (latitudes, longitudes, squared norms) of the POIs of a container, computed on its first radar query
+        self.radar_constants = {}
+
+    @classmethod
+    def from_database(cls, Database, container_names = None):
+        """Search over the POIs of a database (of some of its containers only if given)"""
+        snapshot = Database.snapshot
+        pois = snapshot.array("pois")
+        columns = [snapshot.column("pois", axis) for axis in ["X", "Y", "Z"]]
+        quantum_column = snapshot.string_columns["pois"]["QTMarker"]
+        quantum_markers = [strings[quantum_column] == "TRUE" for strings in snapshot.tables["pois"]["strings"]]
+        container_rows = {name: snapshot.container_poi_rows(name) for name in snapshot.container_names if container_names is None or name in container_names}
+        return cls(snapshot.poi_names, pois[:, columns], quantum_markers, container_rows)
+
+    def rebuilt(self, Database, container_names):
+        """New search with the POIs of some containers read again from a database, the other containers shared with this one"""
+        search = POISearch.from_database(Database, container_names)
+        for name in Database.snapshot.container_names:
+            if name not in container_names and name in self.containers:
+                search.containers[name] = self.containers[name]
+                search.quantum_markers[name] = self.quantum_markers[name]
+                if name in self.radar_constants:
+                    search.radar_constants[name] = self.radar_constants[name]
+        return search
+
+    def closest(self, X : float, Y : float, Z : float, container_name : str, k : int = 1, quantum_marker : bool = False):
+        """Returns the names and distances of the k POIs of a container closest to a local position, closest first"""
+        entry = self.containers.get(container_name)
+        if entry is None:
+            return [], np.empty(0)
+        names, coordinates = entry[quantum_marker]
+        count = len(names)
+        if count == 0:
+            return [], np.empty(0)
+
+        delta = coordinates - (X, Y, Z)
+        distances2 = np.einsum("ij,ij->i", delta, delta)
+
+        if k is None or k >= count:
+            selection = np.argsort(distances2)
+        else:
+            # Only the k smallest are sorted
+            selection = np.argpartition(distances2, k - 1)[:k]
+            selection = selection[np.argsort(distances2[selection])]
+
+        return list(names[selection]), np.sqrt(distances2[selection])
+
+    def closest_rows(self, X : float, Y : float, Z : float, container_name : str, k : int, quantum_marker : bool = False):
+        """Returns the names, coordinates and distances of the k closest POIs (as lists) and the distance of the
+        (k+1)-th one (inf if there is none) : no other POI is closer than it"""
+        entry = self.containers.get(container_name)
+        if entry is None or len(entry[quantum_marker][0]) == 0:
+            return [], [], [], float("inf")
+        names, coordinates = entry[quantum_marker]
+        count = len(names)
+
+        delta = coordinates - (X, Y, Z)
+        distances2 = np.einsum("ij,ij->i", delta, delta)
+        if k + 1 >= count:
+            selection = np.argsort(distances2)
+        else :
+            selection = np.argpartition(distances2, k)[:k + 1]
+            selection = selection[np.argsort(distances2[selection])]
+        Distances = np.sqrt(distances2[selection]).tolist()
+        Bound = Distances[k] if len(Distances) > k else float("inf")
+        selection = selection[:k]
+        return list(names[selection]), coordinates[selection].tolist(), Distances[:k], Bound
+
+    def closest_many(self, positions, container_name : str, quantum_marker : bool = False, chunk_size : int = 16384):
+        """Returns the index in self.containers[container_name][quantum_marker][0] and the distance of the closest POI of every (N, 3) local position (-1 and NaN if the container has no POI)"""
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        indices = np.full(len(positions), -1, dtype=np.int64)
+        distances = np.full(len(positions), np.nan)
+
+        entry = self.containers.get(container_name)
+        if entry is None or len(entry[quantum_marker][0]) == 0:
+            return indices, distances
+        coordinates = entry[quantum_marker][1]
+
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, chunked to bound the (chunk, P) matrix
+        coordinates2 = np.einsum("ij,ij->i", coordinates, coordinates)
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start:start + chunk_size]
+            distances2 = coordinates2[None, :] - 2 * chunk @ coordinates.T
+            closest = distances2.argmin(axis=1)
+            indices[start:start + chunk_size] = closest
+            # The expansion is only used to pick the closest POI, the distance is computed exactly
+            delta = chunk - coordinates[closest]
+            distances[start:start + chunk_size] = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+
+        return indices, distances
+
+    def radar(self, X : float, Y : float, Z : float, Previous, Latitude : float, Longitude : float, container_name : str, body_radius : float, quantum_marker : bool = None):
+        """Returns, for every POI of a container seen from a local position (only the quantum markers or only the others if
+        quantum_marker is not None) : names, quantum markers, distances, great-circle surface distances, bearings and
+        horizontal deviations of the move from the Previous local position (same as the Flat_angle of planetary_nav)"""
+        entry = self.containers.get(container_name)
+        if entry is None:
+            empty = np.empty(0)
+            return {"names": np.empty(0, dtype=object), "quantum_markers": np.empty(0, dtype=bool), "distances": empty,
+                    "surface_distances": empty, "bearings": empty, "horizontal_deviations": empty}
+        names, coordinates = entry[False]
+        markers = self.quantum_markers[container_name]
+
+        if container_name not in self.radar_constants:
+            Latitudes, Longitudes, Heights = navigation_math.lat_long_height(coordinates, body_radius)
+            self.radar_constants[container_name] = (Latitudes, Longitudes, np.einsum("ij,ij->i", coordinates, coordinates))
+        Latitudes, Longitudes, Norms2 = self.radar_constants[container_name]
+
+        if quantum_marker is not None:
+            selection = markers if quantum_marker else ~markers
+            names, coordinates, markers = names[selection], coordinates[selection], markers[selection]
+            Latitudes, Longitudes, Norms2 = Latitudes[selection], Longitudes[selection], Norms2[selection]
+
+        position = np.array((X, Y, Z))
+        delta = coordinates - position
+        # |position x POI| from the dot products, a cross product per POI costs more than the rest of the pass
+        Dots = coordinates @ position
+        Cross_norms = np.sqrt(np.maximum(Norms2 * (X*X + Y*Y + Z*Z) - Dots * Dots, 0))
+
+        # The plane normals of Flat_angle are previous x position for the move and position x POI for the POIs,
+        # so their dot products are POI . ((previous x position) x position)
+        px, py, pz = Previous
+        nx, ny, nz = py*Z - pz*Y, pz*X - px*Z, px*Y - py*X
+        Norms = sqrt(nx*nx + ny*ny + nz*nz) * Cross_norms
+        Cosines = np.divide(coordinates @ (ny*Z - nz*Y, nz*X - nx*Z, nx*Y - ny*X), Norms, out=np.ones_like(Norms), where=Norms != 0)
+
+        return {
+            "names": names,
+            "quantum_markers": markers,
+            "distances": np.sqrt(np.einsum("ij,ij->i", delta, delta)),
+            "surface_distances": np.arctan2(Cross_norms, Dots) * body_radius,
+            "bearings": navigation_math.bearing(Latitude, Longitude, Latitudes, Longitudes),
+            "horizontal_deviations": np.degrees(np.arccos(np.clip(Cosines, -1.0, 1.0)))
+        }
+
+
+
+class ClosestTracker:
+    """k closest POIs of a moving position (the player) : a POI that was not among the k closest at the last search
+    is at least Bound - moved km away, so the last answer holds while its POIs stay within that distance. Only their
+    distances are computed then, the search of the whole container runs again when the player moved too much."""
+
+    def __init__(self, k : int, quantum_marker : bool = False):
+        self.k = k
+        self.quantum_marker = quantum_marker
+        self.key = None
+
+    def closest(self, search : POISearch, X : float, Y : float, Z : float, container_name : str):
+        """Returns the names and distances of the k closest POIs, closest first (like POISearch.closest)"""
+        if self.key == (search, container_name):
+            qx, qy, qz = self.position
+            moved = sqrt((X - qx)*(X - qx) + (Y - qy)*(Y - qy) + (Z - qz)*(Z - qz))
+            Distances = [sqrt((x - X)*(x - X) + (y - Y)*(y - Y) + (z - Z)*(z - Z)) for x, y, z in self.coordinates]
+            if not Distances or max(Distances) <= self.bound - moved:
+                Order = sorted(range(len(Distances)), key=Distances.__getitem__)
+                return [self.names[i] for i in Order], [Distances[i] for i in Order]
+
+        self.names, self.coordinates, Distances, self.bound = search.closest_rows(X, Y, Z, container_name, self.k, self.quantum_marker)
+        self.key = (search, container_name)
+        self.position = (X, Y, Z)
+        return list(self.names), Distances
@@ -0,0 +1,157 @@
+"""Messages sent by the backend to the frontends.
+
+Protocol 1 (compatibility) : every update is a `New data : {...}` line with all the fields formatted as text.
+Protocol 2 : every update is a JSON line with raw numbers, formatted by the frontend,
+    {"v": 2, "seq": 12, "key": false, "data": {"distance_to_poi": 151.2, ...}}
+  "key" updates (keyframes) hold every field, the others only the fields that changed since the previous update.
+  A keyframe is sent after a change of mode or target and every keyframe_interval updates.
+The other lines ("Mode: ...", "Target: ...", "Command error : ...") are the same in both protocols.
+
+When a frontend reads its socket slower than the updates come, the updates waiting in its Outbox are merged
+into one, so it always gets the latest values instead of an ever growing backlog.
+"""
+import collections
+import json
+import math
+import threading
+
+
+Compatibility_protocol = 1
+Delta_protocol = 2
+Protocol_versions = (Compatibility_protocol, Delta_protocol)
+
+# Never equal to a field value, so that new fields are always sent
+changed_marker = object()
+
+# json.dumps builds a new encoder on every call with non default separators
+Compact_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+
+class DeltaEncoder:
+    """Keeps the last fields sent to a frontend and returns the ones that changed"""
+
+    def __init__(self, keyframe_interval : int = 50, float_digits : int = 6):
+        self.keyframe_interval = keyframe_interval
+        self.float_digits = float_digits
+        self.last_fields = None
+        # Fields as received, a field that did not change is not rounded again
+        self.last_raw = {}
+        self.since_keyframe = 0
+
+    def reset(self):
+        """The next update is a keyframe (new mode, new target)"""
+        self.last_fields = None
+
+    def encode(self, fields : dict):
+        """Returns (keyframe, fields to send), None if nothing changed"""
+        if self.last_fields is None or self.since_keyframe >= self.keyframe_interval:
+            values = self.json_fields(fields)
+            self.last_fields = dict(values)
+            self.last_raw = dict(fields)
+            self.since_keyframe = 0
+            return True, values
+
+        # json_fields inlined : most fields of an update change, one pass over them
+        last_raw, last_fields, digits = self.last_raw, self.last_fields, self.float_digits
+        changed = {}
+        for key, value in fields.items():
+            kind = type(value)
+            # The scalars are compared as received : an unchanged one is not rounded again
+            if (kind is float or kind is str or kind is int) and type(last_raw.get(key)) is kind and last_raw[key] == value:
+                continue
+            last_raw[key] = value
+            if kind is float:
+                value = round(value, digits) if value - value == 0 else None
+            elif kind is not str and kind is not int and value is not None:
+                value = self.json_value(value)
+            if last_fields.get(key, changed_marker) != value:
+                changed[key] = value
+        self.since_keyframe += 1
+        if not changed:
+            return None
+        last_fields.update(changed)
+        return False, changed
+
+
+    def json_fields(self, fields : dict):
+        """json_value of every field, with the common types checked inline (keyframes)"""
+        digits = self.float_digits
+        values = {}
+        for key, value in fields.items():
+            kind = type(value)
+            if kind is float:
+                # value - value is NaN for NaN and the infinities
+                value = round(value, digits) if value - value == 0 else None
+            elif kind is not str and kind is not int and value is not None:
+                value = self.json_value(value)
+            values[key] = value
+        return values
+
+    def json_value(self, value):
+        if isinstance(value, list):
+            # Columns of values (radar) are rounded by their update with numpy, rounding them here one by one costs more than the update
+            if any(isinstance(item, float) and not math.isfinite(item) for item in value):
+                return [None if isinstance(item, float) and not math.isfinite(item) else item for item in value]
+            return value
+        if not isinstance(value, float):
+            return value
+        # NaN and infinities are not valid JSON (and NaN is never equal to itself) : they are sent as null
+        if not math.isfinite(value):
+            return None
+        # Distances are in km : 6 digits are a mm, much more than the precision of /showlocation
+        return round(value, self.float_digits)
+
+
+
+class Outbox:
+    """Lines waiting to be sent to a frontend, consecutive updates not sent yet are merged into one"""
+
+    def __init__(self):
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.coalesced_updates = 0
+
+    def put_line(self, line : str):
+        with self.condition:
+            self.items.append(["line", line])
+            self.condition.notify()
+
+    def put_update(self, keyframe : bool, fields : dict):
+        with self.condition:
+            if self.items and self.items[-1][0] == "update":
+                # The frontend did not take the previous update yet : the new values replace the old ones
+                last = self.items[-1]
+                if keyframe:
+                    # A keyframe holds every field of the new mode or target, the fields of the old one must not remain
+                    last[1] = True
+                    last[2] = dict(fields)
+                else :
+                    last[2].update(fields)
+                self.coalesced_updates += 1
+            else :
+                self.items.append(["update", keyframe, dict(fields)])
+            self.condition.notify()
+
+    def get(self):
+        """Waits for the next item : ["line", text] or ["update", keyframe, fields], None once closed"""
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+
+def update_line(protocol : int, seq : int, keyframe : bool, fields : dict):
+    """Text of an update in a protocol"""
+    if protocol == Compatibility_protocol:
+        return "New data : " + json.dumps(fields)
+    return Compact_encoder.encode({"v": protocol, "seq": seq, "key": keyframe, "data": fields})
@@ -0,0 +1,135 @@
+"""Replays a recorded or synthetic trajectory into the backend and reports the updates per second.
+
+Usage :
+    python replay.py orbit.txt --mode planetary_nav --container Daymar --known true --target "Javelin Wreck"
+    python replay.py Logs/Logs.csv --mode companion --speed 10
+    python replay.py tour.txt --mode companion --port 48601
+
+The input is a Logs.csv file or a file of `[<unix time>] Coordinates: x:.. y:.. z:..` lines (see trajectories.py).
+The samples are run through the update of the mode in this process, headless : the lines for the frontend are
+encoded in the --protocol and dropped. --speed replays them at a multiple of their recorded pace, 0 (the default)
+as fast as possible. With --port the lines are sent instead to a backend started with `--source socket --source_port <port>`.
+The arguments the harness does not know (target of the mode) are the ones of backend.py.
+"""
+import argparse
+import socket
+import sys
+import time
+
+import numpy as np
+
+import backend
+from coordinate_sources import Sample
+from protocol import Compatibility_protocol, Protocol_versions
+from reprocess import is_logs_file, read_coordinates_file, read_logs_file
+
+
+Chunk_size = 32768
+
+
+
+class Null_output(backend.Frontend_output):
+    """Headless frontend : the updates are encoded in its protocol and counted"""
+
+    def __init__(self, protocol : int):
+        super().__init__(protocol)
+        self.updates = 0
+        self.bytes = 0
+
+    def send(self, line : str):
+        pass
+
+    def put_update(self, keyframe : bool, fields : dict):
+        self.updates += 1
+        self.bytes += len(self.update_line(keyframe, fields)) + 1
+
+
+
+def read_samples(path : str, default_time : float):
+    """Returns the (Times, `Coordinates:` texts) of a Logs.csv or coordinates file"""
+    Times, Texts = [], []
+    with open(path, newline='') as f:
+        chunks = read_logs_file(f, Chunk_size) if is_logs_file(path) else read_coordinates_file(f, default_time, Chunk_size)
+        for Runs, Chunk_times, Positions in chunks:
+            Times += Chunk_times.tolist()
+            Texts += [f"Coordinates: x:{x*1000} y:{y*1000} z:{z*1000}" for x, y, z in (Positions).tolist()]
+    return Times, Texts
+
+
+def wait_until(Schedule_time : float):
+    delay = Schedule_time - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+    return max(0.0, -delay)
+
+
+def replay(Times : list, Texts : list, Mode : str, Target : dict, speed : float = 0, protocol : int = Compatibility_protocol):
+    """Runs every sample through the update of a mode, returns the report of the run"""
+    State = backend.new_navigation_state()
+    Output = Null_output(protocol)
+    latencies = np.empty(len(Texts))
+    lag = 0.0
+
+    start = time.perf_counter()
+    for i, (Time, text) in enumerate(zip(Times, Texts)):
+        if speed > 0:
+            lag = max(lag, wait_until(start + (Time - Times[0]) / speed))
+        update_start = time.perf_counter()
+        backend.handle_sample(Sample(text, Time, "replay"), Mode, Target, State, 0, Output)
+        latencies[i] = time.perf_counter() - update_start
+    elapsed = time.perf_counter() - start
+
+    return {
+        "samples": len(Texts),
+        "updates": Output.updates,
+        "elapsed": elapsed,
+        "updates_per_second": Output.updates / elapsed if elapsed > 0 else float("inf"),
+        "p50_us": float(np.percentile(latencies, 50)) * 1e6 if len(Texts) else 0.0,
+        "p99_us": float(np.percentile(latencies, 99)) * 1e6 if len(Texts) else 0.0,
+        "max_lag": lag,
+        "bytes": Output.bytes
+    }
+
+
+def replay_to_socket(Times : list, Texts : list, port : int, speed : float = 0):
+    """Sends the samples to the socket source of a running backend, returns the report of the run"""
+    lag = 0.0
+    with socket.create_connection(("127.0.0.1", port)) as connection:
+        start = time.perf_counter()
+        for Time, text in zip(Times, Texts):
+            if speed > 0:
+                lag = max(lag, wait_until(start + (Time - Times[0]) / speed))
+            connection.sendall((text + "\n").encode("utf-8"))
+        elapsed = time.perf_counter() - start
+    return {"samples": len(Texts), "elapsed": elapsed, "samples_per_second": len(Texts) / elapsed if elapsed > 0 else float("inf"), "max_lag": lag}
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a trajectory into the backend", epilog="The other arguments are the target arguments of backend.py")
+    parser.add_argument("input", type=str)
+    parser.add_argument("--mode", type=str, choices=list(backend.Update_functions), default="companion")
+    parser.add_argument("--speed", type=float, default=0, help="Multiple of the recorded pace, 0 for as fast as possible")
+    parser.add_argument("--protocol", type=int, choices=Protocol_versions, default=Compatibility_protocol)
+    parser.add_argument("--port", type=int, help="Socket source port of a running backend to send the samples to")
+    parser.add_argument("--time", type=float, help="Unix time of the lines without timestamp (now by default)")
+    args, target_arguments = parser.parse_known_args()
+
+    Times, Texts = read_samples(args.input, time.time() if args.time is None else args.time)
+
+    if args.port is not None:
+        report = replay_to_socket(Times, Texts, args.port, args.speed)
+        print(f"{report['samples']} samples sent in {report['elapsed']:.2f} s : {report['samples_per_second']:.0f} samples/s, max lag {report['max_lag']*1000:.1f} ms")
+        return
+
+    Target = backend.get_target(args.mode, backend.parser.parse_args([args.mode] + target_arguments))
+    # numpy and the POI arrays are loaded before the clock starts
+    backend.get_poi_search()
+
+    report = replay(Times, Texts, args.mode, Target, args.speed, args.protocol)
+    print(f"{report['samples']} samples, {report['updates']} updates in {report['elapsed']:.2f} s : {report['updates_per_second']:.0f} updates/s, "
+          f"p50 {report['p50_us']:.1f} us, p99 {report['p99_us']:.1f} us, max lag {report['max_lag']*1000:.1f} ms, {report['bytes']/max(1, report['updates']):.0f} bytes/update", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
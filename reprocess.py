@@ -0,0 +1,261 @@
+"""Offline reprocessing of a Logs.csv file or of a file of `Coordinates:` lines.
+
+Every row is recomputed with the vectorized kernels (navigation_math, day_night, poi_search) on chunks of
+rows, so the memory use does not depend on the size of the input :
+container, local rotated coordinates, latitude/longitude/height, closest POI, closest OMs and day/night state.
+
+Usage :
+    python reprocess.py Logs/Logs.csv -o Logs/Reprocessed.csv
+    python reprocess.py coordinates.txt --time 1700000000
+
+Logs.csv rows are read from their Container, Local_X/Y/Z (km) and Time columns, a `New_Run` row starts a new run.
+A coordinates file has one `Coordinates: x:.. y:.. z:..` line per position (in m) optionally preceded by a unix
+timestamp, lines without timestamp use --time (now by default).
+Distances and heights are in km, times in unix seconds.
+"""
+import argparse
+import csv
+import re
+import sys
+import time
+
+import numpy as np
+
+import backend
+import day_night
+import navigation_math
+from coordinate_sources import parse_coordinates
+
+
+Output_fields = [
+    'Run', 'Time', 'Global_X', 'Global_Y', 'Global_Z', 'Container', 'Local_X', 'Local_Y', 'Local_Z',
+    'Latitude', 'Longitude', 'Height', 'Closest_POI', 'Closest_POI_Distance',
+    'OM1', 'OM1_Distance', 'OM2', 'OM2_Distance', 'OM3', 'OM3_Distance',
+    'State_of_the_day', 'Next_event', 'Next_event_in_minutes'
+]
+
+# km with mm precision, degrees with ~0.1 m precision, times in microseconds
+Row_format = "%d,%.6f,%.6f,%.6f,%.6f,%s,%.6f,%.6f,%.6f,%.7f,%.7f,%.6f,%s,%.6f,%s,%.6f,%s,%.6f,%s,%.6f,%s,%s,%.2f\n"
+Nan_field = re.compile(r"(?<=,)nan(?=[,\n])")
+
+Default_chunk_size = 32768
+
+
+
+#---------------------------------------------------------Readers---------------------------------------------------------------
+
+def read_coordinates_file(lines, default_time : float, chunk_size : int):
+    """Yields (Runs, Times, Global positions) chunks of a file of `Coordinates:` lines"""
+    Runs, Times, Positions = [], [], []
+    for line in lines:
+        line = line.strip()
+        timestamp = default_time
+        if line and not line.startswith("Coordinates:"):
+            first, _, rest = line.partition(" ")
+            try :
+                timestamp = float(first)
+            except ValueError:
+                continue
+            line = rest.strip()
+
+        coordinates = parse_coordinates(line)
+        if coordinates is None:
+            continue
+
+        Runs.append(0)
+        Times.append(timestamp)
+        Positions.append((coordinates["X"], coordinates["Y"], coordinates["Z"]))
+        if len(Positions) >= chunk_size:
+            yield np.array(Runs), np.array(Times), np.array(Positions)
+            Runs, Times, Positions = [], [], []
+
+    if Positions:
+        yield np.array(Runs), np.array(Times), np.array(Positions)
+
+
+def read_logs_file(lines, chunk_size : int):
+    """Yields (Runs, Times, Global positions) chunks of a Logs.csv file, positions are rebuilt from the local coordinates"""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {field: i for i, field in enumerate(header)}
+    container_column = columns["Container"]
+    local_columns = [columns["Local_X"], columns["Local_Y"], columns["Local_Z"]]
+    time_column = columns["Time"]
+
+    run = 0
+    Runs, Times, Names, Locals = [], [], [], []
+    for row in reader:
+        if not row:
+            continue
+        if row[0] == "New_Run":
+            run += 1
+            continue
+        try :
+            Locals.append([float(row[i]) for i in local_columns])
+            Times.append(float(row[time_column]))
+        except (IndexError, ValueError):
+            continue
+        Runs.append(run)
+        Names.append(row[container_column])
+
+        if len(Locals) >= chunk_size:
+            yield logs_chunk(Runs, Times, Names, Locals)
+            Runs, Times, Names, Locals = [], [], [], []
+
+    if Locals:
+        yield logs_chunk(Runs, Times, Names, Locals)
+
+
+def logs_chunk(Runs : list, Times : list, Names : list, Locals : list):
+    """Converts the local coordinates of a chunk of log rows back to global coordinates at their time"""
+    Runs, Times, Names, Locals = np.array(Runs), np.array(Times), np.array(Names, dtype=object), np.array(Locals)
+    Positions = np.full(Locals.shape, np.nan)
+    for name in set(Names):
+        if name not in backend.Database["Containers"]:
+            continue
+        Container = backend.Database["Containers"][name]
+        rows = Names == name
+        Rotation_state = navigation_math.rotation_state_degrees(Times[rows] - backend.Reference_time, Container["Rotation Speed"], Container["Rotation Adjust"])
+        Positions[rows] = navigation_math.local_to_global(Locals[rows], (Container["X"], Container["Y"], Container["Z"]), Rotation_state)
+
+    # Rows of containers that are not in the database anymore are dropped
+    known = ~np.isnan(Positions[:, 0])
+    return Runs[known], Times[known], Positions[known]
+
+
+def is_logs_file(path : str):
+    with open(path, newline='') as f:
+        return f.readline().startswith("Key,")
+
+
+
+#---------------------------------------------------------Processing---------------------------------------------------------------
+
+def closest_oms(Local, Container):
+    """Vectorized get_closest_oms : returns the 3 (names, distances) of the OMs on the side of every position"""
+    OMs = []
+    for axis, (positive, negative) in enumerate([("OM-5", "OM-6"), ("OM-3", "OM-4"), ("OM-1", "OM-2")]):
+        positive_coordinates = np.array([Container["POI"][positive][i] for i in ["X", "Y", "Z"]])
+        negative_coordinates = np.array([Container["POI"][negative][i] for i in ["X", "Y", "Z"]])
+        side = Local[:, axis] >= 0
+        delta = Local - np.where(side[:, None], positive_coordinates, negative_coordinates)
+        OMs.append((np.where(side, positive, negative), np.sqrt(np.einsum("ij,ij->i", delta, delta))))
+    return OMs
+
+
+def csv_field(text : str):
+    """Quotes a name for the CSV output if needed"""
+    if any(character in text for character in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def process_chunk(Runs, Times, Positions, Star_constants : dict, Escaped_names : dict):
+    """Returns the CSV text of the output rows of a chunk"""
+    count = len(Positions)
+    Container_indices = backend.Containers_index.find_many_indices(Positions)
+
+    Container_names = np.full(count, "None", dtype=object)
+    Local = np.full((count, 3), np.nan)
+    Latitude, Longitude, Height = np.full(count, np.nan), np.full(count, np.nan), np.full(count, np.nan)
+    POI_names, POI_distances = np.full(count, "", dtype=object), np.full(count, np.nan)
+    OM_names = [np.full(count, "", dtype=object) for i in range(3)]
+    OM_distances = [np.full(count, np.nan) for i in range(3)]
+    States = np.full(count, day_night.Unknown_state)
+    Events = np.full(count, len(day_night.Events) - 1)
+    Event_times = np.full(count, np.nan)
+
+    Search = backend.get_poi_search()
+    for index in np.unique(Container_indices):
+        if index < 0:
+            continue
+        name = backend.Containers_index.names[index]
+        Container = backend.Database["Containers"][name]
+        rows = Container_indices == index
+        Time_passed = Times[rows] - backend.Reference_time
+
+        Container_names[rows] = csv_field(name)
+        Rotation_state = navigation_math.rotation_state_degrees(Time_passed, Container["Rotation Speed"], Container["Rotation Adjust"])
+        Container_local = navigation_math.global_to_local(Positions[rows], (Container["X"], Container["Y"], Container["Z"]), Rotation_state)
+        Local[rows] = Container_local
+
+        Container_latitude, Container_longitude, Container_height = navigation_math.lat_long_height(Container_local, Container["Body Radius"])
+        Latitude[rows], Longitude[rows], Height[rows] = Container_latitude, Container_longitude, Container_height
+
+        closest, distances = Search.closest_many(Container_local, name)
+        if closest[0] >= 0:
+            # Containers without POI get -1 for every row
+            if name not in Escaped_names:
+                Escaped_names[name] = np.array([csv_field(POI_name) for POI_name in Search.containers[name][False][0]], dtype=object)
+            POI_names[rows] = Escaped_names[name][closest]
+            POI_distances[rows] = distances
+
+        if all(f"OM-{i}" in Container["POI"] for i in range(1, 7)):
+            for i, (names, distances) in enumerate(closest_oms(Container_local, Container)):
+                OM_names[i][rows] = names
+                OM_distances[i][rows] = distances
+
+        if name not in Star_constants:
+            Star_constants[name] = day_night.star_constants(Container, backend.Database["Containers"]["Stanton"])
+        States[rows], Events[rows], Event_times[rows] = day_night.day_states(Container_latitude, Container_longitude, Container_height, Star_constants[name], Time_passed)
+
+    State_names = np.array(day_night.States_of_the_day, dtype=object)[States]
+    Event_names = np.array(day_night.Events, dtype=object)[Events]
+
+    columns = [
+        Runs, Times, *Positions.T, Container_names, *Local.T, Latitude, Longitude, Height, POI_names, POI_distances,
+        OM_names[0], OM_distances[0], OM_names[1], OM_distances[1], OM_names[2], OM_distances[2],
+        State_names, Event_names, Event_times
+    ]
+    # %-formatting of whole rows is several times faster than the float repr of csv.writer
+    text = "".join([Row_format % row for row in zip(*[column.tolist() for column in columns])])
+    # Positions outside of any container have empty fields instead of nan
+    return Nan_field.sub("", text)
+
+
+def reprocess(input_path : str, output, default_time : float = None, chunk_size : int = Default_chunk_size):
+    """Streams the reprocessed rows of an input file into an opened output file, returns the number of rows"""
+    if default_time is None:
+        default_time = time.time()
+
+    with open(input_path, newline='') as f:
+        if is_logs_file(input_path):
+            chunks = read_logs_file(f, chunk_size)
+        else:
+            chunks = read_coordinates_file(f, default_time, chunk_size)
+
+        writer = csv.writer(output)
+        writer.writerow(Output_fields)
+
+        Star_constants = {}
+        Escaped_names = {}
+        rows = 0
+        for Runs, Times, Positions in chunks:
+            output.write(process_chunk(Runs, Times, Positions, Star_constants, Escaped_names))
+            rows += len(Positions)
+
+    return rows
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recomputes the navigation data of every position of a Logs.csv or `Coordinates:` file")
+    parser.add_argument("input", type=str)
+    parser.add_argument("-o", "--output", type=str, help="Output CSV file (stdout by default)")
+    parser.add_argument("--time", type=float, help="Unix time of the coordinates without timestamp (now by default)")
+    parser.add_argument("--chunk_size", type=int, default=Default_chunk_size)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.output:
+        with open(args.output, "w", newline='') as output:
+            rows = reprocess(args.input, output, args.time, args.chunk_size)
+    else:
+        rows = reprocess(args.input, sys.stdout, args.time, args.chunk_size)
+    print(f"{rows} rows reprocessed in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Visiting order of several POIs of a container, by great-circle distance on its surface.
+
+Usage :
+    python route_planner.py --container Daymar --pois "Javelin Wreck" "Shubin Mining Facility SCD-1" "Kudre Ore"
+    python route_planner.py --container Daymar --all_pois --start_lat 10 --start_long 20
+
+The distances between the POIs of a container are read from the (P, P) great-circle matrix of the POI distance
+cache (poi_distances.py). A route starts from a nearest neighbour tour of the stops and is improved with 2-opt
+(reversing a part of it) and Or-opt (moving 1 to 3 consecutive stops elsewhere) until none of them shortens it,
+then perturbed and improved again while that finds shorter routes (within 80 ms). Routes are open (they end at the last stop) unless
+closed, and start at the given position (the player) or at the best stop.
+In the app, the `set_route` command of the daemon (or --route of planetary_nav) follows the stops as successive
+planetary_nav targets.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from database_snapshot import load_database
+from navigation_math import great_circle_distances
+from poi_distances import POIDistanceCache, load_distance_cache
+
+
+# Max number of consecutive stops moved by Or-opt
+Or_opt_segment = 3
+
+# Added to the distances of the start to force it next to the dummy node of open routes
+Fixed_start_penalty = 1e9
+
+
+
+#-----------------------------------------------------Heuristics--------------------------------------------------------------
+# On closed tours given as lists of node indices of a nested list distance matrix D, tour[0] never moves
+
+def tour_length(tour : list, D : list):
+    return sum(D[tour[i - 1]][tour[i]] for i in range(len(tour)))
+
+
+def nearest_neighbour_tour(D : list, start : int = 0):
+    tour = [start]
+    left = set(range(len(D))) - {start}
+    while left:
+        row = D[tour[-1]]
+        closest = min(left, key=row.__getitem__)
+        tour.append(closest)
+        left.remove(closest)
+    return tour
+
+
+def two_opt(tour : list, D : list, deadline : float = None):
+    """Reverses parts of the tour while it shortens it, returns True if it changed"""
+    n = len(tour)
+    changed = False
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 2):
+            a, b = tour[i], tour[i + 1]
+            Da = D[a]
+            Dab = Da[b]
+            for j in range(i + 2, n if i > 0 else n - 1):
+                c, d = tour[j], tour[(j + 1) % n]
+                # Edges a-b and c-d become a-c and b-d
+                if Da[c] + D[b][d] - Dab - D[c][d] < -1e-9:
+                    tour[i + 1:j + 1] = tour[j:i:-1]
+                    b = tour[i + 1]
+                    Dab = Da[b]
+                    improved = changed = True
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+    return changed
+
+
+def or_opt(tour : list, D : list, deadline : float = None):
+    """Moves segments of 1 to Or_opt_segment stops (reversed or not) while it shortens the tour, returns True if it changed"""
+    n = len(tour)
+    changed = False
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, Or_opt_segment + 1):
+            for i in range(1, n - length + 1):
+                first, last = tour[i], tour[i + length - 1]
+                previous, following = tour[i - 1], tour[(i + length) % n]
+                removal_gain = D[previous][first] + D[last][following] - D[previous][following]
+                if removal_gain <= 1e-9:
+                    continue
+
+                best = None
+                for j in range(n):
+                    # Edge c-d of the tour without the segment
+                    if i - 1 <= j <= i + length - 1:
+                        continue
+                    c, d = tour[j], tour[(j + 1) % n]
+                    forward = D[c][first] + D[last][d] - D[c][d]
+                    backward = D[c][last] + D[first][d] - D[c][d]
+                    cost, reverse = (forward, False) if forward <= backward else (backward, True)
+                    if cost < removal_gain - 1e-9 and (best is None or cost < best[0]):
+                        best = (cost, j, reverse)
+
+                if best is not None:
+                    cost, j, reverse = best
+                    segment = tour[i:i + length]
+                    if reverse:
+                        segment.reverse()
+                    insert_after = tour[j]
+                    del tour[i:i + length]
+                    position = tour.index(insert_after) + 1
+                    tour[position:position] = segment
+                    improved = changed = True
+                    break
+            if improved:
+                break
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+    return changed
+
+
+def local_search(tour : list, D : list, deadline : float):
+    """2-opt and Or-opt until neither helps (or the deadline)"""
+    while time.perf_counter() < deadline:
+        changed = two_opt(tour, D, deadline)
+        changed = or_opt(tour, D, deadline) or changed
+        if not changed:
+            break
+    return tour
+
+
+def perturbed(tour : list, random : np.random.Generator):
+    """Copy of the tour with a double bridge move (3 random cuts, the parts swapped), shuffled if it is too short"""
+    stops = tour[1:]
+    if len(stops) < 8:
+        random.shuffle(stops)
+        return [tour[0]] + stops
+    a, b, c = sorted(random.choice(np.arange(1, len(stops)), 3, replace=False).tolist())
+    return [tour[0]] + stops[:a] + stops[b:c] + stops[a:b] + stops[c:]
+
+
+def optimize_tour(D : list, time_limit : float = 0.08, patience : int = 50, seed : int = 0):
+    """Nearest neighbour tour from node 0 improved by 2-opt and Or-opt, then perturbed and improved again
+    while it finds shorter tours (up to `patience` tries without progress or the time limit)"""
+    deadline = time.perf_counter() + time_limit
+    random = np.random.default_rng(seed)
+    best = local_search(nearest_neighbour_tour(D, 0), D, deadline)
+    best_length = tour_length(best, D)
+
+    tries = 0
+    while tries < patience and len(best) > 3 and time.perf_counter() < deadline:
+        tour = local_search(perturbed(best, random), D, deadline)
+        length = tour_length(tour, D)
+        if length < best_length - 1e-9:
+            best, best_length, tries = tour, length, 0
+        else :
+            tries += 1
+    return best
+
+
+
+#-----------------------------------------------------Routes--------------------------------------------------------------
+
+def plan_route(Matrices : POIDistanceCache, container_name : str, poi_names : list, Start = None, closed : bool = False, optimize : bool = True, time_limit : float = 0.08):
+    """Returns {"stops": POI names in visiting order, "legs": km of each leg (from the start for the first one), "total": km}
+    Start is the local position of the player (the route starts at the best stop without it)"""
+    Names, Rows, Coordinates, Matrix = Matrices.get(container_name)
+    unknown = [name for name in poi_names if name not in Rows]
+    if unknown:
+        raise ValueError(f"Unknown POIs in {container_name} : {', '.join(unknown)}")
+    # Each stop once, in the given order
+    poi_names = list(dict.fromkeys(poi_names))
+    Selection = [Rows[name] for name in poi_names]
+    D = Matrix[np.ix_(Selection, Selection)]
+
+    Start_distances = None
+    if Start is not None:
+        Body_radius = Matrices.Database["Containers"][container_name]["Body Radius"]
+        Start_distances = great_circle_distances([Start], Coordinates[Selection], Body_radius)[0]
+
+    if optimize and len(poi_names) > 1:
+        order = optimize_order(D, Start_distances, closed, time_limit)
+    else :
+        order = list(range(len(poi_names)))
+
+    legs = [float(D[order[i - 1], order[i]]) for i in range(1, len(order))]
+    if Start_distances is not None and order:
+        legs.insert(0, float(Start_distances[order[0]]))
+    else :
+        legs.insert(0, 0.0)
+    if closed and order:
+        legs.append(float(Start_distances[order[-1]] if Start_distances is not None else D[order[-1], order[0]]))
+
+    return {"stops": [poi_names[i] for i in order], "legs": legs, "total": sum(legs)}
+
+
+def optimize_order(D, Start_distances = None, closed : bool = False, time_limit : float = 0.08):
+    """Order of the stops of a (N, N) distance matrix, from a start at Start_distances of them if given"""
+    n = len(D)
+    if closed and Start_distances is None:
+        return optimize_tour(D.tolist(), time_limit)
+
+    # Node 0 is the start, or for open routes without one a dummy node at 0 km of every stop (the free start)
+    size = n + 2 if Start_distances is not None and not closed else n + 1
+    Full = np.zeros((size, size))
+    Full[1:n + 1, 1:n + 1] = D
+    if Start_distances is not None:
+        Full[0, 1:n + 1] = Full[1:n + 1, 0] = Start_distances
+    if size == n + 2:
+        # The end of an open route from the start goes back to it through a dummy node at 0 km of every stop,
+        # kept next to the start by a penalty on its other edges
+        Full[0, 1:n + 1] += Fixed_start_penalty
+        Full[1:n + 1, 0] += Fixed_start_penalty
+
+    tour = optimize_tour(Full.tolist(), time_limit)
+    # Tours go both ways : read it from the start away from the dummy node
+    if size == n + 2 and tour[1] == n + 1:
+        tour = [0] + tour[:0:-1]
+    return [node - 1 for node in tour if 1 <= node <= n]
+
+
+
+class Route:
+    """Stops of a route followed by planetary_nav, the target moves to the next stop once the player is close to the current one"""
+
+    def __init__(self, Targets : list, arrival_distance : float = 1.0):
+        self.Targets = Targets
+        self.arrival_distance = arrival_distance
+        self.index = 0
+
+    def current(self):
+        return self.Targets[self.index] if self.index < len(self.Targets) else None
+
+    def arrived(self, distance_to_target : float):
+        return self.current() is not None and distance_to_target is not None and distance_to_target <= self.arrival_distance
+
+    def advance(self):
+        """Moves to the next stop, returns it (None after the last one)"""
+        self.index += 1
+        return self.current()
+
+    def describe(self):
+        return " -> ".join(Target["Name"] for Target in self.Targets[self.index:])
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Visiting order of POIs of a container")
+    parser.add_argument("--container", type=str, required=True)
+    pois = parser.add_mutually_exclusive_group(required=True)
+    pois.add_argument("--pois", type=str, nargs="+")
+    pois.add_argument("--all_pois", action="store_true")
+    parser.add_argument("--start_lat", type=float, help="Latitude of the start (the best stop by default)")
+    parser.add_argument("--start_long", type=float)
+    parser.add_argument("--closed", action="store_true", help="Come back to the start (or the first stop)")
+    args = parser.parse_args()
+
+    Database = load_database('Database.json')
+    Matrices = load_distance_cache(Database)
+    Names = Matrices.get(args.container)[0]
+    poi_names = list(Names) if args.all_pois else args.pois
+
+    Start = None
+    if args.start_lat is not None and args.start_long is not None:
+        from navigation_math import lat_long_height_to_local
+        Start = lat_long_height_to_local(args.start_lat, args.start_long, 0, Database["Containers"][args.container]["Body Radius"])
+
+    start_time = time.perf_counter()
+    Route_plan = plan_route(Matrices, args.container, poi_names, Start, args.closed)
+    elapsed = time.perf_counter() - start_time
+
+    for i, (stop, leg) in enumerate(zip(Route_plan["stops"], Route_plan["legs"])):
+        print(f"{i+1:>3}. {stop} ({leg:.3f} km)")
+    if args.closed:
+        print(f"     back to the start ({Route_plan['legs'][-1]:.3f} km)")
+    print(f"Total : {Route_plan['total']:.3f} km for {len(Route_plan['stops'])} stops, planned in {elapsed*1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
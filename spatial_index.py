@@ -0,0 +1,90 @@
+"""Spatial index of the containers used to find the body a position belongs to.
+
+A container "owns" every position within 3 * its OM Radius of its centre. When spheres overlap (a moon
+close to its planet) the innermost body, the one with the smallest sphere, wins.
+The spheres are registered in a uniform grid whose cells are at least as large as the biggest sphere,
+so a lookup is one dict access and a distance check on the few spheres sharing that cell.
+"""
+from math import floor
+
+
+Influence_factor = 3
+
+
+
+class ContainerIndex:
+    """Bounding-sphere index of the containers of a database"""
+
+    def __init__(self, Database, influence_factor : float = Influence_factor):
+        Containers = Database["Containers"]
+
+        bodies = []
+        for name in Containers:
+            radius = influence_factor * Containers[name]["OM Radius"]
+            # Lagrange points and the star have no OM Radius, nothing can be "in" them
+            if radius > 0:
+                bodies.append((radius, name, Containers[name]["X"], Containers[name]["Y"], Containers[name]["Z"]))
+
+        # Smallest spheres first : the first match of a lookup is the innermost body
+        bodies.sort(key=lambda body: body[0])
+
+        self.names = [body[1] for body in bodies]
+        self.radii = [body[0] for body in bodies]
+        self.centres = [(body[2], body[3], body[4]) for body in bodies]
+
+        self.cell_size = 2 * max(self.radii) if bodies else 1.0
+        self.cells = {}
+        for i, (radius, centre) in enumerate(zip(self.radii, self.centres)):
+            low = [floor((c - radius) / self.cell_size) for c in centre]
+            high = [floor((c + radius) / self.cell_size) for c in centre]
+            for cx in range(low[0], high[0] + 1):
+                for cy in range(low[1], high[1] + 1):
+                    for cz in range(low[2], high[2] + 1):
+                        self.cells.setdefault((cx, cy, cz), []).append(i)
+
+        self.arrays = None
+
+    def find_index(self, X : float, Y : float, Z : float):
+        """Returns the position in self.names of the innermost body containing the point, or -1"""
+        size = self.cell_size
+        candidates = self.cells.get((floor(X / size), floor(Y / size), floor(Z / size)))
+        if candidates is None:
+            return -1
+        for i in candidates:
+            cx, cy, cz = self.centres[i]
+            radius = self.radii[i]
+            if (X - cx)**2 + (Y - cy)**2 + (Z - cz)**2 <= radius * radius:
+                return i
+        return -1
+
+    def find(self, X : float, Y : float, Z : float):
+        """Returns the name of the innermost container containing the point, or None"""
+        i = self.find_index(X, Y, Z)
+        return self.names[i] if i >= 0 else None
+
+    def find_many_indices(self, positions, chunk_size : int = 65536):
+        """Classifies a (N, 3) array of global positions, returns the index in self.names of each one (-1 if none)"""
+        import numpy as np
+
+        if self.arrays is None:
+            self.arrays = (np.array(self.centres, dtype=np.float64).reshape(-1, 3), np.array(self.radii, dtype=np.float64)**2)
+        centres, radii2 = self.arrays
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        result = np.full(len(positions), -1, dtype=np.int64)
+        if len(centres) == 0:
+            return result
+
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start:start + chunk_size]
+            distances2 = ((chunk[:, None, :] - centres[None, :, :])**2).sum(axis=2)
+            inside = distances2 <= radii2[None, :]
+            # Bodies are sorted by radius so the first True of a row is the innermost body
+            first = inside.argmax(axis=1)
+            result[start:start + chunk_size] = np.where(inside.any(axis=1), first, -1)
+
+        return result
+
+    def find_many(self, positions, chunk_size : int = 65536):
+        """Classifies a (N, 3) array of global positions, returns the container name of each one (None if none)"""
+        return [self.names[i] if i >= 0 else None for i in self.find_many_indices(positions, chunk_size)]
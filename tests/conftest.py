@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules of the backend are flat files at the root of the repository, and backend.py reads settings.json and
+# Database.json from the working directory
+Root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, Root)
+os.chdir(Root)
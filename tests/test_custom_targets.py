@@ -0,0 +1,88 @@
+"""OM-distance targets : the POIs of the database found back from their distances to 3 OMs and their height, and the
+triplets that cannot locate a single position refused."""
+import itertools
+import json
+import os
+
+import numpy as np
+import pytest
+
+import custom_targets
+import navigation_math
+
+
+Database_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Database.json")
+with open(Database_path) as f:
+    Database = json.load(f)
+
+Containers = ["Daymar", "Yela", "Hurston", "ArcCorp"]
+
+Triplets = list(itertools.combinations(custom_targets.OM_names, 3))
+
+def has_opposite_pair(OMs):
+    return any({f"OM-{2*k + 1}", f"OM-{2*k + 2}"} <= set(OMs) for k in range(3))
+
+
+def pois(Container):
+    """(N, 3) local positions and (N,) heights of the POIs of a container that are not OMs"""
+    Positions = np.array([[POI[axis] for axis in ["X", "Y", "Z"]] for name, POI in Container["POI"].items() if name not in custom_targets.OM_names])
+    return Positions, navigation_math.vector_norm(Positions) - Container["Body Radius"]
+
+
+def om_distances(Container, Positions, OMs):
+    Centres = custom_targets.om_positions(Container)[[custom_targets.OM_names.index(name) for name in OMs]]
+    # Distances and heights are read with 10 m steps in the game
+    return np.round(navigation_math.vector_norm(Positions[:, None, :] - Centres), 2)
+
+
+
+@pytest.mark.parametrize("container_name", Containers)
+@pytest.mark.parametrize("OMs", [OMs for OMs in Triplets if not has_opposite_pair(OMs)], ids="-".join)
+def test_pois_are_found_back(container_name, OMs):
+    Container = Database["Containers"][container_name]
+    Positions, Heights = pois(Container)
+    Solved, Residuals, Ambiguous = custom_targets.solve_oms(Container, [OMs] * len(Positions), om_distances(Container, Positions, OMs), np.round(Heights, 2))
+    assert not Ambiguous.any()
+    assert (navigation_math.vector_norm(Solved - Positions) < 0.05).all()
+    assert (Residuals < 0.02).all()
+
+
+@pytest.mark.parametrize("container_name", Containers)
+@pytest.mark.parametrize("OMs", [OMs for OMs in Triplets if has_opposite_pair(OMs)], ids="-".join)
+def test_opposite_pairs_are_ambiguous(container_name, OMs):
+    """The plane of the 3 OMs contains the centre : only the POIs on that plane have a single position"""
+    Container = Database["Containers"][container_name]
+    Positions, Heights = pois(Container)
+    Solved, Residuals, Ambiguous = custom_targets.solve_oms(Container, [OMs] * len(Positions), om_distances(Container, Positions, OMs), np.round(Heights, 2))
+    assert (navigation_math.vector_norm(Solved[~Ambiguous] - Positions[~Ambiguous]) < 0.2).all()
+    assert Ambiguous.sum() >= len(Positions) - 2
+
+    # The POI furthest from the planes of the axes
+    Position = Positions[np.argmax(np.abs(Positions).min(axis=1))]
+    Distances = om_distances(Container, Position[None, :], OMs)[0].tolist()
+    with pytest.raises(ValueError):
+        custom_targets.target_from_oms(Container, list(OMs), Distances, float(navigation_math.vector_norm(Position) - Container["Body Radius"]))
+
+
+@pytest.mark.parametrize("OMs", [["OM-1", "OM-1", "OM-3"], ["OM-3", "OM-5", "om3"], ["om5", "OM-5", "OM 5"]])
+def test_duplicate_oms_are_refused(OMs):
+    Container = Database["Containers"]["Daymar"]
+    Solved, Residuals, Ambiguous = custom_targets.solve_oms(Container, [OMs], [[300.0, 300.0, 300.0]], [1.0])
+    assert Ambiguous[0] and np.isnan(Solved[0]).all()
+    with pytest.raises(ValueError):
+        custom_targets.target_from_oms(Container, OMs, [300.0, 300.0, 300.0], 1.0)
+
+
+def test_height_error_is_in_the_residual():
+    Container = Database["Containers"]["Daymar"]
+    Positions, Heights = pois(Container)
+    OMs = ["OM-1", "OM-3", "OM-5"]
+    Distances = om_distances(Container, Positions[:1], OMs)
+    Exact = custom_targets.solve_oms(Container, [OMs], Distances, Heights[:1])[1][0]
+    Off = custom_targets.solve_oms(Container, [OMs], Distances, Heights[:1] + 5)[1][0]
+    assert Off > Exact + 1
+
+    target = custom_targets.target_from_oms(Container, OMs, Distances[0].tolist(), float(Heights[0]))
+    assert np.allclose([target["X"], target["Y"], target["Z"]], Positions[0], atol=0.05)
+    with pytest.raises(ValueError):
+        custom_targets.target_from_oms(Container, OMs, Distances[0].tolist(), float(Heights[0]) + 50)
@@ -0,0 +1,39 @@
+"""Commands of the daemon frontends : the route of set_route is planned before the sessions lock is taken."""
+import pytest
+
+import backend
+
+
+Route_command = {"command": "set_route", "container": "Daymar", "pois": ["Javelin Wreck", "Shubin Mining Facility SCD-1"], "from_player": False}
+
+
+@pytest.fixture
+def session():
+    Session = backend.Frontend_session(None)
+    backend.handle_command(Session, {"command": "set_mode", "mode": "planetary_nav"})
+    return Session
+
+
+def test_planned_route_is_swapped_in(session, monkeypatch):
+    Planned_route = backend.plan_session_route(session, Route_command)
+
+    def get_route(*args):
+        raise AssertionError("the route was already planned")
+    monkeypatch.setattr(backend, "get_route", get_route)
+
+    backend.handle_command(session, Route_command, Planned_route=Planned_route)
+    assert session.Route is Planned_route[0]
+    assert session.Target["Name"] == session.Route.current()["Name"]
+
+
+def test_route_is_planned_again_after_a_reload(session):
+    Route, total, Source_hash = backend.plan_session_route(session, Route_command)
+    backend.handle_command(session, Route_command, Planned_route=(Route, total, "database before the reload"))
+    assert session.Route is not Route
+    assert [Stop["Name"] for Stop in session.Route.Targets] == [Stop["Name"] for Stop in Route.Targets]
+
+
+def test_routes_need_planetary_nav(session):
+    backend.handle_command(session, {"command": "set_mode", "mode": "companion"})
+    with pytest.raises(ValueError):
+        backend.plan_session_route(session, Route_command)
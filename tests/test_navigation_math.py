@@ -0,0 +1,97 @@
+"""The scalar functions used by the backend must give the same results as the array functions of navigation_math,
+over the POIs of the database and random positions around every container."""
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+import navigation_math
+import navigation_scalar
+
+
+Database_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Database.json")
+with open(Database_path) as f:
+    Database = json.load(f)
+
+Containers = [Container for Container in Database["Containers"].values() if Container["Name"] != "Stanton"]
+
+# Times since the 2020-01-01 reference, a few years of rotations
+Random = random.Random(2020)
+Times = [Random.uniform(0, 4 * 365 * 86400) for i in range(8)]
+
+
+def random_positions(Container, count : int = 16):
+    """Global positions from the centre of the container out to its grid"""
+    Radius = max(Container["Grid Radius"], Container["Body Radius"], 1.0)
+    for i in range(count):
+        Local = [Random.uniform(-Radius, Radius) for axis in range(3)]
+        yield Container["X"] + Local[0], Container["Y"] + Local[1], Container["Z"] + Local[2]
+
+
+def poi_positions(Container):
+    """Local rotated coordinates of the POIs of the container"""
+    return [(POI["X"], POI["Y"], POI["Z"]) for POI in Container["POI"].values()]
+
+
+def assert_close(scalar, array):
+    assert np.allclose(scalar, array, rtol=1e-12, atol=1e-9)
+
+
+
+@pytest.mark.parametrize("Container", Containers, ids=lambda Container: Container["Name"])
+def test_global_to_local(Container):
+    Positions = list(random_positions(Container))
+    Centre = (Container["X"], Container["Y"], Container["Z"])
+    for Time_passed in Times:
+        Rotation_state = navigation_math.rotation_state_degrees(Time_passed, Container["Rotation Speed"], Container["Rotation Adjust"])
+        assert_close(navigation_scalar.rotation_state_degrees(Time_passed, Container["Rotation Speed"], Container["Rotation Adjust"]), Rotation_state)
+
+        Locals = navigation_math.global_to_local(Positions, Centre, Rotation_state)
+        for (X, Y, Z), Local in zip(Positions, Locals):
+            assert_close(navigation_scalar.xyz(navigation_scalar.get_local_rotated_coordinates(Time_passed, X, Y, Z, Container)), Local)
+
+
+@pytest.mark.parametrize("Container", Containers, ids=lambda Container: Container["Name"])
+def test_lat_long_height(Container):
+    Locals = poi_positions(Container) + [(X - Container["X"], Y - Container["Y"], Z - Container["Z"]) for X, Y, Z in random_positions(Container)]
+    Latitudes, Longitudes, Heights = navigation_math.lat_long_height(Locals, Container["Body Radius"])
+    for (X, Y, Z), Latitude, Longitude, Height in zip(Locals, Latitudes, Longitudes, Heights):
+        assert_close(navigation_scalar.get_lat_long_height(X, Y, Z, Container), [Latitude, Longitude, Height])
+
+
+@pytest.mark.parametrize("Container", Containers, ids=lambda Container: Container["Name"])
+def test_bearing(Container):
+    Targets = poi_positions(Container)
+    if not Targets:
+        pytest.skip("no POI")
+    Latitudes, Longitudes, Heights = navigation_math.lat_long_height(Targets, Container["Body Radius"])
+    for X, Y, Z in random_positions(Container, 4):
+        Latitude, Longitude, Height = navigation_scalar.get_lat_long_height(X - Container["X"], Y - Container["Y"], Z - Container["Z"], Container)
+        Bearings = navigation_math.bearing(Latitude, Longitude, Latitudes, Longitudes)
+        for Target_latitude, Target_longitude, Bearing in zip(Latitudes, Longitudes, Bearings):
+            assert_close(navigation_scalar.get_bearing(Latitude, Longitude, float(Target_latitude), float(Target_longitude)), Bearing)
+
+
+def test_vectors():
+    Vectors = [tuple(Random.uniform(-1e6, 1e6) for axis in range(3)) for i in range(64)] + [(0.0, 0.0, 0.0)]
+    Others = Vectors[1:] + Vectors[:1]
+    Angles = navigation_math.angle_between_vectors(Vectors, Others)
+    Norms = navigation_math.vector_norm(Vectors)
+    Products = navigation_math.vector_product(Vectors, Others)
+    for a, b, Angle, Norm, Product in zip(Vectors, Others, Angles, Norms, Products):
+        a, b = navigation_scalar.xyz_dict(a), navigation_scalar.xyz_dict(b)
+        assert_close(navigation_scalar.angle_between_vectors(a, b), Angle)
+        assert_close(navigation_scalar.vector_norm(a), Norm)
+        assert np.isclose(navigation_scalar.vector_product(a, b), Product, rtol=1e-9)
+
+    for a in Vectors:
+        Angle = Random.uniform(-2 * np.pi, 2 * np.pi)
+        assert_close(navigation_scalar.xyz(navigation_scalar.rotate_point_2D(navigation_scalar.xyz_dict(a), Angle)), navigation_math.rotate_z(a, Angle))
+
+
+def test_backend_uses_the_scalar_module():
+    backend = pytest.importorskip("backend")
+    for name in ("vector_norm", "angle_between_vectors", "rotate_point_2D", "get_local_rotated_coordinates", "get_lat_long_height", "get_bearing"):
+        assert getattr(backend, name) is getattr(navigation_scalar, name)
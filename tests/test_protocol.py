@@ -0,0 +1,105 @@
+"""Delta encoding of the updates of protocol 2 and coalescing of the updates a frontend did not read yet."""
+import json
+import math
+import threading
+
+from protocol import Compatibility_protocol, Delta_protocol, DeltaEncoder, Outbox, update_line
+
+
+
+def test_first_update_is_a_keyframe():
+    encoder = DeltaEncoder()
+    assert encoder.encode({"distance_to_poi": 1.5, "target": "Javelin Wreck"}) == (True, {"distance_to_poi": 1.5, "target": "Javelin Wreck"})
+
+
+def test_only_changed_fields_are_sent():
+    encoder = DeltaEncoder()
+    encoder.encode({"distance_to_poi": 1.5, "target": "Javelin Wreck"})
+    assert encoder.encode({"distance_to_poi": 1.25, "target": "Javelin Wreck"}) == (False, {"distance_to_poi": 1.25})
+    assert encoder.encode({"distance_to_poi": 1.25, "target": "Javelin Wreck"}) is None
+    # A field that was not sent before is sent even if it is None
+    assert encoder.encode({"distance_to_poi": 1.25, "target": "Javelin Wreck", "ETA": None}) == (False, {"ETA": None})
+
+
+def test_nan_and_infinities_are_null():
+    encoder = DeltaEncoder()
+    keyframe, fields = encoder.encode({"a": math.nan, "b": math.inf, "c": [1.0, math.nan, -math.inf], "d": 2.0})
+    assert fields == {"a": None, "b": None, "c": [1.0, None, None], "d": 2.0}
+    json.loads(update_line(Delta_protocol, 0, keyframe, fields))
+    # NaN is never equal to itself : a field that stays NaN is not sent again
+    assert encoder.encode({"a": math.nan, "b": math.inf, "c": [1.0, math.nan, -math.inf], "d": 2.0}) is None
+
+
+def test_floats_are_rounded():
+    encoder = DeltaEncoder(float_digits=3)
+    assert encoder.encode({"a": 1.23456})[1] == {"a": 1.235}
+    # Changes under the precision are not sent
+    assert encoder.encode({"a": 1.2349}) is None
+    # but they add up
+    assert encoder.encode({"a": 1.2344}) == (False, {"a": 1.234})
+
+
+def test_keyframe_interval():
+    encoder = DeltaEncoder(keyframe_interval=3)
+    keyframes = [encoder.encode({"a": float(i)})[0] for i in range(9)]
+    assert keyframes == [True, False, False, False, True, False, False, False, True]
+
+
+def test_reset_sends_a_keyframe():
+    encoder = DeltaEncoder()
+    encoder.encode({"a": 1.0, "b": 2.0})
+    encoder.reset()
+    assert encoder.encode({"a": 1.0, "c": 3.0}) == (True, {"a": 1.0, "c": 3.0})
+    assert encoder.encode({"a": 1.0, "c": 4.0}) == (False, {"c": 4.0})
+
+
+
+def test_outbox_keeps_the_order_of_lines_and_updates():
+    outbox = Outbox()
+    outbox.put_update(True, {"a": 1})
+    outbox.put_line("Mode: radar")
+    outbox.put_update(False, {"a": 2})
+    assert [outbox.get(), outbox.get(), outbox.get()] == [["update", True, {"a": 1}], ["line", "Mode: radar"], ["update", False, {"a": 2}]]
+    assert outbox.coalesced_updates == 0
+
+
+def test_outbox_merges_pending_deltas():
+    outbox = Outbox()
+    outbox.put_update(True, {"a": 1, "b": 1})
+    outbox.put_update(False, {"a": 2})
+    outbox.put_update(False, {"c": 3})
+    assert outbox.get() == ["update", True, {"a": 2, "b": 1, "c": 3}]
+    assert outbox.coalesced_updates == 2
+
+
+def test_outbox_keyframe_replaces_pending_fields():
+    """A keyframe after a change of mode must not carry the fields of the previous mode"""
+    outbox = Outbox()
+    outbox.put_update(False, {"player_OM1": 1, "ETA": 3})
+    outbox.put_update(True, {"radar": [1]})
+    assert outbox.get() == ["update", True, {"radar": [1]}]
+
+
+def test_outbox_does_not_keep_a_reference_to_the_fields():
+    outbox = Outbox()
+    fields = {"a": 1}
+    outbox.put_update(True, fields)
+    outbox.put_update(False, {"a": 2})
+    assert fields == {"a": 1}
+
+
+def test_outbox_get_waits_and_close_ends_it():
+    outbox = Outbox()
+    items = []
+    reader = threading.Thread(target=lambda: items.extend([outbox.get(), outbox.get()]))
+    reader.start()
+    outbox.put_line("Target: Javelin Wreck")
+    outbox.close()
+    reader.join(5)
+    assert not reader.is_alive()
+    assert items == [["line", "Target: Javelin Wreck"], None]
+
+
+def test_update_lines():
+    assert update_line(Compatibility_protocol, 4, True, {"a": 1}) == 'New data : {"a": 1}'
+    assert json.loads(update_line(Delta_protocol, 4, False, {"a": 1})) == {"v": 2, "seq": 4, "key": False, "data": {"a": 1}}
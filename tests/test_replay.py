@@ -0,0 +1,46 @@
+"""Smoke run of replay.py : a synthetic tour through every mode, including the samples outside of the containers and
+the targets in the containers without OMs (Lagrange points)."""
+import pytest
+
+import backend
+import replay
+import trajectories
+from protocol import Protocol_versions
+
+
+Start_time = 1.7e9
+
+
+@pytest.fixture(scope="module")
+def samples(tmp_path_factory):
+    """(Times, Texts) of a tour of two moons, then a quantum jump out to a Lagrange point, read back by replay"""
+    Times, Positions = trajectories.tour(backend.Database, ["Daymar", "Yela"], Start_time, 1.0, orbit_duration=60.0, walk_duration=60.0)
+    Jump_times, Jump_positions = trajectories.quantum_jump(backend.Database["Containers"]["Yela"], backend.Database["Containers"]["ARC-L1"], Times[-1] + 1, 1.0)
+    path = tmp_path_factory.mktemp("replay") / "tour.txt"
+    with open(path, "w") as f:
+        f.writelines(trajectories.coordinates_lines(Times, Positions))
+        f.writelines(trajectories.coordinates_lines(Jump_times, Jump_positions))
+    return replay.read_samples(str(path), Start_time)
+
+
+Targets = [
+    ("companion", []),
+    ("planetary_nav", ["--container", "Daymar", "--known", "true", "--target", "Javelin Wreck"]),
+    ("planetary_nav", ["--container", "ARC-L1", "--known", "true", "--target", "R&R ARC-L1 Wide Forest Station"]),
+    ("space_nav", ["--known", "false", "--x", "0", "--y", "0", "--z", "0"]),
+    ("radar", [])
+]
+
+
+def test_tour_leaves_the_containers(samples):
+    Containers = {backend.get_current_container(*backend.xyz(backend.parse_coordinates(text)))["Name"] for text in samples[1]}
+    assert {"Daymar", "Yela", "None"} <= Containers
+
+
+@pytest.mark.parametrize("protocol", Protocol_versions)
+@pytest.mark.parametrize("Mode, arguments", Targets, ids=[" ".join([Mode] + arguments[-1:]) for Mode, arguments in Targets])
+def test_replay(samples, Mode, arguments, protocol):
+    Target = backend.get_target(Mode, backend.parser.parse_args([Mode] + arguments))
+    report = replay.replay(*samples, Mode, Target, protocol=protocol)
+    assert report["samples"] == len(samples[1])
+    assert report["updates"] == report["samples"]
@@ -0,0 +1,79 @@
+"""Filtered velocity of trajectory_state.Trajectory : gating of the outliers, restarts and the ring buffer."""
+import pytest
+
+from trajectory_state import Trajectory
+
+
+def constant_velocity(trajectory, times, velocity = (1.0, -2.0, 0.5, -3.0), frame = "Daymar"):
+    for time in times:
+        trajectory.add(time, [component * time for component in velocity], frame)
+
+
+def test_stale_samples_are_ignored():
+    trajectory = Trajectory()
+    constant_velocity(trajectory, [0.0, 1.0, 2.0])
+    velocity, count = trajectory.velocity, len(trajectory)
+    # Same time, then older than the last sample (a delayed /showlocation)
+    assert trajectory.add(2.0, [100.0, 100.0, 100.0, 100.0], "Daymar") is False
+    assert trajectory.add(1.5, [100.0, 100.0, 100.0, 100.0], "Daymar") is False
+    assert trajectory.velocity == velocity
+    assert len(trajectory) == count
+    assert trajectory.time == 2.0
+
+
+def test_single_outlier_is_held_back_then_dropped():
+    trajectory = Trajectory()
+    constant_velocity(trajectory, [0.0, 1.0, 2.0, 3.0])
+    velocity = trajectory.velocity
+    assert trajectory.add(4.0, [500.0, 500.0, 500.0, 500.0], "Daymar") is False
+    assert trajectory.held is not None
+    # The next sample is back on the course : the outlier is dropped
+    assert trajectory.add(5.0, [5.0, -10.0, 2.5, -15.0], "Daymar") is True
+    assert trajectory.held is None
+    assert trajectory.sample(1) == (3.0, [3.0, -6.0, 1.5, -9.0])
+    assert trajectory.velocity == pytest.approx(velocity)
+
+
+def test_two_off_course_samples_restart_the_filter():
+    trajectory = Trajectory()
+    constant_velocity(trajectory, [0.0, 1.0, 2.0, 3.0])
+    # A quantum jump : two samples far away, 10 km/s apart
+    assert trajectory.add(4.0, [1000.0, 0.0, 0.0, 0.0], "Daymar") is False
+    assert trajectory.add(5.0, [1010.0, 0.0, 0.0, 0.0], "Daymar") is True
+    assert trajectory.velocity == pytest.approx([10.0, 0.0, 0.0, 0.0])
+    assert trajectory.position == [1010.0, 0.0, 0.0, 0.0]
+    assert [trajectory.sample(age)[0] for age in range(3)] == [5.0, 4.0, 3.0]
+
+
+def test_frame_change_resets_the_trajectory():
+    trajectory = Trajectory()
+    constant_velocity(trajectory, [0.0, 1.0, 2.0])
+    assert trajectory.add(3.0, [7.0, 7.0, 7.0, 7.0], "Yela") is True
+    assert trajectory.frame == "Yela"
+    assert len(trajectory) == 1
+    assert trajectory.velocity == [0.0, 0.0, 0.0, 0.0]
+    assert trajectory.position == [7.0, 7.0, 7.0, 7.0]
+
+
+def test_ring_buffer_wraps_past_capacity():
+    trajectory = Trajectory(capacity=4)
+    constant_velocity(trajectory, [float(time) for time in range(10)])
+    assert len(trajectory) == 4
+    assert len(trajectory.samples) == 4 * trajectory.width
+    assert [trajectory.sample(age)[0] for age in range(4)] == [9.0, 8.0, 7.0, 6.0]
+    assert trajectory.sample(0)[1] == [9.0, -18.0, 4.5, -27.0]
+    # From the oldest (6 s) to the newest (9 s) sample still in the buffer
+    assert trajectory.rolling_velocity() == pytest.approx([1.0, -2.0, 0.5, -3.0])
+
+
+def test_velocity_converges_on_a_constant_velocity_track():
+    trajectory = Trajectory()
+    # Irregular steps, with a small noise on the positions
+    times = [0.0]
+    for index in range(60):
+        times.append(times[-1] + (0.8, 1.0, 1.3)[index % 3])
+    for index, time in enumerate(times):
+        noise = 0.001 * (-1) ** index
+        trajectory.add(time, [2.0 * time + noise, -time + noise, 5.0, 100.0 - 0.5 * time + noise], "Daymar")
+    assert trajectory.velocity == pytest.approx([2.0, -1.0, 0.0, -0.5], abs=0.01)
+    assert trajectory.step == pytest.approx(times[-1] - times[-2])
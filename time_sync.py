@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+import threading
+import time
+
+
+Cache_path = "Cache/time_offset.json"
+
+
+
+class TimeSync:
+    """Offset between the local clock and the NTP time, taken from the disk cache and refreshed in the background"""
+
+    def __init__(self, server : str = "europe.pool.ntp.org", freshness : float = 6*3600, timeout : float = 2, cache_path : str = Cache_path):
+        self.server = server
+        self.freshness = freshness
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.offset = 0.0
+        self.synced_at = 0.0
+        self.load_cache()
+
+    def load_cache(self):
+        try :
+            with open(self.cache_path, "r") as f:
+                cache = json.load(f)
+            self.offset = float(cache["time_offset"])
+            self.synced_at = float(cache["synced_at"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save_cache(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(self.cache_path, "w") as f:
+            json.dump({"time_offset": self.offset, "synced_at": self.synced_at}, f)
+
+    def is_fresh(self):
+        return time.time() - self.synced_at < self.freshness
+
+    def request(self):
+        """Offset given by the NTP server"""
+        import ntplib
+        return ntplib.NTPClient().request(self.server, version=3, timeout=self.timeout).offset
+
+    def sync(self, on_done = None):
+        """Asks the NTP server for the offset (blocking, up to `timeout` seconds)"""
+        try :
+            self.offset = self.request()
+            self.synced_at = time.time()
+            self.save_cache()
+        except Exception:
+            print("Error: Could not get time from NTP server")
+            sys.stdout.flush()
+
+        if on_done is not None:
+            on_done(self.offset)
+
+    def start(self, on_done = None):
+        """Refreshes the offset in a background thread unless the cached one is still fresh"""
+        if self.is_fresh():
+            if on_done is not None:
+                on_done(self.offset)
+            return None
+        thread = threading.Thread(target=self.sync, args=(on_done,), daemon=True)
+        thread.start()
+        return thread
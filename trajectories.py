@@ -0,0 +1,189 @@
+"""Synthetic trajectories for load tests : `Coordinates:` streams of ships and players moving around the containers.
+
+Usage :
+    python trajectories.py orbit --container Daymar --altitude 50 --duration 600 -o orbit.txt
+    python trajectories.py walk --container Daymar --lat 10 --long 20 --duration 3600 -o walk.txt
+    python trajectories.py jump --from Daymar --to Yela -o jump.txt
+    python trajectories.py tour --containers Daymar Yela Cellin -o tour.txt
+
+Every line is `<unix time> Coordinates: x:.. y:.. z:..` with global coordinates in m, like the lines read by
+reprocess.py and replay.py. Times start at --start (now by default) and advance by 1/--rate seconds.
+"""
+import argparse
+import datetime
+import sys
+import time
+from math import asin, atan2, cos, radians, sin
+
+import numpy as np
+
+import navigation_math
+from database_snapshot import load_database
+
+
+Reference_time = (datetime.datetime(2020, 1, 1) - datetime.datetime(1970, 1, 1)).total_seconds()
+
+# Quantum travel speed in km/s and the time to reach it
+Quantum_speed = 100000.0
+Quantum_spool_time = 5.0
+
+
+
+def sample_times(start_time : float, duration : float, rate : float):
+    return start_time + np.arange(int(duration * rate)) / rate
+
+
+def container_centre(Container):
+    return np.array([Container["X"], Container["Y"], Container["Z"]])
+
+
+def orbit(Container, Times, altitude : float = 50.0, speed : float = 1.0, inclination : float = 30.0, phase : float = 0.0):
+    """Global positions (km) of a circular orbit around a container at a speed in km/s"""
+    Radius = Container["Body Radius"] + altitude
+    Angle = np.radians(phase) + speed / Radius * (Times - Times[0])
+    Inclination = np.radians(inclination)
+    Positions = np.empty((len(Times), 3))
+    Positions[:, 0] = Radius * np.cos(Angle)
+    Positions[:, 1] = Radius * np.sin(Angle) * np.cos(Inclination)
+    Positions[:, 2] = Radius * np.sin(Angle) * np.sin(Inclination)
+    return Positions + container_centre(Container)
+
+
+def surface_walk(Container, Times, latitude : float = 0.0, longitude : float = 0.0, height : float = 0.0, speed : float = 5.0, turn : float = 5.0, seed : int = 0):
+    """Global positions (km) of a walk at a speed in km/h on the surface of a rotating container, turning randomly by about `turn` degrees per sample"""
+    random = np.random.default_rng(seed)
+    Steps = np.diff(Times, prepend=Times[0]) * speed / 3600 / (Container["Body Radius"] + height)
+    Headings = np.radians(random.uniform(0, 360) + np.cumsum(random.normal(0, turn, len(Times))))
+
+    Latitudes = np.empty(len(Times))
+    Longitudes = np.empty(len(Times))
+    lat, long = radians(latitude), radians(longitude)
+    # Every step follows the great circle of the current heading
+    for i, (step, heading) in enumerate(zip(Steps.tolist(), Headings.tolist())):
+        new_lat = asin(sin(lat) * cos(step) + cos(lat) * sin(step) * cos(heading))
+        long += atan2(sin(heading) * sin(step) * cos(lat), cos(step) - sin(lat) * sin(new_lat))
+        lat = new_lat
+        Latitudes[i], Longitudes[i] = lat, long
+
+    Local = navigation_math.lat_long_height_to_local(np.degrees(Latitudes), (np.degrees(Longitudes) + 180) % 360 - 180, height, Container["Body Radius"])
+    Rotation_state = navigation_math.rotation_state_degrees(Times - Reference_time, Container["Rotation Speed"], Container["Rotation Adjust"])
+    return navigation_math.local_to_global(Local, container_centre(Container), Rotation_state)
+
+
+def quantum_jump(From, To, start_time : float, rate : float, speed : float = Quantum_speed, spool_time : float = Quantum_spool_time):
+    """(Times, global positions in km) of a quantum travel from the OM radius of a container to the OM radius of another one"""
+    Start, End = container_centre(From), container_centre(To)
+    Direction = (End - Start) / np.linalg.norm(End - Start)
+    Start = Start + Direction * From["OM Radius"]
+    End = End - Direction * To["OM Radius"]
+    Distance = np.linalg.norm(End - Start)
+
+    # Accelerates during the spool time, cruises, then slows down the same way
+    Ramp = min(speed * spool_time / 2, Distance / 2)
+    Ramp_time = 2 * Ramp / speed
+    duration = 2 * Ramp_time + (Distance - 2 * Ramp) / speed
+    Times = sample_times(start_time, duration, rate)
+    t = Times - start_time
+    Travelled = np.where(
+        t < Ramp_time, speed * t**2 / (2 * Ramp_time),
+        np.where(t < duration - Ramp_time, Ramp + speed * (t - Ramp_time), Distance - speed * (duration - t)**2 / (2 * Ramp_time))
+    )
+    return Times, Start + Travelled[:, None] * Direction
+
+
+def tour(Database, container_names : list, start_time : float, rate : float, orbit_duration : float = 120.0, walk_duration : float = 300.0, seed : int = 0):
+    """(Times, global positions in km) of an orbit and a walk on every container, with quantum jumps between them"""
+    All_times, All_positions = [], []
+    t = start_time
+    for i, name in enumerate(container_names):
+        Container = Database["Containers"][name]
+        if i > 0:
+            Times, Positions = quantum_jump(Database["Containers"][container_names[i - 1]], Container, t, rate)
+            All_times.append(Times)
+            All_positions.append(Positions)
+            t = Times[-1] + 1 / rate if len(Times) else t
+
+        Times = sample_times(t, orbit_duration, rate)
+        All_times.append(Times)
+        All_positions.append(orbit(Container, Times))
+        t += orbit_duration
+
+        Times = sample_times(t, walk_duration, rate)
+        All_times.append(Times)
+        All_positions.append(surface_walk(Container, Times, seed=seed + i))
+        t += walk_duration
+
+    return np.concatenate(All_times), np.concatenate(All_positions)
+
+
+
+def coordinates_lines(Times, Positions):
+    """`<unix time> Coordinates: x:.. y:.. z:..` lines of global positions in km"""
+    return [f"{t:.3f} Coordinates: x:{x*1000:.3f} y:{y*1000:.3f} z:{z*1000:.3f}\n" for t, (x, y, z) in zip(Times.tolist(), Positions.tolist())]
+
+
+def generate(args, Database):
+    """(Times, global positions in km) of the trajectory described by the arguments"""
+    if args.kind == "orbit":
+        Times = sample_times(args.start, args.duration, args.rate)
+        return Times, orbit(Database["Containers"][args.container], Times, args.altitude, args.speed, args.inclination)
+    elif args.kind == "walk":
+        Times = sample_times(args.start, args.duration, args.rate)
+        return Times, surface_walk(Database["Containers"][args.container], Times, args.lat, args.long, args.height, args.speed, seed=args.seed)
+    elif args.kind == "jump":
+        return quantum_jump(Database["Containers"][args.origin], Database["Containers"][args.destination], args.start, args.rate, args.speed)
+    else :
+        return tour(Database, args.containers, args.start, args.rate, seed=args.seed)
+
+
+
+def main():
+    # Options of every kind of trajectory, given after its name
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-o", "--output", type=str, help="Output file (stdout by default)")
+    common.add_argument("--start", type=float, default=None, help="Unix time of the first sample (now by default)")
+    common.add_argument("--rate", type=float, default=10.0, help="Samples per second")
+    common.add_argument("--seed", type=int, default=0)
+
+    parser = argparse.ArgumentParser(description="Writes synthetic `Coordinates:` streams")
+    kinds = parser.add_subparsers(dest="kind", required=True)
+
+    orbit_parser = kinds.add_parser("orbit", parents=[common])
+    orbit_parser.add_argument("--container", type=str, required=True)
+    orbit_parser.add_argument("--altitude", type=float, default=50.0, help="km above the surface")
+    orbit_parser.add_argument("--speed", type=float, default=1.0, help="km/s")
+    orbit_parser.add_argument("--inclination", type=float, default=30.0, help="degrees")
+    orbit_parser.add_argument("--duration", type=float, default=600.0, help="seconds")
+
+    walk_parser = kinds.add_parser("walk", parents=[common])
+    walk_parser.add_argument("--container", type=str, required=True)
+    walk_parser.add_argument("--lat", type=float, default=0.0)
+    walk_parser.add_argument("--long", type=float, default=0.0)
+    walk_parser.add_argument("--height", type=float, default=0.0, help="km")
+    walk_parser.add_argument("--speed", type=float, default=5.0, help="km/h")
+    walk_parser.add_argument("--duration", type=float, default=600.0, help="seconds")
+
+    jump_parser = kinds.add_parser("jump", parents=[common])
+    jump_parser.add_argument("--from", dest="origin", type=str, required=True)
+    jump_parser.add_argument("--to", dest="destination", type=str, required=True)
+    jump_parser.add_argument("--speed", type=float, default=Quantum_speed, help="km/s")
+
+    tour_parser = kinds.add_parser("tour", parents=[common])
+    tour_parser.add_argument("--containers", type=str, nargs="+", required=True)
+
+    args = parser.parse_args()
+    if args.start is None:
+        args.start = time.time()
+
+    Times, Positions = generate(args, load_database('Database.json'))
+    lines = coordinates_lines(Times, Positions)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.writelines(lines)
+    else:
+        sys.stdout.writelines(lines)
+    print(f"{len(lines)} samples over {Times[-1] - Times[0] if len(Times) else 0:.0f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
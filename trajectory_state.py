@@ -0,0 +1,128 @@
+"""Recent samples of the player and their filtered velocity, for the ETA, the delta distances and the deviations.
+
+A Trajectory keeps the last `capacity` samples (time and values) in a preallocated array used as a ring buffer, so
+its memory does not grow with the session, and smooths them with a constant velocity alpha-beta filter :
+    predicted = position + velocity * dt
+    position  = predicted + Alpha * residual
+    velocity  = velocity + Beta / dt * residual
+with residual = sample - predicted. The first two samples set the position and the velocity directly, like the
+previous position did before.
+
+- A sample that is not newer than the last one (a delayed /showlocation) is ignored.
+- A sample further from the prediction than Gate_factor times the distance covered in dt at the rolling velocity
+  (oldest to newest sample of the buffer), plus Gate_floor km, is held back : the next sample either confirms it (a
+  real change of course or a quantum jump, the filter starts again from the two) or it is dropped.
+- A sample of another frame (container, target) starts a new trajectory, their values are not comparable.
+"""
+from array import array
+from math import sqrt
+
+
+Default_capacity = 32
+
+# Benedict-Bordner gains : the velocity settles after a change without overshooting much
+Alpha = 0.5
+Beta = Alpha**2 / (2 - Alpha)
+
+Gate_factor = 4.0
+# km
+Gate_floor = 0.05
+
+
+
+def norm(Vector):
+    return sqrt(sum([value * value for value in Vector]))
+
+
+
+class Trajectory:
+    """Ring buffer of the last samples of a few values (X, Y, Z, distance to the target ...) and their alpha-beta estimate"""
+
+    def __init__(self, dimensions : int = 4, capacity : int = Default_capacity):
+        self.dimensions = dimensions
+        self.capacity = capacity
+        self.width = dimensions + 1
+        # Rows of (time, values...)
+        self.samples = array("d", bytes(8 * self.width * capacity))
+        self.reset()
+
+    def reset(self, frame = None):
+        self.frame = frame
+        self.count = 0
+        self.head = 0
+        self.position = None
+        self.velocity = [0.0] * self.dimensions
+        self.time = None
+        # Seconds between the last two accepted samples
+        self.step = 0.0
+        # (time, values) of a sample waiting for the next one to confirm it
+        self.held = None
+
+    def __len__(self):
+        return self.count
+
+    def sample(self, age : int = 0):
+        """(time, values) of the age-th newest sample of the buffer"""
+        start = ((self.head - 1 - age) % self.capacity) * self.width
+        return self.samples[start], self.samples[start + 1:start + self.width].tolist()
+
+    def push(self, time : float, values : list):
+        start = self.head * self.width
+        self.samples[start:start + self.width] = array("d", [time] + values)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def rolling_velocity(self):
+        """Mean velocity from the oldest to the newest sample of the buffer"""
+        if self.count < 2:
+            return [0.0] * self.dimensions
+        # Read in place, this runs on every sample
+        samples, width = self.samples, self.width
+        newest = ((self.head - 1) % self.capacity) * width
+        oldest = ((self.head - self.count) % self.capacity) * width
+        Duration = samples[newest] - samples[oldest]
+        return [(samples[newest + index] - samples[oldest + index]) / Duration for index in range(1, width)]
+
+    def accept(self, time : float, values : list):
+        if self.time is not None:
+            self.step = time - self.time
+        self.time = time
+        self.push(time, values)
+
+    def start_from(self, time : float, values : list):
+        """Position and velocity of the last accepted sample and this one"""
+        self.velocity = [(b - a) / (time - self.time) for a, b in zip(self.sample()[1], values)]
+        self.position = values
+
+    def add(self, time : float, values, frame = None):
+        """Adds a sample, returns False if it was ignored or held back"""
+        if frame != self.frame:
+            self.reset(frame)
+        Last_time = self.held[0] if self.held is not None else self.time
+        if Last_time is not None and time <= Last_time:
+            return False
+        values = [float(value) for value in values]
+
+        if self.position is None:
+            self.position = values
+        elif self.count == 1:
+            self.start_from(time, values)
+        else :
+            dt = time - self.time
+            Position, Velocity = self.position, self.velocity
+            Residual = [value - (position + velocity * dt) for value, position, velocity in zip(values, Position, Velocity)]
+            if norm(Residual) > Gate_factor * norm(self.rolling_velocity()) * dt + Gate_floor:
+                if self.held is None:
+                    self.held = (time, values)
+                    return False
+                # Two samples away from the course in a row : the course changed
+                self.accept(*self.held)
+                self.start_from(time, values)
+            else :
+                Gain = Beta / dt
+                self.position = [position + velocity * dt + Alpha * residual for position, velocity, residual in zip(Position, Velocity, Residual)]
+                self.velocity = [velocity + Gain * residual for velocity, residual in zip(Velocity, Residual)]
+
+        self.held = None
+        self.accept(time, values)
+        return True